@@ -0,0 +1,741 @@
+"""Stand-in ETAPI server with a synthetic vault, for benchmarks and trials.
+
+Generates a vault of any size, shape and content size, and answers the
+ETAPI endpoints tpy uses from memory. Latency, transient errors and
+lost responses can be injected to see how commands behave on a slow or
+flaky server.
+
+Endpoints: app-info; GET, PATCH and DELETE notes/{id}; GET and PUT
+notes/{id}/content; create-note; POST attachments, GET attachments/{id}
+and notes/{id}/attachments, GET and PUT attachments/{id}/content;
+notes/{id}/export, which answers Range requests; PUT backup/{name};
+POST attributes, GET, PATCH and DELETE attributes/{id}; POST branches
+and DELETE branches/{id}; and notes?search= with ancestorNoteId,
+ancestorDepth, fastSearch, includeArchivedNotes, orderBy, orderDirection
+and limit. Search understands words (matched in titles, and in content
+unless fastSearch), ``#label`` and ``#label=value`` terms, and single
+``note.<property> <op> '<value>'`` comparisons. Notes and attributes
+can be created with an ID of the client's choosing; creating one with an
+ID that is taken fails.
+
+The server is Python's threading HTTP server, so it handles a few thousand
+requests per second at most. That is plenty to compare one version of tpy
+with another, but absolute numbers say little about a real Trilium.
+
+Run standalone with, for example::
+
+    python benchmarks/mock_server.py --notes 10000 --latency 5 --error-rate 0.01
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# Words titles are made of; a search for one matches about 1/len(WORDS)
+# of the vault per title word
+WORDS = (
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima "
+    "mike november oscar papa quebec romeo sierra tango uniform victor whiskey "
+    "xray yankee zulu"
+).split()
+
+# Generated content repeats this, with the note's title as a heading
+FILLER = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua."
+)
+
+# Every TODO_EVERY-th note carries a #todo label
+TODO_EVERY = 10
+
+GENERATED_DATE = "2024-01-01 00:00:00.000Z"
+
+COMPARISON = re.compile(r"^note\.(\w+)\s*(!=|>=|<=|=|>|<)\s*'([^']*)'$")
+
+
+class MockNote:
+    """One note of a Vault; serialized to ETAPI JSON on request."""
+
+    __slots__ = (
+        "note_id", "title", "type", "mime", "parents", "children",
+        "attributes", "blob_id", "modified", "content",
+    )
+
+    def __init__(self, note_id: str, title: str, note_type: str = "text", mime: str = "text/html") -> None:
+        self.note_id = note_id
+        self.title = title
+        self.type = note_type
+        self.mime = mime
+        self.parents: List[str] = []
+        self.children: List[str] = []
+        # Owned labels and relations, as ETAPI returns them without noteId
+        self.attributes: List[Dict[str, Any]] = []
+        self.blob_id = "b" + note_id
+        self.modified = GENERATED_DATE
+        # None until written; generated from the title until then
+        self.content: Optional[bytes] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        date = self.modified[:19].replace(" ", "T")
+        return {
+            "noteId": self.note_id,
+            "title": self.title,
+            "type": self.type,
+            "mime": self.mime,
+            "isProtected": False,
+            "blobId": self.blob_id,
+            "attributes": [
+                dict(attribute, noteId=self.note_id, position=10 * i)
+                for i, attribute in enumerate(self.attributes)
+            ],
+            "parentNoteIds": list(self.parents) or ["none"],
+            "childNoteIds": list(self.children),
+            "parentBranchIds": [f"{parent}_{self.note_id}" for parent in self.parents],
+            "childBranchIds": [f"{self.note_id}_{child}" for child in self.children],
+            "dateCreated": date,
+            "dateModified": date,
+            "utcDateCreated": GENERATED_DATE,
+            "utcDateModified": self.modified,
+        }
+
+
+class Vault:
+    """Synthetic note tree held in memory.
+
+    Notes are added breadth first, ``fanout`` children per note, below a
+    root note. With ``depth`` set, notes on that level get no children;
+    once every shallower note has ``fanout`` children, they get more.
+
+    Args:
+        notes: Number of notes besides the root
+        fanout: Children per note
+        depth: Deepest level (the root is level 0), or None for no limit
+        content_size: Bytes of generated content per note
+        seed: Seed for the generated titles
+    """
+
+    def __init__(
+        self,
+        notes: int = 1000,
+        fanout: int = 10,
+        depth: Optional[int] = None,
+        content_size: int = 1024,
+        seed: int = 0,
+    ) -> None:
+        self.content_size = content_size
+        self.notes: Dict[str, MockNote] = {"root": MockNote("root", "root")}
+        # Attachment metadata as ETAPI returns it, and content, by ID
+        self.attachments: Dict[str, Dict[str, Any]] = {}
+        self.attachment_content: Dict[str, bytes] = {}
+        self.backups: List[str] = []
+        # Note ID of every attribute, by attribute ID
+        self.attribute_owners: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self._next_id = 0
+
+        if depth is not None and depth < 1:
+            raise ValueError("depth must be at least 1")
+        rng = random.Random(seed)
+        levels = {"root": 0}
+        parents = deque(["root"])
+        for i in range(notes):
+            if not parents:
+                # Every note above the deepest level is full: another round
+                parents.extend(nid for nid, level in levels.items() if depth is None or level < depth)
+            parent = parents[0]
+            note = self.add(parent, f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}")
+            if i % TODO_EVERY == 0:
+                self.add_attribute(note, "label", "todo", "")
+            levels[note.note_id] = levels[parent] + 1
+            if depth is None or levels[note.note_id] < depth:
+                parents.append(note.note_id)
+            if len(self.notes[parent].children) % fanout == 0:
+                parents.popleft()
+
+    def add(
+        self, parent_id: str, title: str, note_type: str = "text", mime: str = "text/html",
+        note_id: Optional[str] = None,
+    ) -> MockNote:
+        """Add a note below parent_id."""
+        if note_id is None:
+            note_id = f"n{self._next_id}"
+            self._next_id += 1
+        note = MockNote(note_id, title, note_type, mime)
+        note.parents.append(parent_id)
+        self.notes[parent_id].children.append(note.note_id)
+        self.notes[note.note_id] = note
+        return note
+
+    def add_attribute(
+        self, note: MockNote, attribute_type: str, name: str, value: str, inheritable: bool = False,
+        attribute_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Add a label or relation to a note."""
+        if attribute_id is None:
+            attribute_id = f"t{self._next_id}"
+            self._next_id += 1
+        attribute = {
+            "attributeId": attribute_id,
+            "type": attribute_type,
+            "name": name,
+            "value": value,
+            "isInheritable": inheritable,
+        }
+        note.attributes.append(attribute)
+        self.attribute_owners[attribute["attributeId"]] = note.note_id
+        return attribute
+
+    def find_attribute(self, attribute_id: str) -> Optional[Tuple[MockNote, Dict[str, Any]]]:
+        """The note owning an attribute, and the attribute."""
+        note = self.notes.get(self.attribute_owners.get(attribute_id, ""))
+        for attribute in note.attributes if note else []:
+            if attribute["attributeId"] == attribute_id:
+                return note, attribute
+        return None
+
+    def delete(self, note_id: str) -> None:
+        """Delete a note, and its children that have no other parent."""
+        note = self.notes.pop(note_id)
+        for parent_id in note.parents:
+            parent = self.notes.get(parent_id)
+            if parent is not None:
+                parent.children.remove(note_id)
+        for child_id in note.children:
+            child = self.notes.get(child_id)
+            if child is not None:
+                child.parents.remove(note_id)
+                if not child.parents:
+                    self.delete(child_id)
+
+    def content(self, note: MockNote) -> bytes:
+        """A note's content: what was written, or generated from its title."""
+        if note.content is not None:
+            return note.content
+        heading = f"<h2>{note.title}</h2>"
+        paragraph = f"<p>{FILLER}</p>"
+        repeat = max(0, self.content_size - len(heading)) // len(paragraph) + 1
+        return (heading + paragraph * repeat).encode()[:max(self.content_size, len(heading))]
+
+    def set_content(self, note: MockNote, content: bytes) -> None:
+        note.content = content
+        note.blob_id = f"b{note.note_id}_{time.time_ns()}"
+        note.modified = time.strftime("%Y-%m-%d %H:%M:%S.000Z", time.gmtime())
+
+    def add_attachment(self, owner_id: str, role: str, mime: str, title: str, position: int = 0) -> Dict[str, Any]:
+        """Add an empty attachment to a note."""
+        attachment_id = f"a{self._next_id}"
+        self._next_id += 1
+        attachment = {
+            "attachmentId": attachment_id,
+            "ownerId": owner_id,
+            "role": role,
+            "mime": mime,
+            "title": title,
+            "position": position,
+            "blobId": "b" + attachment_id,
+            "dateModified": GENERATED_DATE,
+            "utcDateModified": GENERATED_DATE,
+            "contentLength": 0,
+        }
+        self.attachments[attachment_id] = attachment
+        self.attachment_content[attachment_id] = b""
+        return attachment
+
+    def export(self, root: str, export_format: str) -> bytes:
+        """A ZIP archive of root and its descendants, the same bytes every time."""
+        extension = "md" if export_format == "markdown" else "html"
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for note in [self.notes[root], *self.descendants(root, None)]:
+                info = zipfile.ZipInfo(f"{note.note_id}.{extension}", date_time=(2024, 1, 1, 0, 0, 0))
+                archive.writestr(info, self.content(note))
+        return buffer.getvalue()
+
+    def descendants(self, root: str, max_depth: Optional[int]) -> Iterator[MockNote]:
+        """Notes below root, breadth first, each once."""
+        seen = {root}
+        level = [root]
+        depth = 0
+        while level and (max_depth is None or depth < max_depth):
+            next_level = []
+            for note_id in level:
+                for child_id in self.notes[note_id].children:
+                    if child_id not in seen:
+                        seen.add(child_id)
+                        next_level.append(child_id)
+                        yield self.notes[child_id]
+            level = next_level
+            depth += 1
+
+    def matches(self, note: MockNote, terms: List[str], fast_search: bool) -> bool:
+        """Whether a note matches every term of a search."""
+        for term in terms:
+            if term.startswith("#"):
+                name, _, value = term[1:].partition("=")
+                if not any(
+                    a["type"] == "label" and a["name"] == name and (not value or a["value"] == value)
+                    for a in note.attributes
+                ):
+                    return False
+                continue
+            term = term.lower()
+            if term in note.title.lower():
+                continue
+            if fast_search:
+                return False
+            if note.content is None:
+                if term not in FILLER.lower():
+                    return False
+            elif term.encode() not in note.content.lower():
+                return False
+        return True
+
+    def search(self, query: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Answer GET /etapi/notes with the given query parameters."""
+        root = query.get("ancestorNoteId", "root")
+        if root not in self.notes:
+            return []
+        depth = query.get("ancestorDepth", "")
+        max_depth = int(depth[2:]) - 1 if depth.startswith("lt") else None
+
+        text = query.get("search", "").strip()
+        comparison = COMPARISON.match(text)
+        fast_search = query.get("fastSearch") == "true"
+        terms = [] if comparison else text.split()
+
+        found = []
+        for note in self.descendants(root, max_depth):
+            if comparison:
+                prop, op, value = comparison.groups()
+                actual = note.to_json().get(prop)
+                if not isinstance(actual, str) or not _compare(actual, op, value):
+                    continue
+            elif not self.matches(note, terms, fast_search):
+                continue
+            found.append(note)
+
+        order_by = query.get("orderBy")
+        if order_by:
+            found.sort(
+                key=lambda note: str(note.to_json().get(order_by, "")),
+                reverse=query.get("orderDirection") == "desc",
+            )
+        if "limit" in query:
+            found = found[:int(query["limit"])]
+        return [note.to_json() for note in found]
+
+
+def _compare(actual: str, op: str, value: str) -> bool:
+    return {
+        "=": actual == value,
+        "!=": actual != value,
+        ">": actual > value,
+        ">=": actual >= value,
+        "<": actual < value,
+        "<=": actual <= value,
+    }[op]
+
+
+class MockServer(ThreadingHTTPServer):
+    """HTTP server answering ETAPI requests from a Vault.
+
+    Attributes:
+        stats: Requests answered per endpoint, "errors" injected,
+            responses "lost" and "bytes" sent; see reset_stats
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        vault: Vault,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        lost_rate: float = 0.0,
+    ) -> None:
+        super().__init__(address, MockHandler)
+        self.vault = vault
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lost_rate = lost_rate
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, int] = {}
+        self.stats_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset_stats(self) -> Dict[str, int]:
+        """Return the stats collected so far and start over."""
+        with self.stats_lock:
+            stats, self.stats = self.stats, {}
+        return stats
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def delay(self) -> float:
+        with self.stats_lock:
+            return self.latency + self.rng.uniform(0, self.jitter)
+
+    def inject_error(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self.stats_lock:
+            return self.rng.random() < self.error_rate
+
+    def lose_response(self) -> bool:
+        if not self.lost_rate:
+            return False
+        with self.stats_lock:
+            return self.rng.random() < self.lost_rate
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs
+    # add 40 ms to every keep-alive request
+    disable_nagle_algorithm = True
+    server: MockServer
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PUT(self) -> None:
+        self._handle("PUT")
+
+    def do_PATCH(self) -> None:
+        self._handle("PATCH")
+
+    def do_DELETE(self) -> None:
+        self._handle("DELETE")
+
+    def _handle(self, method: str) -> None:
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        path = url.path[len("/etapi/"):] if url.path.startswith("/etapi/") else None
+        endpoint = re.sub(r"^(notes|attachments|attributes|branches)/[^/]+", r"\1/{id}", path or url.path)
+        self.server.count(f"{method} {endpoint}")
+
+        delay = self.server.delay()
+        if delay:
+            time.sleep(delay)
+        if path is None:
+            return self._error(404, "NOT_FOUND", f"Unknown path {url.path}")
+        if self.server.inject_error():
+            self.server.count("errors")
+            return self._error(503, "SERVICE_UNAVAILABLE", "Injected error")
+
+        vault = self.server.vault
+        if method != "GET" and self.server.lose_response():
+            # Carry out the change, then hang up as if the response got
+            # lost or timed out on the way back
+            self.server.count("lost")
+            wfile, self.wfile = self.wfile, io.BytesIO()
+            try:
+                with vault.lock:
+                    self._route(method, path, query, body, vault)
+            finally:
+                self.wfile = wfile
+                self.close_connection = True
+            return
+        with vault.lock:
+            self._route(method, path, query, body, vault)
+
+    def _route(self, method: str, path: str, query: Dict[str, str], body: bytes, vault: Vault) -> None:
+        if path == "app-info" and method == "GET":
+            return self._send(200, {
+                "appVersion": "0.0.0-mock",
+                "dbVersion": 0,
+                "syncVersion": 0,
+                "buildDate": "1970-01-01T00:00:00Z",
+                "buildRevision": "mock",
+                "dataDirectory": "/dev/null",
+                "clipperProtocolVersion": "1.0",
+                "utcDateTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            })
+
+        if path == "notes" and method == "GET":
+            if "search" not in query:
+                return self._error(400, "SEARCH_QUERY_PARAM_MANDATORY", "'search' is required")
+            return self._send(200, {"results": vault.search(query)})
+
+        if path == "create-note" and method == "POST":
+            data = json.loads(body or b"{}")
+            if not data.get("title") or not data.get("type"):
+                return self._error(400, "PROPERTY_VALIDATION_ERROR", "title and type are required")
+            if data.get("parentNoteId") not in vault.notes:
+                return self._error(404, "NOTE_NOT_FOUND", f"Note '{data.get('parentNoteId')}' not found")
+            if data.get("noteId") in vault.notes:
+                return self._error(400, "NOTE_ALREADY_EXISTS", f"Note '{data['noteId']}' already exists")
+            note = vault.add(
+                data["parentNoteId"], data["title"], data["type"], data.get("mime") or "text/html",
+                note_id=data.get("noteId"),
+            )
+            vault.set_content(note, str(data.get("content", "")).encode())
+            return self._send(201, {
+                "note": note.to_json(),
+                "branch": {"branchId": f"{data['parentNoteId']}_{note.note_id}"},
+            })
+
+        if path == "attachments" and method == "POST":
+            data = json.loads(body or b"{}")
+            if data.get("ownerId") not in vault.notes:
+                return self._error(404, "NOTE_NOT_FOUND", f"Note '{data.get('ownerId')}' not found")
+            attachment = vault.add_attachment(
+                data["ownerId"], data.get("role") or "file", data.get("mime") or "application/octet-stream",
+                data.get("title") or "", int(data.get("position") or 0),
+            )
+            content = str(data.get("content") or "").encode()
+            vault.attachment_content[attachment["attachmentId"]] = content
+            attachment["contentLength"] = len(content)
+            return self._send(201, attachment)
+
+        match = re.match(r"^attachments/([^/]+)(/content)?$", path)
+        if match:
+            attachment = vault.attachments.get(match.group(1))
+            if attachment is None:
+                return self._error(404, "ATTACHMENT_NOT_FOUND", f"Attachment '{match.group(1)}' not found")
+            if not match.group(2) and method == "GET":
+                return self._send(200, attachment)
+            if match.group(2) and method == "GET":
+                return self._send(200, vault.attachment_content[attachment["attachmentId"]], attachment["mime"])
+            if match.group(2) and method == "PUT":
+                vault.attachment_content[attachment["attachmentId"]] = body
+                attachment["contentLength"] = len(body)
+                return self._send(204, b"")
+            return self._error(405, "METHOD_NOT_ALLOWED", f"{method} not supported")
+
+        if path == "attributes" and method == "POST":
+            data = json.loads(body or b"{}")
+            note = vault.notes.get(data.get("noteId"))
+            if note is None:
+                return self._error(404, "NOTE_NOT_FOUND", f"Note '{data.get('noteId')}' not found")
+            if data.get("type") not in ("label", "relation") or not data.get("name"):
+                return self._error(400, "PROPERTY_VALIDATION_ERROR", "type and name are required")
+            if data["type"] == "relation" and data.get("value") not in vault.notes:
+                return self._error(404, "NOTE_NOT_FOUND", f"Note '{data.get('value')}' not found")
+            if data.get("attributeId") in vault.attribute_owners:
+                return self._error(400, "ATTRIBUTE_ALREADY_EXISTS", f"Attribute '{data['attributeId']}' already exists")
+            attribute = vault.add_attribute(
+                note, data["type"], data["name"], str(data.get("value") or ""), bool(data.get("isInheritable")),
+                attribute_id=data.get("attributeId"),
+            )
+            return self._send(201, dict(attribute, noteId=note.note_id))
+
+        match = re.match(r"^attributes/([^/]+)$", path)
+        if match:
+            found = vault.find_attribute(match.group(1))
+            if found is None:
+                return self._error(404, "ATTRIBUTE_NOT_FOUND", f"Attribute '{match.group(1)}' not found")
+            note, attribute = found
+            if method == "GET":
+                return self._send(200, dict(attribute, noteId=note.note_id))
+            if method == "PATCH":
+                attribute["value"] = str(json.loads(body or b"{}").get("value", attribute["value"]))
+                return self._send(200, dict(attribute, noteId=note.note_id))
+            if method == "DELETE":
+                note.attributes.remove(attribute)
+                del vault.attribute_owners[attribute["attributeId"]]
+                return self._send(204, b"")
+            return self._error(405, "METHOD_NOT_ALLOWED", f"{method} not supported")
+
+        if path == "branches" and method == "POST":
+            data = json.loads(body or b"{}")
+            note = vault.notes.get(data.get("noteId"))
+            parent = vault.notes.get(data.get("parentNoteId"))
+            if note is None or parent is None:
+                return self._error(404, "NOTE_NOT_FOUND", "Note or parent note not found")
+            branch = {"branchId": f"{parent.note_id}_{note.note_id}", "noteId": note.note_id,
+                      "parentNoteId": parent.note_id, "prefix": data.get("prefix")}
+            # As in Trilium, creating an existing branch updates it
+            if parent.note_id in note.parents:
+                return self._send(200, branch)
+            if note.note_id == parent.note_id or any(
+                n.note_id == parent.note_id for n in vault.descendants(note.note_id, None)
+            ):
+                return self._error(400, "BRANCH_CYCLE", "Moving the note here would create a cycle")
+            note.parents.append(parent.note_id)
+            parent.children.append(note.note_id)
+            return self._send(201, branch)
+
+        match = re.match(r"^branches/([^/]+)_([^/_]+)$", path)
+        if match and method == "DELETE":
+            parent, note = vault.notes.get(match.group(1)), vault.notes.get(match.group(2))
+            if parent is None or note is None or parent.note_id not in note.parents:
+                return self._error(404, "BRANCH_NOT_FOUND", f"Branch '{match.group(0)[9:]}' not found")
+            # Deleting the last branch deletes the note, as in Trilium
+            if len(note.parents) == 1:
+                vault.delete(note.note_id)
+            else:
+                note.parents.remove(parent.note_id)
+                parent.children.remove(note.note_id)
+            return self._send(204, b"")
+
+        match = re.match(r"^backup/([^/]+)$", path)
+        if match and method == "PUT":
+            vault.backups.append(match.group(1))
+            return self._send(204, b"")
+
+        match = re.match(r"^notes/([^/]+)/export$", path)
+        if match and method == "GET":
+            if match.group(1) not in vault.notes:
+                return self._error(404, "NOTE_NOT_FOUND", f"Note '{match.group(1)}' not found")
+            return self._send_ranges(vault.export(match.group(1), query.get("format", "html")), "application/zip")
+
+        match = re.match(r"^notes/([^/]+)/attachments$", path)
+        if match and method == "GET":
+            if match.group(1) not in vault.notes:
+                return self._error(404, "NOTE_NOT_FOUND", f"Note '{match.group(1)}' not found")
+            return self._send(200, [
+                attachment for attachment in vault.attachments.values()
+                if attachment["ownerId"] == match.group(1)
+            ])
+
+        match = re.match(r"^notes/([^/]+)(/content)?$", path)
+        note = vault.notes.get(match.group(1)) if match else None
+        if note is None:
+            return self._error(404, "NOTE_NOT_FOUND", f"Note '{match.group(1) if match else path}' not found")
+
+        if match.group(2):
+            if method == "GET":
+                return self._send(200, vault.content(note), note.mime)
+            if method == "PUT":
+                vault.set_content(note, body)
+                return self._send(204, b"")
+        elif method == "GET":
+            return self._send(200, note.to_json())
+        elif method == "PATCH":
+            data = json.loads(body or b"{}")
+            note.title = data.get("title", note.title)
+            note.type = data.get("type", note.type)
+            note.mime = data.get("mime", note.mime)
+            return self._send(200, note.to_json())
+        elif method == "DELETE":
+            vault.delete(note.note_id)
+            return self._send(204, b"")
+        return self._error(405, "METHOD_NOT_ALLOWED", f"{method} not supported")
+
+    def _error(self, status: int, code: str, message: str) -> None:
+        self._send(status, {"status": status, "code": code, "message": message})
+
+    def _send_ranges(self, data: bytes, content_type: str) -> None:
+        """Send data, or the part of it asked for with Range and If-Range."""
+        digest = hashlib.sha256(data).digest()
+        etag = f'"{digest[:8].hex()}"'
+        headers = {
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+            "Repr-Digest": f"sha-256=:{base64.b64encode(digest).decode()}:",
+        }
+        match = re.match(r"^bytes=(\d+)-$", self.headers.get("Range", ""))
+        if not match or self.headers.get("If-Range", etag) != etag:
+            return self._send(200, data, content_type, headers)
+        start = int(match.group(1))
+        if start >= len(data):
+            headers["Content-Range"] = f"bytes */{len(data)}"
+            return self._send(416, b"", content_type, headers)
+        headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+        return self._send(206, data[start:], content_type, headers)
+
+    def _send(
+        self, status: int, body: Any, content_type: str = "application/json",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        # Counted first, so the stats are complete once the client has it all
+        self.server.count("bytes", len(data))
+        if data:
+            self.wfile.write(data)
+
+
+def serve(
+    vault: Optional[Vault] = None,
+    port: int = 0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int = 0,
+    lost_rate: float = 0.0,
+) -> MockServer:
+    """Start a mock server in a background thread.
+
+    Args:
+        vault: Notes to serve (default: Vault())
+        port: Port to listen on; 0 picks a free one
+        latency: Seconds added to every request
+        jitter: Up to this many more seconds, at random
+        error_rate: Fraction of requests answered with a 503 error
+        seed: Seed for jitter and errors
+        lost_rate: Fraction of writes that are carried out but get no
+            response, as if it timed out
+
+    Returns:
+        MockServer: The server; its url attribute is the base URL, and
+        shutdown() stops it
+    """
+    server = MockServer(("127.0.0.1", port), vault or Vault(), latency, jitter, error_rate, seed, lost_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8765, help="default: %(default)s")
+    parser.add_argument("--notes", type=int, default=1000, help="notes besides the root (default: %(default)s)")
+    parser.add_argument("--fanout", type=int, default=10, help="children per note (default: %(default)s)")
+    parser.add_argument("--depth", type=int, help="deepest level of the tree (default: no limit)")
+    parser.add_argument("--content-size", type=int, default=1024, help="bytes per note (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more milliseconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument("--lost-rate", type=float, default=0.0, help="fraction of writes whose response is dropped")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vault = Vault(args.notes, args.fanout, args.depth, args.content_size, args.seed)
+    server = serve(
+        vault, args.port, args.latency / 1000, args.jitter / 1000, args.error_rate, args.seed,
+        args.lost_rate,
+    )
+    print(f"Serving {len(vault.notes)} notes at {server.url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
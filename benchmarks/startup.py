@@ -0,0 +1,282 @@
+"""Startup and import-time benchmarks for tpy.
+
+Measures how long typical short-lived invocations take, against a local
+stub server so the network does not count:
+
+* cold: bytecode caches are empty, as after installing or upgrading
+* warm: median of repeated runs with caches populated
+* overhead: warm time minus the time the interpreter alone needs
+* imports: time spent importing modules the bare interpreter does not
+  load, from ``python -X importtime``, and the slowest of them
+
+Results can be written as JSON and compared with an earlier run. The
+script exits with status 1 if any measurement exceeds the limits in
+thresholds.json (or another file given with --thresholds).
+
+Usage:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --output before.json
+    python benchmarks/startup.py --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from stub_server import serve
+
+HERE = Path(__file__).resolve().parent
+
+# Benchmarked invocations, by name
+COMMANDS: Dict[str, List[str]] = {
+    "help": ["--help"],
+    "version": ["--version"],
+    "config-show": ["config", "show"],
+    "info-server": ["info", "server"],
+}
+
+# Runs tpy the way the installed console script does
+ENTRY = "import sys; from trilium_py_cli.cli import main; sys.argv[0] = 'tpy'; main()"
+
+
+def python(args: List[str], env: Dict[str, str], cwd: str) -> subprocess.CompletedProcess:
+    """Run the current interpreter with args, capturing output."""
+    return subprocess.run(
+        [sys.executable, *args], env=env, cwd=cwd,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+
+
+def time_run(args: List[str], env: Dict[str, str], cwd: str) -> Tuple[float, int]:
+    """Wall-clock milliseconds and exit status of one run."""
+    start = time.perf_counter()
+    result = python(args, env, cwd)
+    return (time.perf_counter() - start) * 1000, result.returncode
+
+
+def measure(
+    args: List[str], env: Dict[str, str], cwd: str, runs: int, cold_runs: int
+) -> Dict[str, Any]:
+    """Time cold and warm runs of one invocation.
+
+    Cold runs point PYTHONPYCACHEPREFIX at an empty directory, so every
+    module is compiled from source as on a fresh install.
+    """
+    cold = []
+    for _ in range(cold_runs):
+        with tempfile.TemporaryDirectory() as prefix:
+            cold.append(time_run(args, dict(env, PYTHONPYCACHEPREFIX=prefix), cwd)[0])
+
+    time_run(args, env, cwd)  # populate caches
+    warm = []
+    status = 0
+    for _ in range(runs):
+        elapsed, status = time_run(args, env, cwd)
+        warm.append(elapsed)
+
+    return {
+        "cold_ms": round(statistics.median(cold), 1) if cold else None,
+        "warm_ms": round(statistics.median(warm), 1),
+        "warm_min_ms": round(min(warm), 1),
+        "exit_status": status,
+    }
+
+
+def import_times(args: List[str], env: Dict[str, str], cwd: str) -> Dict[str, int]:
+    """Self import time in microseconds of every module a run imports."""
+    result = python(["-X", "importtime", *args], env, cwd)
+    times: Dict[str, int] = {}
+    for line in result.stderr.decode(errors="replace").splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(self_us)
+    return times
+
+
+def profile_imports(
+    args: List[str], baseline: Dict[str, int], env: Dict[str, str], cwd: str, top: int
+) -> Dict[str, Any]:
+    """Import cost of a run beyond what the bare interpreter imports."""
+    extra = {
+        name: us for name, us in import_times(args, env, cwd).items() if name not in baseline
+    }
+    slowest = sorted(extra.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "import_ms": round(sum(extra.values()) / 1000, 1),
+        "modules": len(extra),
+        "top_imports": [{"module": name, "ms": round(us / 1000, 1)} for name, us in slowest],
+        "loaded": sorted(extra),
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Current commit of the repository, if available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(runs: int, cold_runs: int, top: int) -> Dict[str, Any]:
+    """Benchmark every command in COMMANDS against a stub server."""
+    server, url = serve()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # config show reads the .env file in the working directory
+            Path(workdir, ".env").write_text(
+                f"TRILIUM_SERVER={url}\nTRILIUM_TOKEN=benchmark-token\n"
+            )
+            env = dict(
+                os.environ,
+                TRILIUM_SERVER=url,
+                TRILIUM_TOKEN="benchmark-token",
+                TPY_CACHE_FILE=str(Path(workdir, "cache.sqlite3")),
+                TPY_INDEX_FILE=str(Path(workdir, "index.sqlite3")),
+            )
+            env.pop("PYTHONPYCACHEPREFIX", None)
+
+            baseline_args = ["-c", "pass"]
+            baseline = measure(baseline_args, env, workdir, runs, cold_runs)
+            baseline_imports = import_times(baseline_args, env, workdir)
+
+            commands = {}
+            for name, argv in COMMANDS.items():
+                args = ["-c", ENTRY, *argv]
+                result = measure(args, env, workdir, runs, cold_runs)
+                result["overhead_ms"] = round(result["warm_ms"] - baseline["warm_ms"], 1)
+                result.update(profile_imports(args, baseline_imports, env, workdir, top))
+                commands[name] = result
+    finally:
+        server.shutdown()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "runs": runs,
+            "cold_runs": cold_runs,
+        },
+        "baseline": baseline,
+        "commands": commands,
+    }
+
+
+def check_thresholds(
+    results: Dict[str, Any], thresholds: Dict[str, Any], previous: Optional[Dict[str, Any]]
+) -> List[str]:
+    """Measurements that exceed the configured limits.
+
+    Returns:
+        list: One message per exceeded limit; empty if all are met
+    """
+    failures = []
+    for name, result in results["commands"].items():
+        if result["exit_status"] != 0:
+            failures.append(f"{name}: exited with status {result['exit_status']}")
+
+        limit = thresholds.get("overhead_ms", {}).get(name)
+        if limit is not None and result["overhead_ms"] > limit:
+            failures.append(f"{name}: startup overhead {result['overhead_ms']} ms > {limit} ms")
+
+        limit = thresholds.get("import_ms", {}).get(name)
+        if limit is not None and result["import_ms"] > limit:
+            failures.append(f"{name}: imports take {result['import_ms']} ms > {limit} ms")
+
+        forbidden = thresholds.get("forbidden_modules", {}).get(name, [])
+        loaded = [
+            module for module in result["loaded"]
+            if module.split(".")[0] in forbidden
+        ]
+        if loaded:
+            roots = sorted({module.split(".")[0] for module in loaded})
+            failures.append(f"{name}: imports {', '.join(roots)}")
+
+        regression = thresholds.get("max_regression_pct")
+        old = (previous or {}).get("commands", {}).get(name)
+        if regression is not None and old:
+            for key in ("overhead_ms", "import_ms"):
+                # Ignore noise on very small numbers
+                allowed = max(old[key] * (1 + regression / 100), old[key] + 5)
+                if result[key] > allowed:
+                    failures.append(
+                        f"{name}: {key} rose from {old[key]} to {result[key]} "
+                        f"(more than {regression}%)"
+                    )
+    return failures
+
+
+def print_report(results: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    """Print a summary table, with changes since previous if given."""
+    def delta(name: str, key: str) -> str:
+        old = (previous or {}).get("commands", {}).get(name)
+        if not old or old.get(key) is None:
+            return ""
+        return f" ({results['commands'][name][key] - old[key]:+.1f})"
+
+    baseline = results["baseline"]
+    print(f"Python {results['meta']['python']} on {results['meta']['platform']}")
+    print(f"Interpreter alone: {baseline['warm_ms']} ms warm, {baseline['cold_ms']} ms cold\n")
+    print(f"{'command':<14}{'cold ms':>16}{'warm ms':>16}{'overhead ms':>18}{'imports ms':>18}")
+    for name, result in results["commands"].items():
+        print(
+            f"{name:<14}"
+            f"{str(result['cold_ms']) + delta(name, 'cold_ms'):>16}"
+            f"{str(result['warm_ms']) + delta(name, 'warm_ms'):>16}"
+            f"{str(result['overhead_ms']) + delta(name, 'overhead_ms'):>18}"
+            f"{str(result['import_ms']) + delta(name, 'import_ms'):>18}"
+        )
+    for name, result in results["commands"].items():
+        slowest = ", ".join(f"{item['module']} {item['ms']}" for item in result["top_imports"][:5])
+        print(f"\n{name} slowest imports (ms): {slowest or '-'}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10, help="warm runs per command")
+    parser.add_argument("--cold-runs", type=int, default=3, help="cold runs per command")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to record")
+    parser.add_argument("--output", type=Path, help="write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="earlier results to compare with")
+    parser.add_argument(
+        "--thresholds", type=Path, default=HERE / "thresholds.json",
+        help="limits to enforce (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    previous = json.loads(args.compare.read_text()) if args.compare else None
+    thresholds = json.loads(args.thresholds.read_text()) if args.thresholds.exists() else {}
+
+    results = run_benchmarks(args.runs, args.cold_runs, args.top)
+    print_report(results, previous)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nResults written to {args.output}")
+
+    failures = check_thresholds(results, thresholds, previous)
+    if failures:
+        print("\nThresholds exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nAll thresholds met")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Minimal ETAPI stub for benchmarks that need a server to talk to.
+
+Answers GET /etapi/app-info and nothing else, instantly, so a benchmark
+measures tpy rather than the network or Trilium.
+
+Run standalone with ``python benchmarks/stub_server.py [PORT]``.
+"""
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+APP_INFO = {
+    "appVersion": "0.0.0-stub",
+    "dbVersion": 0,
+    "syncVersion": 0,
+    "buildDate": "1970-01-01T00:00:00Z",
+    "buildRevision": "stub",
+    "dataDirectory": "/dev/null",
+    "clipperProtocolVersion": "1.0",
+    "utcDateTime": "1970-01-01T00:00:00.000Z",
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs
+    # add 40 ms to every keep-alive request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] == "/etapi/app-info":
+            self._send(200, APP_INFO)
+        else:
+            self._send(404, {"status": 404, "code": "NOT_FOUND", "message": "stub"})
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub in a background thread.
+
+    Args:
+        port: Port to listen on; 0 picks a free one
+
+    Returns:
+        tuple: The server, to shut down when done, and its base URL
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    server, url = serve(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    print(f"Serving ETAPI stub at {url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
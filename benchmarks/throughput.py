@@ -0,0 +1,307 @@
+"""Throughput benchmarks for the notes commands, against a mock server.
+
+Runs notes tree, search, export and import (bulk create) against
+mock_server.py with synthetic vaults of 1k, 10k and 100k notes, and
+reports for each:
+
+* wall: median wall-clock time of a run, in ms
+* items/s: notes listed, found, downloaded or created per second
+* requests: ETAPI requests per run, and the mean ms per request
+
+Server latency and errors can be injected to see how the commands cope
+with a slow or flaky server. Results can be written as JSON and compared
+with an earlier run; with --max-regression the script exits with status
+1 if any scenario got slower than that.
+
+Usage:
+    python benchmarks/throughput.py
+    python benchmarks/throughput.py --sizes 1000 10000 --output before.json
+    python benchmarks/throughput.py --compare before.json --max-regression 20
+    python benchmarks/throughput.py --latency 20 --scenarios tree tree-walk
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from mock_server import Vault, serve
+from startup import ENTRY, git_commit
+
+# Files created per import run; the vault grows by this much every run
+IMPORT_FILES = 500
+
+
+class Scenario(NamedTuple):
+    """One benchmarked invocation.
+
+    argv receives the run's scratch directory; items receives the vault
+    size and the run's stdout and returns the number of items processed.
+    Scenarios are skipped for vaults larger than max_notes.
+    """
+
+    argv: Callable[[Path], List[str]]
+    items: Callable[[int, bytes], int]
+    max_notes: Optional[int] = None
+
+
+def output_lines(size: int, stdout: bytes) -> int:
+    return stdout.count(b"\n")
+
+
+def whole_vault(size: int, stdout: bytes) -> int:
+    return size + 1
+
+
+def make_import_dir(path: Path, files: int) -> None:
+    """A directory of small Markdown files in subdirectories of 100."""
+    for i in range(files):
+        subdir = path / f"dir{i // 100}"
+        subdir.mkdir(parents=True, exist_ok=True)
+        (subdir / f"note{i}.md").write_text(f"# Note {i}\n\nImported by the benchmark.\n")
+
+
+def import_items(size: int, stdout: bytes) -> int:
+    # A book note per directory, and a note per file
+    return -(-IMPORT_FILES // 100) + IMPORT_FILES
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "tree": Scenario(
+        lambda tmp: ["notes", "tree", "--max-depth", "1000", "--format", "ndjson"],
+        output_lines,
+    ),
+    "tree-walk": Scenario(
+        lambda tmp: ["notes", "tree", "--max-depth", "1000", "--format", "ndjson",
+                     "--fetch", "walk", "--concurrency", "16"],
+        output_lines,
+        max_notes=10_000,
+    ),
+    "search": Scenario(
+        lambda tmp: ["notes", "search", "alpha", "--format", "ndjson"],
+        output_lines,
+    ),
+    "search-label": Scenario(
+        lambda tmp: ["notes", "search", "#todo", "--order-by", "title", "--limit", "50",
+                     "--format", "ndjson"],
+        output_lines,
+    ),
+    "export": Scenario(
+        lambda tmp: ["notes", "export", "root", str(tmp / "export"), "--concurrency", "16"],
+        whole_vault,
+        max_notes=10_000,
+    ),
+    # Last, since it adds notes to the vault
+    "import": Scenario(
+        lambda tmp: ["notes", "import", str(tmp.parent / "import"), "--parent-id", "root",
+                     "--journal", str(tmp / "journal.jsonl"), "--concurrency", "16"],
+        import_items,
+    ),
+}
+
+
+def run_scenario(
+    scenario: Scenario, size: int, server: Any, env: Dict[str, str], workdir: Path, runs: int
+) -> Dict[str, Any]:
+    """Time runs of one scenario; every run starts with an empty scratch directory."""
+    walls = []
+    requests = []
+    errors = 0
+    status = 0
+    items = 0
+    for i in range(runs):
+        tmp = workdir / f"run{i}"
+        tmp.mkdir()
+        server.reset_stats()
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", ENTRY, "--no-cache", *scenario.argv(tmp)],
+            env=env, cwd=tmp, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        walls.append((time.perf_counter() - start) * 1000)
+        stats = server.reset_stats()
+        requests.append(sum(n for key, n in stats.items() if key not in ("errors", "bytes")))
+        errors += stats.get("errors", 0)
+        items = scenario.items(size, result.stdout)
+        if result.returncode:
+            status = result.returncode
+            sys.stderr.write(result.stderr.decode(errors="replace")[-2000:])
+        shutil.rmtree(tmp)
+
+    wall = statistics.median(walls)
+    request_count = statistics.median(requests)
+    return {
+        "wall_ms": round(wall, 1),
+        "wall_min_ms": round(min(walls), 1),
+        "items": items,
+        "items_per_s": round(items / wall * 1000, 1) if wall else None,
+        "requests": int(request_count),
+        "ms_per_request": round(wall / request_count, 2) if request_count else None,
+        "injected_errors": errors,
+        "exit_status": status,
+    }
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the selected scenarios for every vault size."""
+    results: Dict[str, Dict[str, Any]] = {}
+    for size in args.sizes:
+        print(f"Generating a vault of {size} notes...", file=sys.stderr)
+        vault = Vault(size, args.fanout, args.depth, args.content_size)
+        server = serve(
+            vault,
+            latency=args.latency / 1000,
+            jitter=args.jitter / 1000,
+            error_rate=args.error_rate,
+        )
+        try:
+            with tempfile.TemporaryDirectory() as workdir_name:
+                workdir = Path(workdir_name)
+                make_import_dir(workdir / "import", IMPORT_FILES)
+                env = dict(
+                    os.environ,
+                    TRILIUM_SERVER=server.url,
+                    TRILIUM_TOKEN="benchmark-token",
+                    TPY_CACHE_FILE=str(workdir / "cache.sqlite3"),
+                    TPY_INDEX_FILE=str(workdir / "index.sqlite3"),
+                    TPY_NO_DAEMON="1",
+                )
+                for name in args.scenarios:
+                    scenario = SCENARIOS[name]
+                    if scenario.max_notes is not None and size > scenario.max_notes and not args.all:
+                        continue
+                    print(f"  {name}...", file=sys.stderr)
+                    result = run_scenario(scenario, size, server, env, workdir, args.runs)
+                    results.setdefault(name, {})[str(size)] = result
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+            "fanout": args.fanout,
+            "depth": args.depth,
+            "content_size": args.content_size,
+            "latency_ms": args.latency,
+            "jitter_ms": args.jitter,
+            "error_rate": args.error_rate,
+        },
+        "scenarios": results,
+    }
+
+
+def regressions(
+    results: Dict[str, Any], previous: Dict[str, Any], max_regression: float
+) -> List[str]:
+    """Scenarios whose median wall time rose by more than max_regression percent."""
+    failures = []
+    for name, sizes in results["scenarios"].items():
+        for size, result in sizes.items():
+            old = previous.get("scenarios", {}).get(name, {}).get(size)
+            if not old:
+                continue
+            # Ignore noise on very short runs
+            allowed = max(old["wall_ms"] * (1 + max_regression / 100), old["wall_ms"] + 20)
+            if result["wall_ms"] > allowed:
+                failures.append(
+                    f"{name} @ {size}: wall time rose from {old['wall_ms']} to "
+                    f"{result['wall_ms']} ms (more than {max_regression:g}%)"
+                )
+    return failures
+
+
+def print_report(results: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    """Print one table row per scenario and vault size."""
+    def delta(name: str, size: str, key: str) -> str:
+        old = (previous or {}).get("scenarios", {}).get(name, {}).get(size)
+        if not old or old.get(key) is None:
+            return ""
+        return f" ({results['scenarios'][name][size][key] - old[key]:+.0f})"
+
+    meta = results["meta"]
+    print(f"Python {meta['python']} on {meta['platform']}")
+    print(
+        f"Mock server: {meta['latency_ms']:g} ms latency (+{meta['jitter_ms']:g} jitter), "
+        f"{meta['error_rate']:.1%} errors, fanout {meta['fanout']}\n"
+    )
+    print(f"{'scenario':<14}{'notes':>8}{'wall ms':>18}{'items/s':>16}{'requests':>10}{'ms/req':>8}")
+    for name, sizes in results["scenarios"].items():
+        for size, result in sizes.items():
+            failed = "" if result["exit_status"] == 0 else f"  exit {result['exit_status']}"
+            print(
+                f"{name:<14}{size:>8}"
+                f"{str(result['wall_ms']) + delta(name, size, 'wall_ms'):>18}"
+                f"{str(result['items_per_s']) + delta(name, size, 'items_per_s'):>16}"
+                f"{result['requests']:>10}"
+                f"{str(result['ms_per_request']):>8}{failed}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000],
+        help="vault sizes in notes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+        help="scenarios to run (default: all)",
+    )
+    parser.add_argument(
+        "--all", action="store_true",
+        help="also run scenarios above their size limit (tree-walk and export stop at 10k)",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="runs per scenario and size")
+    parser.add_argument("--fanout", type=int, default=10, help="children per note")
+    parser.add_argument("--depth", type=int, help="deepest level of the vault tree")
+    parser.add_argument("--content-size", type=int, default=1024, help="bytes of content per note")
+    parser.add_argument("--latency", type=float, default=0.0, help="ms added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument("--output", type=Path, help="write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="earlier results to compare with")
+    parser.add_argument(
+        "--max-regression", type=float,
+        help="with --compare, fail if a wall time rose by more than this percentage",
+    )
+    args = parser.parse_args()
+
+    previous = json.loads(args.compare.read_text()) if args.compare else None
+    results = run_benchmarks(args)
+    print_report(results, previous)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nResults written to {args.output}")
+
+    failures = [
+        f"{name} @ {size}: exited with status {result['exit_status']}"
+        for name, sizes in results["scenarios"].items()
+        for size, result in sizes.items()
+        if result["exit_status"] != 0 and not args.error_rate
+    ]
+    if previous and args.max_regression is not None:
+        failures.extend(regressions(results, previous, args.max_regression))
+    if failures:
+        print("\nFailures:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
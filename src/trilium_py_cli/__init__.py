@@ -1,8 +1,16 @@
 """Trilium-py CLI - Command line interface for trilium-py."""
 
-__version__ = "0.1.0"
+from typing import Any
 
-# Import main CLI function for direct access
-from .cli import main  # noqa: F401
+__version__ = "0.1.0"
 
 __all__ = ["__version__", "main"]
+
+
+def __getattr__(name: str) -> Any:
+    # main is imported on first access, so that the tpy entry point in
+    # daemon.py can forward a command without loading the CLI
+    if name == "main":
+        from .cli import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,433 @@
+"""Asyncio ETAPI client for high-concurrency commands."""
+
+import asyncio
+import contextvars
+import hashlib
+import os
+import secrets
+import string
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+
+from trilium_py.client import ETAPI
+
+from . import profiling
+from .session import DEFAULT_SETTINGS, http
+from .throttle import AdaptiveController
+from .transfer import CHUNK_SIZE, content_headers, download_note_content, upload_content
+from .utils import EtapiError
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+T = TypeVar("T")
+
+ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def new_entity_id(seed: Optional[str] = None) -> str:
+    """An ID as Trilium makes them: 12 letters and digits.
+
+    It is random, or derived from seed, so that the same seed always gives
+    the same ID.
+    """
+    if seed is None:
+        return "".join(secrets.choice(ID_ALPHABET) for _ in range(12))
+    number = int.from_bytes(hashlib.sha256(seed.encode()).digest(), "big")
+    chars = []
+    for _ in range(12):
+        number, i = divmod(number, len(ID_ALPHABET))
+        chars.append(ID_ALPHABET[i])
+    return "".join(chars)
+
+
+def _query_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    # ETAPI expects lowercase booleans and no empty values
+    return {
+        key: ("true" if value else "false") if isinstance(value, bool) else value
+        for key, value in params.items()
+        if value is not None
+    }
+
+
+def _check(response: Any) -> Any:
+    """Raise EtapiError for an httpx or requests error response."""
+    if response.status_code < 400:
+        return response
+    try:
+        message = response.json().get("message", "")
+    except ValueError:
+        message = response.text[:200]
+    raise EtapiError(f"{response.status_code}: {message}", status=response.status_code)
+
+
+class AsyncETAPI:
+    """Async client for the ETAPI endpoints tpy uses.
+
+    At most ``concurrency`` requests are in flight at a time, fewer while
+    the server shows strain, and transient failures are retried up to
+    ``retries`` times; see throttle.AdaptiveController. POST requests are
+    not retried, since a request that timed out may still have succeeded;
+    to retry a create, give it an ID and use throttle.create_once_async.
+    With httpx installed every request is a coroutine on one pooled
+    AsyncClient, so thousands of pending requests cost no threads. Without
+    it, requests run on the shared sync session in a pool of
+    ``concurrency`` threads.
+
+    Unlike trilium-py, error responses raise EtapiError.
+
+    Use as an async context manager::
+
+        async with AsyncETAPI.from_etapi(ea, concurrency=32) as aea:
+            notes = await aea.get_notes(note_ids)
+    """
+
+    def __init__(
+        self,
+        server_url: str,
+        token: Optional[str],
+        concurrency: int = 8,
+        settings: Optional[Dict[str, Any]] = None,
+        sync: Optional[ETAPI] = None,
+        retries: int = 3,
+    ) -> None:
+        self.server_url = server_url.rstrip("/")
+        self.token = token
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self._sync = sync or ETAPI(server_url, token)
+        self._client: Any = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.controller: Optional[AdaptiveController] = None
+
+    @classmethod
+    def from_etapi(cls, ea: ETAPI, concurrency: int = 8, retries: int = 3) -> "AsyncETAPI":
+        """Create an async client for the same server, token and settings."""
+        settings = getattr(http(ea), "settings", None)
+        return cls(ea.server_url, ea.token, concurrency, settings, sync=ea, retries=retries)
+
+    async def __aenter__(self) -> "AsyncETAPI":
+        # Created here so they bind to the running event loop
+        self.controller = AdaptiveController(self.concurrency, retries=self.retries)
+        if httpx is not None:
+            keep_alive = self.settings["pool_size"] if self.settings["keep_alive"] else 0
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=keep_alive,
+                ),
+                timeout=httpx.Timeout(
+                    self.settings["read_timeout"],
+                    connect=self.settings["connect_timeout"],
+                ),
+                headers={
+                    "Authorization": self.token or "",
+                    "Accept-Encoding": "gzip, deflate" if self.settings["gzip"] else "identity",
+                },
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> Any:
+        """Send one request and return the checked response."""
+        assert self.controller is not None, "use AsyncETAPI as an async context manager"
+        url = f"{self.server_url}/etapi/{path}"
+        if "params" in kwargs:
+            kwargs["params"] = _query_params(kwargs["params"])
+        if self._client is None and "content" in kwargs:
+            kwargs["data"] = kwargs.pop("content")
+
+        async def send() -> Any:
+            if self._client is not None:
+                response = await self._profiled(
+                    method, url, self._client.request(method, url, **kwargs)
+                )
+            else:
+                session = http(self._sync)
+                # The session profiles the request; copying the context
+                # passes on the attempt number
+                context = contextvars.copy_context()
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self._executor,
+                    lambda: context.run(
+                        session.request, method, url, headers=self._sync.get_header(), **kwargs
+                    ),
+                )
+            return _check(response)
+
+        return await self.controller.run(send, retry=method != "POST")
+
+    async def _profiled(self, method: str, url: str, request: Awaitable[Any]) -> Any:
+        """Await an httpx request, recording it if profiling."""
+        profiler = profiling.ACTIVE
+        if profiler is None:
+            return await request
+        start = time.perf_counter()
+        try:
+            response = await request
+        except Exception as e:
+            profiler.record(method, url, start, time.perf_counter() - start, None, error=repr(e))
+            raise
+        profiler.record(
+            method, url, start, time.perf_counter() - start, response.status_code,
+            # Streamed bodies have no .content to measure
+            int(response.request.headers.get("Content-Length", 0)), response.num_bytes_downloaded,
+        )
+        return response
+
+    async def app_info(self) -> Dict[str, Any]:
+        """Basic information about the running Trilium version."""
+        return (await self._request("GET", "app-info")).json()
+
+    async def _find(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            return (await self._request("GET", path)).json()
+        except EtapiError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    async def find_note(self, note_id: str) -> Optional[Dict[str, Any]]:
+        """A note's metadata, or None if there is no such note."""
+        return await self._find(f"notes/{note_id}")
+
+    async def find_attribute(self, attribute_id: str) -> Optional[Dict[str, Any]]:
+        """An attribute, or None if there is no such attribute."""
+        return await self._find(f"attributes/{attribute_id}")
+
+    async def get_note(self, note_id: str) -> Dict[str, Any]:
+        """Note metadata by ID."""
+        return (await self._request("GET", f"notes/{note_id}")).json()
+
+    async def get_notes(
+        self, note_ids: Iterable[str]
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """Fetch several notes at once.
+
+        Returns:
+            list: Note metadata, or the exception raised for that note, in
+            the order of note_ids
+        """
+        return await asyncio.gather(
+            *(self.get_note(note_id) for note_id in note_ids), return_exceptions=True
+        )
+
+    async def get_child_notes(self, note_id: str) -> List[Dict[str, Any]]:
+        """Metadata of a note's children, in branch order."""
+        note = await self.get_note(note_id)
+        children = await self.get_notes(note.get("childNoteIds", []))
+        return [child for child in children if isinstance(child, dict)]
+
+    async def get_note_content(self, note_id: str) -> str:
+        """Note content as text."""
+        return (await self._request("GET", f"notes/{note_id}/content")).text
+
+    async def get_note_content_head(self, note_id: str, max_bytes: int) -> Tuple[bytes, bool]:
+        """The start of a note's content, without reading the rest.
+
+        Returns:
+            tuple: (up to max_bytes of content, whether there is more)
+        """
+        assert self.controller is not None, "use AsyncETAPI as an async context manager"
+        url = f"{self.server_url}/etapi/notes/{note_id}/content"
+
+        def read_sync() -> bytearray:
+            head = bytearray()
+            with http(self._sync).get(url, headers=self._sync.get_header(), stream=True) as response:
+                _check(response)
+                for chunk in response.iter_content(chunk_size=max(max_bytes + 1, 1024)):
+                    head += chunk
+                    if len(head) > max_bytes:
+                        break
+            return head
+
+        async def read() -> bytearray:
+            if self._client is None:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executor, contextvars.copy_context().run, read_sync
+                )
+            head = bytearray()
+            start = time.perf_counter()
+            response = None
+            try:
+                async with self._client.stream("GET", url) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        _check(response)
+                    async for chunk in response.aiter_bytes():
+                        head += chunk
+                        if len(head) > max_bytes:
+                            break
+            finally:
+                if profiling.ACTIVE is not None:
+                    profiling.ACTIVE.record(
+                        "GET", url, start, time.perf_counter() - start,
+                        response.status_code if response is not None else None,
+                        0, response.num_bytes_downloaded if response is not None else 0,
+                    )
+            return head
+
+        head = await self.controller.run(read)
+        return bytes(head[:max_bytes]), len(head) > max_bytes
+
+    async def search_note(self, search: str, **params: Any) -> Dict[str, Any]:
+        """Search notes; params are passed to ETAPI as query parameters."""
+        params["search"] = search
+        return (await self._request("GET", "notes", params=params)).json()
+
+    async def create_note(
+        self,
+        parentNoteId: str,
+        title: str,
+        type: str,
+        content: str = "",
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """Create a note; returns the new note and branch."""
+        body = {
+            "parentNoteId": parentNoteId,
+            "title": title,
+            "type": type,
+            "content": content,
+        }
+        body.update((key, value) for key, value in params.items() if value is not None)
+        return (await self._request("POST", "create-note", json=body)).json()
+
+    async def create_attribute(self, **attribute: Any) -> Dict[str, Any]:
+        """Add a label or relation: noteId, type, name, value, isInheritable,
+        and optionally the attributeId to give it."""
+        return (await self._request("POST", "attributes", json=attribute)).json()
+
+    async def patch_attribute(self, attribute_id: str, **changes: Any) -> Dict[str, Any]:
+        """Change an attribute's value or position."""
+        return (await self._request("PATCH", f"attributes/{attribute_id}", json=changes)).json()
+
+    async def delete_attribute(self, attribute_id: str) -> None:
+        await self._request("DELETE", f"attributes/{attribute_id}")
+
+    async def create_branch(
+        self, note_id: str, parent_note_id: str, prefix: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Place a note below another one as well; ETAPI updates the
+        branch if there is one already."""
+        body = {"noteId": note_id, "parentNoteId": parent_note_id}
+        if prefix is not None:
+            body["prefix"] = prefix
+        return (await self._request("POST", "branches", json=body)).json()
+
+    async def delete_branch(self, branch_id: str) -> None:
+        """Remove a note from one parent; ETAPI deletes the note with its last branch."""
+        await self._request("DELETE", f"branches/{branch_id}")
+
+    async def delete_note(self, note_id: str) -> None:
+        await self._request("DELETE", f"notes/{note_id}")
+
+    async def download_note_content(
+        self, note_id: str, dest: Path, chunk_size: int = CHUNK_SIZE
+    ) -> int:
+        """Stream a note's content into a file; see transfer.download_note_content."""
+        assert self.controller is not None, "use AsyncETAPI as an async context manager"
+        if self._client is None:
+            return await self.controller.run(
+                lambda: asyncio.get_running_loop().run_in_executor(
+                    self._executor,
+                    contextvars.copy_context().run,
+                    download_note_content, self._sync, note_id, dest, chunk_size,
+                )
+            )
+        return await self.controller.run(
+            lambda: self._download(note_id, dest, chunk_size)
+        )
+
+    async def upload_content(self, path: str, source: Path, mime: Optional[str] = None) -> int:
+        """Stream a file up as content; see transfer.upload_content.
+
+        The file is only opened once the request has a slot, so uploads
+        waiting for one hold no file content in memory.
+        """
+        assert self.controller is not None, "use AsyncETAPI as an async context manager"
+        if self._client is None:
+            return await self.controller.run(
+                lambda: asyncio.get_running_loop().run_in_executor(
+                    self._executor,
+                    contextvars.copy_context().run,
+                    # The controller retries, so upload_content must not
+                    upload_content, self._sync, path, source, mime, 0,
+                )
+            )
+        return await self.controller.run(lambda: self._upload(path, source, mime))
+
+    async def _upload(self, path: str, source: Path, mime: Optional[str]) -> int:
+        url = f"{self.server_url}/etapi/{path}"
+        size = source.stat().st_size
+
+        async def chunks() -> AsyncIterator[bytes]:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    yield chunk
+
+        headers = {**content_headers(mime), "Content-Length": str(size)}
+        _check(await self._profiled("PUT", url, self._client.put(url, content=chunks(), headers=headers)))
+        return size
+
+    async def _download(self, note_id: str, dest: Path, chunk_size: int) -> int:
+        url = f"{self.server_url}/etapi/notes/{note_id}/content"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.part")
+        size = 0
+        start = time.perf_counter()
+        response = None
+        try:
+            async with self._client.stream("GET", url) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    _check(response)
+                try:
+                    with open(tmp_path, "wb") as f:
+                        async for chunk in response.aiter_bytes(chunk_size):
+                            f.write(chunk)
+                            size += len(chunk)
+                    os.replace(tmp_path, dest)
+                except BaseException:
+                    tmp_path.unlink(missing_ok=True)
+                    raise
+        finally:
+            if profiling.ACTIVE is not None:
+                profiling.ACTIVE.record(
+                    "GET", url, start, time.perf_counter() - start,
+                    response.status_code if response is not None else None,
+                    0, response.num_bytes_downloaded if response is not None else 0,
+                )
+        return size
+
+
+def run_async(
+    ea: ETAPI,
+    concurrency: int,
+    func: Callable[[AsyncETAPI], Awaitable[T]],
+    retries: int = 3,
+) -> T:
+    """Run func with an AsyncETAPI for ea's server on a new event loop.
+
+    Lets synchronous command code hand a fan-out to the async client.
+    """
+    async def main() -> T:
+        async with AsyncETAPI.from_etapi(ea, concurrency, retries) as aea:
+            return await func(aea)
+
+    return asyncio.run(main())
@@ -0,0 +1,255 @@
+"""One change applied to every note of a search result.
+
+Each operation plans the requests a note needs from its metadata as the
+search returned it, so a dry run lists exactly what a real run would
+send, and notes that have the change already cost no request. Running
+the same change again therefore only touches the notes where it failed.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from trilium_py.client import ETAPI
+
+from .async_client import AsyncETAPI, new_entity_id, run_async
+from .throttle import call_with_retry_async, create_once_async
+from .utils import EtapiError
+
+# One request of a plan: what it does, for people, and how to send it
+Step = Tuple[str, Callable[[AsyncETAPI], Awaitable[Any]]]
+
+# Called per note with the steps that were done and the error, if any
+DoneHandler = Callable[[Dict[str, Any], List[str], Optional[Exception]], None]
+
+
+def attribute_text(attribute_type: str, name: str, value: Optional[str]) -> str:
+    """An attribute as Trilium writes it, e.g. #todo, #status=done or ~author=abc123."""
+    sigil = "#" if attribute_type == "label" else "~"
+    return f"{sigil}{name}={value}" if value else f"{sigil}{name}"
+
+
+def owned_attributes(note: Dict[str, Any], attribute_type: str, name: str) -> List[Dict[str, Any]]:
+    """A note's own attributes of a type and name, leaving out inherited ones."""
+    return [
+        attribute for attribute in note.get("attributes") or []
+        if attribute.get("type") == attribute_type
+        and attribute.get("name") == name
+        and attribute.get("noteId", note["noteId"]) == note["noteId"]
+    ]
+
+
+async def delete_once(request: Awaitable[None]) -> None:
+    """Send a DELETE; what it deletes being gone already counts as done.
+
+    The controller retries DELETEs, and a retry after a response that was
+    lost finds nothing left to delete.
+    """
+    try:
+        await request
+    except EtapiError as e:
+        if e.status != 404:
+            raise
+
+
+class BulkOperation:
+    """A change to make to many notes; subclasses implement plan."""
+
+    def plan(self, note: Dict[str, Any]) -> List[Step]:
+        """The requests that make the change to a note, none if it has it.
+
+        Raises:
+            ValueError: If the change cannot be made to this note
+        """
+        raise NotImplementedError
+
+
+class SetAttribute(BulkOperation):
+    """Give notes a label or relation.
+
+    A label a note already has with another value is changed. A relation
+    is added next to any others of the same name, since notes often have
+    several, e.g. to different authors.
+    """
+
+    def __init__(self, attribute_type: str, name: str, value: str = "", inheritable: bool = False) -> None:
+        self.attribute_type = attribute_type
+        self.name = name
+        self.value = value
+        self.inheritable = inheritable
+
+    def plan(self, note: Dict[str, Any]) -> List[Step]:
+        existing = owned_attributes(note, self.attribute_type, self.name)
+        if any((attribute.get("value") or "") == self.value for attribute in existing):
+            return []
+        text = attribute_text(self.attribute_type, self.name, self.value)
+        if existing and self.attribute_type == "label":
+            attribute_id = existing[0]["attributeId"]
+            return [(f"set {text}", lambda aea: aea.patch_attribute(attribute_id, value=self.value))]
+
+        # With its ID chosen here, a retry finds an attribute whose create
+        # timed out instead of adding it twice
+        new_id = new_entity_id()
+        return [(f"add {text}", lambda aea: create_once_async(
+            lambda: aea.create_attribute(
+                attributeId=new_id,
+                noteId=note["noteId"],
+                type=self.attribute_type,
+                name=self.name,
+                value=self.value,
+                isInheritable=self.inheritable,
+            ),
+            lambda: aea.find_attribute(new_id),
+            retries=aea.retries,
+        ))]
+
+
+class RemoveAttribute(BulkOperation):
+    """Remove a note's own labels or relations of a name, optionally only with a value."""
+
+    def __init__(self, attribute_type: str, name: str, value: Optional[str] = None) -> None:
+        self.attribute_type = attribute_type
+        self.name = name
+        self.value = value
+
+    def plan(self, note: Dict[str, Any]) -> List[Step]:
+        return [
+            (
+                f"remove {attribute_text(self.attribute_type, self.name, attribute.get('value'))}",
+                lambda aea, attribute_id=attribute["attributeId"]: delete_once(
+                    aea.delete_attribute(attribute_id)
+                ),
+            )
+            for attribute in owned_attributes(note, self.attribute_type, self.name)
+            if self.value is None or (attribute.get("value") or "") == self.value
+        ]
+
+
+class Clone(BulkOperation):
+    """Place notes below another parent as well, keeping their current ones."""
+
+    def __init__(self, parent_id: str, prefix: Optional[str] = None) -> None:
+        self.parent_id = parent_id
+        self.prefix = prefix
+
+    def plan(self, note: Dict[str, Any]) -> List[Step]:
+        if self.parent_id in (note.get("parentNoteIds") or []):
+            return []
+        # Safe to retry: ETAPI updates a branch that already exists
+        return [(f"clone to {self.parent_id}", lambda aea: call_with_retry_async(
+            lambda: aea.create_branch(note["noteId"], self.parent_id, self.prefix),
+            retries=aea.retries,
+        ))]
+
+
+class Move(BulkOperation):
+    """Move notes below another parent.
+
+    The new branch is made first and the old ones removed after, so a
+    note is never left without a parent, which would delete it. Without
+    from_parent a note leaves all its other parents; with it, only that
+    one.
+    """
+
+    def __init__(self, parent_id: str, from_parent: Optional[str] = None, prefix: Optional[str] = None) -> None:
+        self.parent_id = parent_id
+        self.from_parent = from_parent
+        self.prefix = prefix
+
+    def plan(self, note: Dict[str, Any]) -> List[Step]:
+        if note["noteId"] == "root":
+            raise ValueError("the root note cannot be moved")
+        branches = list(zip(note.get("parentNoteIds") or [], note.get("parentBranchIds") or []))
+        parent_ids = [parent_id for parent_id, _ in branches]
+        if self.from_parent is not None and self.from_parent not in parent_ids:
+            raise ValueError(f"not below {self.from_parent}")
+
+        steps: List[Step] = []
+        if self.parent_id not in parent_ids:
+            steps.extend(Clone(self.parent_id, self.prefix).plan(note))
+        for parent_id, branch_id in branches:
+            if parent_id != self.parent_id and self.from_parent in (None, parent_id):
+                steps.append((
+                    f"remove from {parent_id}",
+                    lambda aea, branch_id=branch_id: delete_once(aea.delete_branch(branch_id)),
+                ))
+        return steps
+
+
+class Delete(BulkOperation):
+    """Delete notes, and their children that have no other parent.
+
+    A note that is already gone, e.g. because it was below another
+    deleted note, counts as deleted.
+    """
+
+    def plan(self, note: Dict[str, Any]) -> List[Step]:
+        if note["noteId"] == "root":
+            raise ValueError("the root note cannot be deleted")
+
+        return [("delete", lambda aea: delete_once(aea.delete_note(note["noteId"])))]
+
+
+async def apply_bulk_async(
+    aea: AsyncETAPI,
+    notes: List[Dict[str, Any]],
+    operation: BulkOperation,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Apply an operation to notes, concurrently up to the client's limit.
+
+    The steps for one note run in order, and stop at the first failure.
+
+    Args:
+        aea: Async ETAPI client
+        notes: Note metadata as returned by a search
+        operation: The change to make
+        on_done: Called for every note as it finishes
+
+    Returns:
+        dict: Counts of changed, unchanged and failed notes
+    """
+    counts = {"changed": 0, "unchanged": 0, "failed": 0}
+
+    async def apply(note: Dict[str, Any]) -> None:
+        done: List[str] = []
+        error: Optional[Exception] = None
+        try:
+            for description, send in operation.plan(note):
+                await send(aea)
+                done.append(description)
+        except Exception as e:
+            error = e
+        counts["failed" if error else "changed" if done else "unchanged"] += 1
+        if on_done:
+            on_done(note, done, error)
+
+    await asyncio.gather(*(apply(note) for note in notes))
+    return counts
+
+
+def apply_bulk(
+    ea: ETAPI,
+    notes: List[Dict[str, Any]],
+    operation: BulkOperation,
+    concurrency: int = 8,
+    retries: int = 3,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Apply an operation to notes; see apply_bulk_async.
+
+    Args:
+        ea: ETAPI client
+        notes: Note metadata as returned by a search
+        operation: The change to make
+        concurrency: Maximum number of requests in flight
+        retries: Retries for transient failures
+        on_done: Called for every note as it finishes
+
+    Returns:
+        dict: Counts of changed, unchanged and failed notes
+    """
+    return run_async(
+        ea, concurrency,
+        lambda aea: apply_bulk_async(aea, notes, operation, on_done),
+        retries=retries,
+    )
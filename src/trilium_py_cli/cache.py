@@ -0,0 +1,316 @@
+"""Local note metadata cache for tpy-cli."""
+
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# Cache location and limits, overridable through the environment or .env
+CACHE_FILE = Path.home() / ".trilium-py" / "cache.sqlite3"
+DEFAULT_TTL = 300  # seconds
+DEFAULT_MAX_ENTRIES = 100_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    server TEXT NOT NULL,
+    note_id TEXT NOT NULL,
+    utc_date_modified TEXT,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (server, note_id)
+);
+CREATE INDEX IF NOT EXISTS notes_accessed ON notes (accessed_at);
+CREATE TABLE IF NOT EXISTS queries (
+    server TEXT NOT NULL,
+    query TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    note_ids TEXT NOT NULL,
+    PRIMARY KEY (server, query)
+);
+"""
+
+
+def query_key(query: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Key a search is cached under; searches with other parameters differ."""
+    if not params:
+        return query
+    return f"{query}\n{json.dumps(params, sort_keys=True)}"
+
+
+class MetadataCache:
+    """SQLite cache of note metadata keyed by server and note ID.
+
+    Entries older than ``ttl`` seconds are ignored on read, and the least
+    recently used entries are evicted once the cache holds more than
+    ``max_entries`` notes. Commands that change notes call invalidate, since
+    a note's children, branches and attributes can change without its
+    ``utcDateModified`` changing.
+
+    With ``refresh`` set, reads always miss but fetched notes are still
+    written, so the next run starts warm.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        path: Path = CACHE_FILE,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        refresh: bool = False,
+    ) -> None:
+        self.server = server
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls, server: str, refresh: bool = False) -> "MetadataCache":
+        """Create a cache configured from TPY_CACHE_* environment variables."""
+        return cls(
+            server,
+            path=Path(os.getenv("TPY_CACHE_FILE", str(CACHE_FILE))).expanduser(),
+            ttl=float(os.getenv("TPY_CACHE_TTL", DEFAULT_TTL)),
+            max_entries=int(os.getenv("TPY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            refresh=refresh,
+        )
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the database on first use."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _fresh_after(self) -> float:
+        return time.time() - self.ttl
+
+    def get(self, note_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single cached note, or None if missing or expired."""
+        return self.get_many([note_id]).get(note_id)
+
+    def get_many(self, note_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the cached notes among note_ids that have not expired.
+
+        Returns:
+            dict: Note metadata keyed by note ID; misses are left out
+        """
+        if self.refresh:
+            return {}
+
+        ids = list(dict.fromkeys(note_ids))
+        found: Dict[str, Dict[str, Any]] = {}
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT note_id, data FROM notes WHERE server = ? AND fetched_at >= ? "
+                f"AND note_id IN ({','.join('?' * len(chunk))})",
+                [self.server, self._fresh_after(), *chunk],
+            ).fetchall()
+            for note_id, data in rows:
+                found[note_id] = json.loads(data)
+
+        if found:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE notes SET accessed_at = ? WHERE server = ? AND note_id = ?",
+                    [(now, self.server, note_id) for note_id in found],
+                )
+        return found
+
+    def put_many(self, notes: Iterable[Dict[str, Any]]) -> None:
+        """Store note metadata, replacing what was cached for the same notes."""
+        now = time.time()
+        rows = [
+            (self.server, note["noteId"], note.get("utcDateModified"), now, now,
+             json.dumps(note))
+            for note in notes
+            if isinstance(note, dict) and "noteId" in note
+        ]
+        if not rows:
+            return
+
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO notes
+                    (server, note_id, utc_date_modified, fetched_at, accessed_at, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (server, note_id) DO UPDATE SET
+                    fetched_at = excluded.fetched_at,
+                    accessed_at = excluded.accessed_at,
+                    data = excluded.data,
+                    utc_date_modified = excluded.utc_date_modified
+                """,
+                rows,
+            )
+        self.evict()
+
+    def invalidate(self, note_ids: Iterable[str]) -> None:
+        """Drop notes that were changed, and the parents they are cached under.
+
+        Cached searches of the server are dropped too, since a change can
+        add a note to or remove it from any of them. Pass the new parents
+        of created, moved or cloned notes along with the notes; former
+        parents are found from the cached notes.
+        """
+        ids = set(note_ids)
+        changed = list(ids)
+        for start in range(0, len(changed), 500):
+            chunk = changed[start:start + 500]
+            for (data,) in self.conn.execute(
+                f"SELECT data FROM notes WHERE server = ? "
+                f"AND note_id IN ({','.join('?' * len(chunk))})",
+                [self.server, *chunk],
+            ):
+                ids.update(json.loads(data).get("parentNoteIds") or [])
+
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM notes WHERE server = ? AND note_id = ?",
+                [(self.server, note_id) for note_id in ids],
+            )
+            self.conn.execute("DELETE FROM queries WHERE server = ?", (self.server,))
+
+    def get_subtree(self, root: str, max_depth: int) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Get a whole subtree from the cache.
+
+        Returns:
+            dict: Note metadata keyed by note ID, or None unless every note
+            down to max_depth is cached and fresh
+        """
+        notes: Dict[str, Dict[str, Any]] = {}
+        level = [root]
+        depth = 0
+        while level and depth <= max_depth:
+            found = self.get_many(level)
+            if len(found) < len(set(level)):
+                return None
+            notes.update(found)
+            if depth < max_depth:
+                level = [
+                    child_id
+                    for note in found.values()
+                    for child_id in note.get("childNoteIds", [])
+                    if child_id not in notes
+                ]
+            depth += 1
+        return notes
+
+    def get_query(
+        self, query: str, params: Optional[Dict[str, Any]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Get the cached results of a search query, in their original order.
+
+        Args:
+            query: Search query
+            params: Extra search parameters the results were fetched with
+
+        Returns:
+            list: Note metadata, or None if the query or any of its notes is
+            missing or expired
+        """
+        if self.refresh:
+            return None
+
+        row = self.conn.execute(
+            "SELECT note_ids FROM queries WHERE server = ? AND query = ? AND fetched_at >= ?",
+            (self.server, query_key(query, params), self._fresh_after()),
+        ).fetchone()
+        if row is None:
+            return None
+
+        note_ids = json.loads(row[0])
+        found = self.get_many(note_ids)
+        if len(found) < len(set(note_ids)):
+            return None
+        return [found[note_id] for note_id in note_ids]
+
+    def put_query(
+        self,
+        query: str,
+        notes: List[Dict[str, Any]],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Store the results of a search query along with their metadata."""
+        notes = [note for note in notes if isinstance(note, dict) and "noteId" in note]
+        self.put_many(notes)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO queries (server, query, fetched_at, note_ids) "
+                "VALUES (?, ?, ?, ?)",
+                (self.server, query_key(query, params), time.time(),
+                 json.dumps([note["noteId"] for note in notes])),
+            )
+
+    def evict(self) -> int:
+        """Drop the least recently used notes beyond max_entries.
+
+        Returns:
+            int: Number of notes removed
+        """
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM notes").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM notes WHERE rowid IN "
+                "(SELECT rowid FROM notes ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+        return excess
+
+    def stats(self) -> Dict[str, Any]:
+        """Summarize the cache contents across all servers."""
+        fresh_after = self._fresh_after()
+        notes, fresh, oldest, newest = self.conn.execute(
+            "SELECT COUNT(*), SUM(fetched_at >= ?), MIN(fetched_at), MAX(fetched_at) "
+            "FROM notes",
+            (fresh_after,),
+        ).fetchone()
+        (queries,) = self.conn.execute("SELECT COUNT(*) FROM queries").fetchone()
+        servers = [
+            row[0] for row in self.conn.execute("SELECT DISTINCT server FROM notes")
+        ]
+        return {
+            "path": str(self.path),
+            "size": self.path.stat().st_size if self.path.exists() else 0,
+            "notes": notes,
+            "fresh": fresh or 0,
+            "expired": notes - (fresh or 0),
+            "queries": queries,
+            "servers": servers,
+            "oldest": oldest,
+            "newest": newest,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+        }
+
+    def clear(self) -> int:
+        """Remove every cached note and query.
+
+        Returns:
+            int: Number of notes removed
+        """
+        with self.conn:
+            removed = self.conn.execute("DELETE FROM notes").rowcount
+            self.conn.execute("DELETE FROM queries")
+        self.conn.execute("VACUUM")
+        return removed
@@ -1,27 +1,118 @@
 """Main CLI module for tpy-cli."""
 
+import importlib
 import os
+import sys
 import click
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List, Tuple
 from pathlib import Path
 
 from . import __version__
 from .utils import load_environment, ensure_config
-from .options import common_options, env_file_option
+from .options import common_options, env_file_option, http_options
 
-# Import command groups here to avoid circular imports
-from .commands import info as info_commands
+# Command groups by name: the object to import, as module:attribute relative
+# to this package, and the short help shown by tpy --help. A command's
+# module is only imported when that command is invoked, so keep these
+# imports out of this module.
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "backup": (".commands.backup:backup", "Back up the Trilium database and note subtrees."),
+    "batch": (".commands.batch:batch", "Run note operations read as JSONL from FILE or stdin."),
+    "cache": (".commands.cache:cache", "Manage the local note metadata cache."),
+    "config": (".commands.config:config", "Manage tpy-cli configuration."),
+    "daemon": (".commands.daemon:daemon", "Run tpy commands in a resident background process."),
+    "index": (".commands.index:index", "Manage the local full-text index."),
+    "info": (".commands.info:info", "Display information about the Trilium server."),
+    "notes": (".commands.notes:notes", "Manage Trilium notes."),
+}
 
-# Commands are registered using the @main.command() decorator
 
-@click.group()
+class LazyGroup(click.Group):
+    """Group that imports each subcommand only when it is used.
+    
+    Help and shell completion list the subcommands from ``lazy_commands``
+    without importing any of them.
+    """
+    
+    def __init__(
+        self, *args: Any, lazy_commands: Optional[Dict[str, Tuple[str, str]]] = None, **kwargs: Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+    
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+    
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module_name, attr = self.lazy_commands[cmd_name][0].split(":")
+            module = importlib.import_module(module_name, __package__)
+            self.add_command(getattr(module, attr), cmd_name)
+        return super().get_command(ctx, cmd_name)
+    
+    def command_help(self, cmd_name: str, limit: int) -> str:
+        """Short help for a subcommand, without importing it if possible."""
+        if cmd_name in self.commands:
+            return self.commands[cmd_name].get_short_help_str(limit)
+        return self.lazy_commands[cmd_name][1]
+    
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        names = [
+            name for name in self.list_commands(ctx)
+            if name in self.lazy_commands or not self.commands[name].hidden
+        ]
+        if not names:
+            return
+        limit = formatter.width - 6 - max(len(name) for name in names)
+        with formatter.section("Commands"):
+            formatter.write_dl([(name, self.command_help(name, limit)) for name in names])
+    
+    def shell_complete(self, ctx: click.Context, incomplete: str) -> List[Any]:
+        from click.shell_completion import CompletionItem
+        
+        results = [
+            CompletionItem(name, help=self.command_help(name, 45))
+            for name in self.list_commands(ctx)
+            if name.startswith(incomplete)
+        ]
+        # Options of the group itself
+        results.extend(click.Command.shell_complete(self, ctx, incomplete))
+        return results
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 @click.version_option(version=__version__)
 @env_file_option()  # This is a decorator factory, so we call it
 @click.option(
     "--debug", is_flag=True, help="Enable debug output"
 )
+@click.option(
+    "--profile", is_flag=True,
+    help="Time every server request and print a summary at exit",
+)
+@click.option(
+    "--profile-trace",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Also write the requests as a Chrome trace (chrome://tracing, Perfetto) to this file",
+)
+@click.option(
+    "--no-cache", is_flag=True, help="Don't use the local note metadata cache"
+)
+@click.option(
+    "--refresh", is_flag=True, help="Ignore cached note metadata and fetch it again"
+)
+@http_options
 @click.pass_context
-def main(ctx: click.Context, env_file: Optional[Path] = None, debug: bool = False, **kwargs: Any) -> None:
+def main(
+    ctx: click.Context,
+    env_file: Optional[Path] = None,
+    debug: bool = False,
+    profile: bool = False,
+    profile_trace: Optional[Path] = None,
+    no_cache: bool = False,
+    refresh: bool = False,
+    **kwargs: Any,
+) -> None:
     """Trilium-py CLI - Command line interface for trilium-py.
     
     Configuration is loaded in this order:
@@ -33,9 +124,17 @@ def main(ctx: click.Context, env_file: Optional[Path] = None, debug: bool = Fals
     # Store debug flag in context
     ctx.ensure_object(dict)
     ctx.obj["debug"] = debug
+    ctx.obj["no_cache"] = no_cache
+    ctx.obj["refresh"] = refresh
+    # HTTP session settings (--pool-size etc.), applied by utils.get_session
+    ctx.obj["http"] = kwargs
+    
+    if profile or profile_trace:
+        start_profiler(ctx, profile_trace)
     
-    # Skip configuration check for config commands
-    if ctx.invoked_subcommand == "config":
+    # Skip configuration check for config commands; the daemon reads the
+    # configuration of each command it runs
+    if ctx.invoked_subcommand in ("config", "daemon"):
         return
         
     # Load environment from specified file if provided
@@ -44,6 +143,12 @@ def main(ctx: click.Context, env_file: Optional[Path] = None, debug: bool = Fals
             click.echo(f"[DEBUG] Loading environment from {env_file}", err=True)
         load_environment(env_file, debug=debug)
     
+    # Cache commands only need the TPY_CACHE_* settings, not a server
+    if ctx.invoked_subcommand == "cache":
+        if not env_file:
+            load_environment(debug=debug)
+        return
+    
     # Initialize context object with server and token
     try:
         # Only try to load config if this is not the info command
@@ -56,13 +161,23 @@ def main(ctx: click.Context, env_file: Optional[Path] = None, debug: bool = Fals
         if ctx.invoked_subcommand != "info":
             raise
 
-# Import and register commands after main is defined to avoid circular imports
-from .commands import notes, config
-
-# Register command groups
-main.add_command(notes.notes, name="notes")
-main.add_command(config.config, name="config")
-main.add_command(info_commands.info, name="info")
+def start_profiler(ctx: click.Context, trace_path: Optional[Path]) -> None:
+    """Record server requests until the command finishes, then report them."""
+    from . import profiling
+    
+    profiler = profiling.Profiler(" ".join(["tpy", *sys.argv[1:]]))
+    profiling.ACTIVE = profiler
+    
+    def report() -> None:
+        profiler.finish()
+        profiling.ACTIVE = None
+        profiler.print_summary(sys.stderr)
+        if trace_path:
+            profiler.write_trace(trace_path)
+            click.echo(f"Trace written to {trace_path}", err=True)
+    
+    # Registered first, so it runs after the session and caches are closed
+    ctx.call_on_close(report)
 
 if __name__ == "__main__":
     main()
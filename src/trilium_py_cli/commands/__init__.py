@@ -1,5 +1,7 @@
-"""Command modules for tpy-cli."""
+"""Command modules for tpy-cli.
 
-from . import notes, config, info
+Modules are imported on demand by cli.LazyGroup, so nothing is imported
+here.
+"""
 
-__all__ = ["notes", "config", "info"]
+__all__ = ["notes", "config", "info", "cache", "index", "daemon", "batch", "backup"]
@@ -0,0 +1,161 @@
+"""Backup commands for tpy-cli."""
+
+import re
+import time
+import zipfile
+import click
+from pathlib import Path
+from typing import Optional
+
+from ..output import TransferProgress, format_size
+from ..session import http
+from ..throttle import call_with_retry
+from ..transfer import raise_for_status, resumable_download
+from ..utils import get_etapi
+
+@click.group()
+def backup() -> None:
+    """Back up the Trilium database and note subtrees."""
+    pass
+
+@backup.command()
+@click.argument("name")
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=1),
+    default=3600.0,
+    show_default=True,
+    help="Seconds to wait for the server to finish the backup",
+)
+@click.pass_context
+def create(ctx: click.Context, name: str, timeout: float) -> None:
+    """Make the server back up its database as backup-NAME.db.
+
+    The backup is written on the server, in its backup directory, and
+    the command returns once it is complete.
+
+    Examples:
+        tpy backup create nightly
+
+        tpy backup create "before-upgrade-$(date +%Y%m%d)"
+    """
+    if not re.fullmatch(r"[\w.-]+", name):
+        raise click.BadParameter("use only letters, digits, '.', '-' and '_'", param_hint="NAME")
+    try:
+        ea = get_etapi(ctx)
+        session = http(ea)
+        connect_timeout = session.timeout[0] if hasattr(session, "timeout") else timeout
+        click.echo(f"Creating backup {click.style(name, fg='cyan')}...")
+        start = time.monotonic()
+        response = session.put(
+            f"{ea.server_url}/etapi/backup/{name}",
+            headers=ea.get_header(),
+            timeout=(connect_timeout, timeout),
+        )
+        raise_for_status(response)
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Server saved backup-{name}.db in {time.monotonic() - start:.1f} s"
+        )
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error creating backup: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+@backup.command()
+@click.argument("root", default="root")
+@click.option(
+    "--out",
+    "out",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Archive to write (default: ROOT.zip)",
+)
+@click.option(
+    "--format",
+    "export_format",
+    type=click.Choice(["html", "markdown"]),
+    default="html",
+    show_default=True,
+    help="Format of the notes in the archive",
+)
+@click.option("--sha256", "expected", help="Fail unless the archive has this SHA-256 checksum")
+@click.option(
+    "--restart",
+    is_flag=True,
+    help="Start over instead of resuming an interrupted download",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=5,
+    show_default=True,
+    help="Times to resume after a dropped connection or server error",
+)
+@click.pass_context
+def export(
+    ctx: click.Context,
+    root: str,
+    out: Optional[Path],
+    export_format: str,
+    expected: Optional[str],
+    restart: bool,
+    retries: int,
+) -> None:
+    """Download ROOT and everything below it as a ZIP archive.
+
+    The archive is streamed to disk with progress and throughput on
+    stderr, so its size does not matter. If the download is interrupted,
+    running the command again picks up where it stopped, where the server
+    supports ranges; dropped connections are resumed the same way, up to
+    --retries times. The archive only replaces ARCHIVE once it is complete,
+    is a valid ZIP file and matches --sha256, if given. Its SHA-256
+    checksum is written next to it in ARCHIVE.sha256, in the format
+    sha256sum -c reads.
+
+    Examples:
+        tpy backup export root --out vault.zip
+
+        tpy backup export abc123xyz --format markdown --out project.zip
+    """
+    out = out or Path(f"{root}.zip")
+    try:
+        ea = get_etapi(ctx)
+        if restart:
+            for suffix in (".part", ".part.json"):
+                out.with_name(out.name + suffix).unlink(missing_ok=True)
+
+        # Checked before the archive replaces out, which may hold the
+        # last good backup
+        def verify(part: Path, checksum: str) -> None:
+            if expected and expected.lower() != checksum:
+                raise click.ClickException(f"Checksum mismatch: expected {expected.lower()}, got {checksum}")
+            if not zipfile.is_zipfile(part):
+                raise click.ClickException("The server did not send a complete ZIP archive")
+
+        start = time.monotonic()
+        with TransferProgress("Exporting") as progress:
+            size, checksum = call_with_retry(
+                lambda: resumable_download(
+                    ea, f"notes/{root}/export", out,
+                    params={"format": export_format}, on_progress=progress, verify=verify,
+                ),
+                retries=retries,
+            )
+        elapsed = time.monotonic() - start
+
+        out.with_name(out.name + ".sha256").write_text(f"{checksum}  {out.name}\n", encoding="utf-8")
+
+        rate = f"{format_size(size / elapsed)}/s" if elapsed > 0 else "-"
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Saved {format_size(size)} to {click.style(str(out), fg='cyan')} "
+            + f"in {elapsed:.1f} s ({rate})"
+        )
+        click.echo(f"  SHA-256 {checksum}")
+
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error exporting: ", fg='red') + str(e), err=True)
+        raise click.Abort()
@@ -0,0 +1,342 @@
+"""Run many note operations from a JSONL stream over one session."""
+
+import asyncio
+import json
+import click
+from typing import IO, Any, Awaitable, Callable, Dict, List, Optional
+
+from ..async_client import AsyncETAPI, run_async
+from ..cache import MetadataCache
+from ..options import concurrency_option
+from ..output import NdjsonWriter
+from ..tree import NoteTree, fetch_tree_async, search_subtree_async
+from ..utils import check_response, get_cache, get_etapi
+from .notes import load_content, search_params, search_results, tree_records
+
+# Operations read from the input but not yet written out, per request in flight
+WINDOW_FACTOR = 4
+
+Operation = Callable[["BatchRunner", Dict[str, Any]], Awaitable[Any]]
+
+
+def _required(request: Dict[str, Any], key: str) -> Any:
+    value = request.get(key)
+    if value in (None, ""):
+        raise ValueError(f"missing '{key}'")
+    return value
+
+
+class BatchRunner:
+    """Runs batch operations with a shared async client and cache.
+
+    Each operation is a dict with an ``op`` key naming one of OPERATIONS
+    and that operation's arguments, named as in ETAPI.
+    """
+
+    def __init__(
+        self,
+        aea: AsyncETAPI,
+        cache: Optional[MetadataCache] = None,
+        dry_run: bool = False,
+    ) -> None:
+        self.aea = aea
+        self.cache = cache
+        self.dry_run = dry_run
+
+    async def search(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Like tpy notes search: ``query`` and the optional ``limit``,
+        ``offset``, ``orderBy``, ``orderDirection``, ``fastSearch``,
+        ``ancestorNoteId`` and ``includeArchivedNotes``."""
+        query = _required(request, "query")
+        offset = int(request.get("offset") or 0)
+        limit = request.get("limit")
+        params = search_params(
+            limit=limit,
+            offset=offset,
+            order_by=request.get("orderBy"),
+            order_direction=request.get("orderDirection"),
+            fast_search=bool(request.get("fastSearch")),
+            ancestor_id=request.get("ancestorNoteId"),
+            include_archived=bool(request.get("includeArchivedNotes")),
+        )
+
+        notes = self.cache.get_query(query, params) if self.cache else None
+        if notes is None:
+            notes = search_results(await self.aea.search_note(query, **dict(params)))
+            if notes is None:
+                raise ValueError("Unexpected response format from server")
+            if self.cache:
+                self.cache.put_query(query, notes, params)
+        return notes[offset:offset + limit] if limit else notes[offset:]
+
+    async def get(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Note metadata by ``noteId``, with its text as ``content`` if
+        ``content`` is true."""
+        note_id = _required(request, "noteId")
+        note = self.cache.get(note_id) if self.cache else None
+        if note is None:
+            note = await self.aea.get_note(note_id)
+            if self.cache:
+                self.cache.put_many([note])
+        if request.get("content"):
+            note = dict(note, content=await self.aea.get_note_content(note_id))
+        return note
+
+    async def create(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Like tpy notes create: ``title``, ``parentNoteId`` (default
+        root), ``type`` (default text), ``mime`` and ``content``, which may
+        be @filename."""
+        title = _required(request, "title")
+        content, mime = load_content(request.get("content") or "", request.get("mime"))
+        params = {
+            "parentNoteId": request.get("parentNoteId") or "root",
+            "title": title,
+            "type": request.get("type") or "text",
+            "mime": mime,
+            "content": content,
+        }
+        if self.dry_run:
+            return dict(params, content=content[:200], dryRun=True)
+        # The client does not retry POSTs: a create that timed out may
+        # still have happened
+        result = check_response(await self.aea.create_note(**params), "note")
+        if self.cache:
+            self.cache.invalidate([params["parentNoteId"], result["note"]["noteId"]])
+        return result
+
+    async def tree(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Like tpy notes tree --format ndjson: every note below ``root``
+        (default root) down to ``maxDepth`` (default 3). Fails rather than
+        return a tree with subtrees missing."""
+        root = request.get("root") or "root"
+        max_depth = int(request.get("maxDepth", 3))
+
+        notes = self.cache.get_subtree(root, max_depth) if self.cache else None
+        if notes is None:
+            failed: List[str] = []
+            notes = await fetch_tree_async(
+                self.aea, root, max_depth,
+                on_error=lambda note_id, e: failed.append(f"{note_id}: {e}"),
+                known=await search_subtree_async(self.aea, root, max_depth),
+            )
+            if root not in notes:
+                raise ValueError(f"Note not found: {root}")
+            if failed:
+                raise ValueError(
+                    f"{len(failed)} notes could not be fetched; first {failed[0]}"
+                )
+            if self.cache:
+                self.cache.put_many(notes.values())
+        return list(tree_records(NoteTree.from_notes(notes), root, max_depth))
+
+    async def run(self, line_number: int, line: str) -> Dict[str, Any]:
+        """Run the operation on one input line.
+
+        Returns:
+            dict: Result record with the input line number, the request's
+            ``id`` if it has one, and either ``result`` or ``error``
+        """
+        record: Dict[str, Any] = {"line": line_number}
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"invalid JSON: {e}")
+            if not isinstance(request, dict):
+                raise ValueError("expected a JSON object")
+            if "id" in request:
+                record["id"] = request["id"]
+            record["op"] = request.get("op")
+            operation = OPERATIONS.get(request.get("op"))
+            if operation is None:
+                raise ValueError(
+                    f"unknown op {request.get('op')!r}; expected one of "
+                    + ", ".join(sorted(OPERATIONS))
+                )
+            result = await operation(self, request)
+            record.update(ok=True, result=result)
+        except Exception as e:
+            record["ok"] = False
+            record["error"] = str(e)
+            status = getattr(e, "status", None)
+            if status is not None:
+                record["status"] = status
+        return record
+
+
+OPERATIONS: Dict[str, Operation] = {
+    "search": BatchRunner.search,
+    "get": BatchRunner.get,
+    "create": BatchRunner.create,
+    "tree": BatchRunner.tree,
+}
+
+
+async def run_batch_async(
+    runner: BatchRunner,
+    source: IO[str],
+    write: Callable[[Dict[str, Any]], None],
+    window: int,
+    ordered: bool = True,
+) -> Dict[str, int]:
+    """Run every operation in a JSONL stream.
+
+    Lines are read as slots free up, so at most ``window`` operations are
+    started but not yet written, however long the input. Results are
+    written as soon as they are known: in completion order, or with
+    ``ordered`` in input order, holding back results that finish before
+    an earlier one.
+
+    Args:
+        runner: Runner for the operations
+        source: Text stream of JSON objects, one per line; blank lines are
+            skipped
+        write: Called with each result record
+        window: Maximum number of operations started but not written
+        ordered: Write results in input order
+
+    Returns:
+        dict: Counts of ok and failed operations
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(window)
+    counts = {"ok": 0, "failed": 0}
+    held: Dict[int, Dict[str, Any]] = {}
+    next_out = 0
+
+    def emit(record: Dict[str, Any]) -> None:
+        write(record)
+        counts["ok" if record["ok"] else "failed"] += 1
+        slots.release()
+
+    def finished(seq: int, record: Dict[str, Any]) -> None:
+        nonlocal next_out
+        if not ordered:
+            emit(record)
+            return
+        held[seq] = record
+        while next_out in held:
+            emit(held.pop(next_out))
+            next_out += 1
+
+    async def run(seq: int, line_number: int, line: str) -> None:
+        finished(seq, await runner.run(line_number, line))
+
+    tasks = []
+    seq = 0
+    line_number = 0
+    while True:
+        await slots.acquire()
+        # Read off the event loop so requests in flight keep going while
+        # the input is slow, e.g. a pipe from another program
+        line = await loop.run_in_executor(None, source.readline)
+        if not line:
+            break
+        line_number += 1
+        if not line.strip():
+            slots.release()
+            continue
+        tasks.append(asyncio.ensure_future(run(seq, line_number, line)))
+        seq += 1
+        # Forget finished tasks so memory does not grow with the input
+        if len(tasks) > window:
+            tasks = [task for task in tasks if not task.done()]
+
+    await asyncio.gather(*tasks)
+    return counts
+
+
+@click.command()
+@click.argument("input_file", metavar="[FILE]", type=click.File("r"), default="-")
+@click.option(
+    "--unordered",
+    is_flag=True,
+    help="Write results as they complete instead of in input order",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=3,
+    help="Retries for rate-limited, failed or timed out requests",
+    show_default=True,
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Show what create operations would create without creating",
+)
+@concurrency_option()
+@click.pass_context
+def batch(
+    ctx: click.Context,
+    input_file: IO[str],
+    unordered: bool,
+    retries: int,
+    dry_run: bool,
+    concurrency: int,
+) -> None:
+    """Run note operations read as JSONL from FILE or stdin.
+
+    Each line is a JSON object with an "op" of search, get, create or
+    tree and that operation's arguments, named as in ETAPI. All
+    operations share one connection pool and the metadata cache, and up to
+    --concurrency requests run at a time. One JSON result per operation is
+    written to stdout, with the input "line", the request's "id" if it has
+    one, "ok", and either "result" or "error" (plus the HTTP "status").
+
+    \b
+    Operations and their arguments:
+      search  query, limit, offset, orderBy, orderDirection, fastSearch,
+              ancestorNoteId, includeArchivedNotes
+      get     noteId, content (true to include the note's content)
+      create  title, parentNoteId, type, mime, content (@file reads a file)
+      tree    root, maxDepth; fails if any note below root cannot be fetched
+
+    The exit status is 1 if any operation failed.
+
+    Examples:
+        tpy batch ops.jsonl > results.jsonl
+
+        echo '{"op": "get", "noteId": "root"}' | tpy batch
+
+        # Results as soon as they are ready, 32 requests at a time
+        tpy batch ops.jsonl --unordered --concurrency 32
+    """
+    try:
+        ea = get_etapi(ctx)
+        cache = get_cache(ctx)
+        writer = NdjsonWriter(())
+
+        def write(record: Dict[str, Any]) -> None:
+            writer.write(record)
+            # Let consumers of a pipe act on each result right away
+            writer.stream.flush()
+
+        counts = run_async(
+            ea, concurrency,
+            lambda aea: run_batch_async(
+                BatchRunner(aea, cache, dry_run),
+                input_file, write,
+                window=concurrency * WINDOW_FACTOR,
+                ordered=not unordered,
+            ),
+            retries=retries,
+        )
+        writer.close()
+
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Ran {click.style(str(counts['ok'] + counts['failed']), fg='cyan')} "
+            f"operations, {counts['failed']} failed",
+            err=True,
+        )
+        if counts["failed"]:
+            ctx.exit(1)
+
+    except click.exceptions.Exit:
+        raise
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error running batch: ", fg='red') + str(e), err=True)
+        raise click.Abort()
@@ -0,0 +1,73 @@
+"""Commands for managing the local note metadata cache."""
+
+import time
+import click
+from typing import Optional
+
+from ..cache import MetadataCache
+
+
+def format_age(timestamp: Optional[float]) -> str:
+    """Format a cache timestamp as a rough age, e.g. '5m ago'."""
+    if timestamp is None:
+        return "-"
+    seconds = int(time.time() - timestamp)
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds // size}{unit} ago"
+    return f"{seconds}s ago"
+
+
+@click.group()
+def cache() -> None:
+    """Manage the local note metadata cache.
+
+    Note metadata fetched by tree and search is kept in a SQLite file
+    (~/.trilium-py/cache.sqlite3 by default). Configure it with the
+    TPY_CACHE_FILE, TPY_CACHE_TTL (seconds) and TPY_CACHE_MAX_ENTRIES
+    environment variables, or bypass it with tpy --no-cache / --refresh.
+    """
+    pass
+
+
+@cache.command()
+@click.pass_context
+def stats(ctx: click.Context) -> None:
+    """Show what the cache holds."""
+    try:
+        store = MetadataCache.from_env(server="")
+        info = store.stats()
+        store.close()
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(f"Error reading cache: {e}", err=True)
+        raise click.Abort()
+
+    click.echo(f"Cache file:  {click.style(info['path'], fg='cyan')}")
+    click.echo(f"Size:        {info['size'] / 1024:.1f} KiB")
+    click.echo(f"Notes:       {click.style(str(info['notes']), fg='green')} "
+               f"({info['fresh']} fresh, {info['expired']} expired)")
+    click.echo(f"Queries:     {info['queries']}")
+    click.echo(f"Oldest:      {format_age(info['oldest'])}")
+    click.echo(f"Newest:      {format_age(info['newest'])}")
+    click.echo(f"TTL:         {info['ttl']:g}s")
+    click.echo(f"Max entries: {info['max_entries']}")
+    for server in info['servers']:
+        click.echo(f"Server:      {click.style(server, fg='yellow')}")
+
+
+@cache.command()
+@click.pass_context
+def clear(ctx: click.Context) -> None:
+    """Remove everything from the cache."""
+    try:
+        store = MetadataCache.from_env(server="")
+        removed = store.clear()
+        store.close()
+        click.echo(f"Removed {click.style(str(removed), fg='red')} cached notes")
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(f"Error clearing cache: {e}", err=True)
+        raise click.Abort()
@@ -4,17 +4,14 @@ import os
 import click
 from pathlib import Path
 import sys
-from typing import Optional, Dict, Any, Tuple
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
 from pathlib import Path
 
-from ..utils import ENV_FILE, load_environment, get_config
+from ..utils import ENV_FILE, load_environment, get_config, get_etapi
 from ..options import common_options, server_option, token_option
-from trilium_py.client import ETAPI
 
-from rich.console import Console
-from rich.panel import Panel
-
-console = Console()
+if TYPE_CHECKING:
+    from trilium_py.client import ETAPI
 
 
 def create_or_update_env(server: Optional[str] = None, token: Optional[str] = None) -> Path:
@@ -160,19 +157,18 @@ def delete(ctx: click.Context) -> None:
         raise click.Abort()
 
 
-def get_token_from_server(server_url: str, password: str) -> Tuple[str, dict]:
+def get_token_from_server(ea: "ETAPI", password: str) -> Tuple[str, dict]:
     """
     Connect to Trilium server and get an ETAPI token using password.
     
     Args:
-        server_url: URL of the Trilium server
+        ea: ETAPI client for the server, without a token
         password: Password for the Trilium instance
         
     Returns:
         tuple: (token, app_info)
     """
     try:
-        ea = ETAPI(server_url)
         token = ea.login(password)
         
         if not token:
@@ -214,6 +210,11 @@ def get_token(
     Example:
         tpy config get-token yourpassword --server http://localhost:8080
     """
+    # rich is imported here rather than at module level to keep startup fast
+    from rich.console import Console
+    from rich.panel import Panel
+    
+    console = Console()
     try:
         # Prompt for password if not provided
         if not password:
@@ -221,7 +222,7 @@ def get_token(
             
         # Get token from server
         console.print(f"Connecting to Trilium server at [bold]{server_url}[/bold]...")
-        token, app_info = get_token_from_server(server_url, password)
+        token, app_info = get_token_from_server(get_etapi(ctx, server=server_url), password)
         
         # Display app info
         console.print(Panel.fit(
@@ -247,7 +248,7 @@ def get_token(
                 
                 # Test the token
                 try:
-                    ea = ETAPI(server_url, token)
+                    ea = get_etapi(ctx, server=server_url, token=token)
                     user_info = ea.app_info()
                     console.print(f"\n[green]✓ Successfully connected to {user_info.get('appName', 'Trilium')} v{user_info.get('appVersion', '')}[/green]")
                 except Exception as e:
@@ -0,0 +1,110 @@
+"""Commands for the resident tpy daemon."""
+
+import subprocess
+import sys
+import time
+import click
+
+from ..daemon import DEFAULT_IDLE_TIMEOUT, Daemon, control, socket_path
+from .cache import format_age
+
+
+@click.group()
+def daemon() -> None:
+    """Run tpy commands in a resident background process.
+
+    While the daemon runs, notes, index and info commands are handed to
+    it over a Unix socket (~/.trilium-py/daemon.sock, or
+    TPY_DAEMON_SOCKET) and skip Python startup, configuration loading and
+    new server connections. Without a daemon tpy works as usual. Set
+    TPY_NO_DAEMON=1 to bypass a running daemon.
+    """
+    pass
+
+
+@daemon.command()
+@click.option(
+    "--idle-timeout",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_IDLE_TIMEOUT,
+    show_default=True,
+    help="Exit after this many seconds without a command (0: never)",
+)
+@click.option("--foreground", is_flag=True, help="Run in this terminal instead of in the background")
+@click.pass_context
+def start(ctx: click.Context, idle_timeout: float, foreground: bool) -> None:
+    """Start the daemon.
+
+    Examples:
+        tpy daemon start
+
+        # Stay up until stopped
+        tpy daemon start --idle-timeout 0
+    """
+    info = control("status")
+    if info is not None:
+        click.echo(f"Daemon already running (pid {info['pid']})")
+        return
+
+    path = socket_path()
+    if foreground:
+        click.echo(f"Listening on {click.style(str(path), fg='cyan')}", err=True)
+        try:
+            Daemon(path, idle_timeout).serve()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    log_path = path.with_suffix(".log")
+    with open(log_path, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", "trilium_py_cli.daemon", "--idle-timeout", str(idle_timeout)],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+
+    # Wait until it accepts connections
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        info = control("status")
+        if info is not None:
+            click.echo(
+                click.style("✓ ", fg='green', bold=True)
+                + f"Daemon started (pid {info['pid']}), listening on {path}"
+            )
+            return
+        time.sleep(0.05)
+
+    click.echo(f"Error: daemon did not start; see {log_path}", err=True)
+    raise click.Abort()
+
+
+@daemon.command()
+def stop() -> None:
+    """Stop the daemon."""
+    info = control("stop")
+    if info is None:
+        click.echo("Daemon is not running")
+        return
+    click.echo(
+        click.style("✓ ", fg='green', bold=True)
+        + f"Stopped daemon (pid {info['pid']}) after {info['requests']} commands"
+    )
+
+
+@daemon.command()
+def status() -> None:
+    """Show whether the daemon is running."""
+    info = control("status")
+    if info is None:
+        click.echo("Daemon is not running")
+        return
+    started = time.time() - info["uptime"]
+    click.echo(f"PID:          {info['pid']}")
+    click.echo(f"Socket:       {click.style(info['socket'], fg='cyan')}")
+    click.echo(f"Started:      {format_age(started)}")
+    click.echo(f"Commands run: {info['requests']}")
+    click.echo(f"Idle timeout: {info['idle_timeout']:g}s" if info['idle_timeout'] else "Idle timeout: none")
@@ -0,0 +1,216 @@
+"""Commands for managing the local full-text index."""
+
+import sys
+import time
+import click
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..index import build_index, sync_index
+from ..options import concurrency_option
+from ..tree import fetch_tree, search_subtree
+from ..utils import get_etapi, get_index
+from .cache import format_age
+
+
+@click.group()
+def index() -> None:
+    """Manage the local full-text index.
+
+    The index holds note titles, attributes and text content in a SQLite
+    FTS5 database (~/.trilium-py/index.sqlite3 by default, or
+    TPY_INDEX_FILE) and answers tpy notes search --local without
+    contacting the server.
+    """
+    pass
+
+
+@index.command()
+@click.option(
+    "--root",
+    default="root",
+    show_default=True,
+    help="Note ID whose subtree is indexed",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=3,
+    show_default=True,
+    help="Retries for failed requests",
+)
+@concurrency_option()
+@click.pass_context
+def build(ctx: click.Context, root: str, retries: int, concurrency: int) -> None:
+    """Index every note below ROOT.
+
+    Running build again brings the index up to date: only notes whose
+    content changed are downloaded again, and deleted notes are dropped.
+
+    Examples:
+        tpy index build
+
+        # Index one subtree only
+        tpy index build --root abc123
+    """
+    try:
+        ea = get_etapi(ctx)
+        note_index = get_index(ctx)
+        failures: List[Tuple[str, Exception]] = []
+
+        click.echo("Fetching note list...", err=True)
+        notes = fetch_tree(
+            ea, root, None, concurrency,
+            on_error=lambda note_id, e: failures.append((note_id, e)),
+            known=search_subtree(ea, root, None) or {},
+            retries=retries,
+        )
+        if root not in notes:
+            raise click.ClickException(f"Note {root} not found")
+
+        def on_done(note: Dict[str, Any], error: Optional[Exception]) -> None:
+            if error is not None:
+                failures.append((note["noteId"], error))
+            bar.update(1)
+
+        with click.progressbar(length=len(notes), label="Indexing", file=sys.stderr) as bar:
+            # Notes missing because of an error must not be dropped
+            counts = build_index(
+                ea, note_index, notes, root,
+                concurrency=concurrency,
+                retries=retries,
+                prune=not failures,
+                on_done=on_done,
+            )
+
+        for note_id, error in failures:
+            click.echo(click.style("✗ ", fg='red') + f"{note_id}: {error}", err=True)
+
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Indexed {click.style(str(len(notes)), fg='cyan')} notes: "
+            f"{counts['fetched']} downloaded, {counts['unchanged']} unchanged, "
+            f"{counts['removed']} removed, {counts['failed']} failed"
+        )
+        if failures:
+            ctx.exit(1)
+
+    except (click.exceptions.Exit, click.ClickException):
+        raise
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error building index: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+
+@index.command()
+# Deleted notes are always dropped now; kept so existing scripts still run
+@click.option("--prune", is_flag=True, hidden=True)
+@click.option("--watch", is_flag=True, help="Keep syncing until interrupted")
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=1),
+    default=60,
+    show_default=True,
+    help="Seconds between syncs with --watch",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=3,
+    show_default=True,
+    help="Retries for failed requests",
+)
+@concurrency_option()
+@click.pass_context
+def sync(
+    ctx: click.Context,
+    prune: bool,
+    watch: bool,
+    interval: float,
+    retries: int,
+    concurrency: int,
+) -> None:
+    """Update the index with notes changed since the last build or sync.
+
+    One search lists every note below the indexed root, so a sync with
+    nothing to do is a single request. Notes modified since they were
+    indexed are updated, and notes that were deleted or moved out of the
+    subtree are dropped.
+
+    Changing only a note's labels or relations does not change its
+    modification date; run tpy index build to pick such changes up.
+
+    Examples:
+        tpy index sync
+
+        # Keep the index warm in the background
+        tpy index sync --watch --interval 300
+    """
+    note_index = get_index(ctx)
+    ea = get_etapi(ctx)
+
+    while True:
+        failures: List[Tuple[str, Exception]] = []
+
+        def on_done(note: Dict[str, Any], error: Optional[Exception]) -> None:
+            if error is not None:
+                failures.append((note["noteId"], error))
+
+        try:
+            counts = sync_index(
+                ea, note_index,
+                concurrency=concurrency,
+                retries=retries,
+                on_done=on_done,
+            )
+        except Exception as e:
+            if ctx.obj.get('debug', False):
+                raise
+            click.echo(click.style("Error syncing index: ", fg='red') + str(e), err=True)
+            if not watch:
+                raise click.Abort()
+        else:
+            for note_id, error in failures:
+                click.echo(click.style("✗ ", fg='red') + f"{note_id}: {error}", err=True)
+            stamp = time.strftime("%H:%M:%S ") if watch else ""
+            click.echo(
+                stamp + click.style("✓ ", fg='green', bold=True)
+                + f"{click.style(str(counts['changed']), fg='cyan')} changed notes: "
+                f"{counts['fetched']} downloaded, {counts['removed']} removed, "
+                f"{counts['failed']} failed"
+            )
+            if failures and not watch:
+                ctx.exit(1)
+
+        if not watch:
+            return
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            return
+
+
+@index.command()
+@click.pass_context
+def stats(ctx: click.Context) -> None:
+    """Show what the index holds for the configured server."""
+    try:
+        info = get_index(ctx).stats()
+    except click.ClickException:
+        raise
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(f"Error reading index: {e}", err=True)
+        raise click.Abort()
+
+    click.echo(f"Index file: {click.style(info['path'], fg='cyan')}")
+    click.echo(f"Size:       {info['size'] / 1024:.1f} KiB")
+    click.echo(f"Server:     {click.style(info['server'], fg='yellow')}")
+    click.echo(f"Notes:      {click.style(str(info['notes']), fg='green')}")
+    click.echo(f"Root:       {info['root'] or '-'}")
+    click.echo(f"Built:      {format_age(info['built_at'])}")
+    click.echo(f"Synced:     {format_age(info['synced_at'])}")
+    click.echo(f"Watermark:  {info['watermark'] or '-'}")
+
@@ -1,18 +1,13 @@
 """Commands for displaying Trilium server information."""
 
 import click
-from typing import Optional, Any
+import sys
+from typing import Any, List, Optional, Tuple
 from pathlib import Path
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from trilium_py.client import ETAPI
 
 # Import utils here to avoid circular imports
 from .. import utils
 
-console = Console()
-
 @click.group()
 def info() -> None:
     """Display information about the Trilium server."""
@@ -22,6 +17,11 @@ def info() -> None:
 @click.pass_context
 def server(ctx: click.Context) -> None:
     """Display information about the connected Trilium server."""
+    # rich is imported here rather than at module level to keep startup fast
+    from rich.console import Console
+    from rich.panel import Panel
+    
+    console = Console()
     try:
         # Get ETAPI client using the utility function
         ea = utils.get_etapi(ctx)
@@ -74,3 +74,193 @@ def server(ctx: click.Context) -> None:
             border_style="red"
         ))
         raise click.Abort()
+
+@info.command()
+@click.option(
+    "--server",
+    "servers",
+    multiple=True,
+    metavar="[NAME=]URL",
+    help="Server to watch; repeat for more (default: TPY_WATCH_SERVERS, else the configured server)",
+)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=10.0,
+    show_default=True,
+    help="Seconds between polls",
+)
+@click.option("--count", type=click.IntRange(min=1), help="Stop after this many polls")
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0.1),
+    default=5.0,
+    show_default=True,
+    help="Seconds before a poll counts as failed",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["text", "json", "prometheus"]),
+    default="text",
+    show_default=True,
+    help="Output after every poll: a table, one JSON object per line, or Prometheus text",
+)
+@click.option(
+    "--prometheus-file",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Rewrite this file with Prometheus metrics after every poll",
+)
+@click.option(
+    "--json-file",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Rewrite this file with JSON metrics after every poll",
+)
+@click.pass_context
+def watch(
+    ctx: click.Context,
+    servers: Tuple[str, ...],
+    interval: float,
+    count: Optional[int],
+    timeout: float,
+    output_format: str,
+    prometheus_file: Optional[Path],
+    json_file: Optional[Path],
+) -> None:
+    """Poll several servers and report availability, latency and versions.
+    
+    Every server's app-info is fetched at the same time, every --interval
+    seconds. Round-trip times go into a histogram per server, summarised
+    as p50/p95/p99; servers whose versions differ from the most common
+    ones are flagged as drifted. Metrics can be exported for dashboards
+    as Prometheus text (e.g. for node_exporter's textfile collector) or
+    JSON. With --count, the exit status is 1 if a server was down at the
+    last poll.
+    
+    Each server's token is read from TRILIUM_TOKEN_<NAME> (the name in
+    upper case, other characters replaced by _), falling back to
+    TRILIUM_TOKEN.
+    
+    Examples:
+        tpy info watch --server prod=https://notes.example.com --server backup=http://10.0.0.2:8080
+        
+        # One check, for cron or a health probe
+        tpy info watch --count 1 --format prometheus
+        
+        # Keep a textfile collector's metrics current
+        tpy info watch --interval 30 --prometheus-file /var/lib/node_exporter/trilium.prom
+    """
+    import json
+    import os
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    
+    from .. import monitor
+    
+    utils.load_environment(debug=ctx.obj.get('debug', False))
+    specs = list(servers) or (os.getenv("TPY_WATCH_SERVERS") or "").replace(",", " ").split()
+    if not specs:
+        server_url, _ = utils.get_config()
+        if not server_url:
+            raise click.UsageError(
+                "No servers to watch. Use --server, set TPY_WATCH_SERVERS or configure a server with:\n"
+                "  tpy config set --server URL --token TOKEN"
+            )
+        specs = [f"default={server_url}"]
+    try:
+        statuses = [
+            monitor.ServerStatus(name, url, monitor.token_for(name))
+            for name, url in monitor.parse_servers(specs)
+        ]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--server")
+    
+    session = monitor.watch_session(len(statuses))
+    live = None
+    if output_format == "text" and sys.stdout.isatty():
+        from rich.live import Live
+        live = Live(auto_refresh=False)
+        live.start()
+    
+    polls = 0
+    try:
+        with ThreadPoolExecutor(max_workers=len(statuses)) as executor:
+            while True:
+                started = time.monotonic()
+                monitor.poll_all(executor, session, statuses, timeout)
+                polls += 1
+                
+                if prometheus_file:
+                    monitor.write_atomic(prometheus_file, monitor.metrics_prometheus(statuses))
+                if json_file:
+                    monitor.write_atomic(json_file, json.dumps(monitor.metrics_json(statuses), indent=2) + "\n")
+                if output_format == "json":
+                    click.echo(json.dumps(monitor.metrics_json(statuses)))
+                elif output_format == "prometheus":
+                    click.echo(monitor.metrics_prometheus(statuses))
+                elif live is not None:
+                    live.update(watch_table(statuses, polls), refresh=True)
+                else:
+                    from rich.console import Console
+                    Console().print(watch_table(statuses, polls))
+                
+                if count is not None and polls >= count:
+                    break
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        # Writing a metrics file failed
+        if ctx.obj.get('debug'):
+            raise
+        click.echo(f"Error: {e}", err=True)
+        raise click.Abort()
+    finally:
+        session.close()
+        if live is not None:
+            live.stop()
+    
+    if count is not None and not all(status.up for status in statuses):
+        ctx.exit(1)
+
+def watch_table(statuses: List[Any], polls: int) -> Any:
+    """A rich table with one row per watched server."""
+    import time
+    from rich.markup import escape
+    from rich.table import Table
+    
+    from .. import monitor
+    
+    expected = monitor.expected_versions(statuses)
+    table = Table(title=f"Trilium servers, poll {polls} at {time.strftime('%H:%M:%S')}")
+    table.add_column("Server", style="bold")
+    table.add_column("Status")
+    table.add_column("Avail", justify="right")
+    for column in ("Last ms", "p50 ms", "p95 ms", "p99 ms"):
+        table.add_column(column, justify="right")
+    table.add_column("Version")
+    
+    def ms(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.1f}"
+    
+    for status in statuses:
+        state = "[green]up[/]" if status.up else f"[red]down: {escape(status.last_error or '')}[/]"
+        availability = status.availability
+        pcts = status.rtt.percentiles()
+        drifted = monitor.drift(status, expected)
+        version = escape(str(status.versions.get("appVersion") or "-"))
+        if drifted:
+            version = f"[yellow]{version} (drift)[/]"
+        table.add_row(
+            escape(status.name),
+            state,
+            "-" if availability is None else f"{availability:.1%}",
+            ms(status.last_rtt * 1000 if status.last_rtt is not None else None),
+            ms(pcts["p50"]), ms(pcts["p95"]), ms(pcts["p99"]),
+            version if status.versions else "-",
+        )
+    if expected:
+        table.caption = "Expected versions (app / db / sync): " + " / ".join(
+            str(expected.get(key, "-")) for key in monitor.VERSION_FIELDS
+        )
+    return table
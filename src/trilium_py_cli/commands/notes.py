@@ -1,104 +1,379 @@
 """Note-related commands for tpy-cli."""
 
+import asyncio
+import re
+import sys
 import click
 from pathlib import Path
-from typing import Optional, Any
-from trilium_py.client import ETAPI
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from ..options import common_options
-from ..utils import ensure_config
+from ..async_client import AsyncETAPI, run_async
+from ..bulk import BulkOperation, Clone, Delete, Move, RemoveAttribute, SetAttribute, apply_bulk
+from ..options import common_options, concurrency_option, format_option
+from ..exporter import (
+    MANIFEST_NAME, ExportEntry, ExportManifest, content_extension, export_notes, plan_export, safe_name,
+)
+from ..index import has_text_content, strip_html
+from ..importer import JOURNAL_NAME, ImportItem, ImportJournal, import_directory, scan_directory
+from ..output import TransferProgress, format_size, open_writer
+from ..sync import (
+    REMOTE_CHANGES, STATE_NAME as SYNC_STATE_NAME, SyncAction, SyncState, delete_note, plan_sync, run_sync,
+)
+from ..throttle import RateLimiter, call_with_retry
+from ..transfer import (
+    content_path, copy_content, download_content, is_text_mime, note_type_for_mime, upload_attachment,
+    upload_content,
+)
+from ..tree import DEFAULT_CONCURRENCY, NoteTree, fetch_tree, search_subtree, walk_tree
+from ..utils import check_response, get_cache, get_etapi, get_index, guess_mime, infer_mime, read_content_file
 
 @click.group()
 def notes() -> None:
     """Manage Trilium notes."""
     pass
 
-def get_etapi(ctx: click.Context) -> ETAPI:
-    """Get ETAPI client from context or environment.
-    
-    Args:
-        ctx: Click context object
-        
-    Returns:
-        ETAPI: Initialized ETAPI client
-        
-    Raises:
-        click.UsageError: If configuration is missing
-    """
-    debug = ctx.obj.get("debug", False)
-    server = ctx.obj.get("server")
-    token = ctx.obj.get("token")
-    
-    if debug:
-        click.echo(f"[DEBUG] Creating ETAPI client with server: {server[:10]}...", err=True)
-    
-    try:
-        return ETAPI(server, token)
-    except Exception as e:
-        if debug:
-            click.echo(f"[DEBUG] Failed to create ETAPI client: {e}", err=True)
-        raise click.UsageError(
-            "Failed to connect to Trilium. Please check your server URL and token."
-        )
+# Columns written by the csv and plain formats
+SEARCH_FIELDS = ("noteId", "title", "type", "mime", "utcDateModified")
+LOCAL_SEARCH_FIELDS = SEARCH_FIELDS + ("snippet",)
+TREE_FIELDS = ("noteId", "parentNoteId", "depth", "title", "type")
+
+# Bytes of content read per note for search --preview without a value
+PREVIEW_BYTES = 200
+
+# An HTML tag cut off by the end of a preview
+PARTIAL_TAG = re.compile(r"<[^>]*$")
 
 @notes.command()
 @click.argument("query")
+@click.option("--limit", type=click.IntRange(min=1), help="Show at most this many notes")
+@click.option(
+    "--offset",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Skip this many notes first",
+)
+@click.option(
+    "--page",
+    type=click.IntRange(min=1),
+    help="Show page N of --limit notes each (instead of --offset)",
+)
+@click.option("--order-by", help="Property to sort by, e.g. title or dateModified")
+@click.option(
+    "--order-direction",
+    type=click.Choice(["asc", "desc"]),
+    help="Sort direction for --order-by",
+)
+@click.option("--fast-search", is_flag=True, help="Search titles and attributes only, not content")
+@click.option("--ancestor", "ancestor_id", help="Only search below this note")
+@click.option("--include-archived", is_flag=True, help="Include archived notes")
+@click.option(
+    "--local",
+    is_flag=True,
+    help="Search the local index (see tpy index build) instead of the server",
+)
+@click.option(
+    "--preview",
+    type=click.IntRange(min=1),
+    is_flag=False,
+    flag_value=PREVIEW_BYTES,
+    metavar="[N]",
+    help=f"Show the start of each note's content, reading at most N bytes (default {PREVIEW_BYTES})",
+)
+@concurrency_option()
+@format_option()
 @click.pass_context
-def search(ctx: click.Context, query: str) -> None:
+def search(
+    ctx: click.Context,
+    query: str,
+    limit: Optional[int],
+    offset: int,
+    page: Optional[int],
+    order_by: Optional[str],
+    order_direction: Optional[str],
+    fast_search: bool,
+    ancestor_id: Optional[str],
+    include_archived: bool,
+    local: bool,
+    preview: Optional[int],
+    concurrency: int,
+    output_format: str,
+) -> None:
     """Search for notes matching QUERY.
     
+    Ordering, limits and filters are applied by the server, so only the
+    notes that are shown are transferred.
+    
     Examples:
         tpy notes search "my search term"
+        
+        # One JSON object per matching note, for jq and friends
+        tpy notes search "my search term" --format ndjson
+        
+        # The 20 most recently changed notes, then the next 20
+        tpy notes search "#todo" --order-by dateModified --order-direction desc --limit 20
+        tpy notes search "#todo" --order-by dateModified --order-direction desc --limit 20 --page 2
+        
+        # Ranked results with snippets from the local index, no server needed
+        tpy notes search --local "meeting notes"
+        
+        # The first 500 bytes of every hit, as plain text
+        tpy notes search "meeting notes" --preview 500
     """
+    if page is not None:
+        if limit is None:
+            raise click.UsageError("--page requires --limit")
+        if offset:
+            raise click.UsageError("--page and --offset are mutually exclusive")
+        offset = (page - 1) * limit
+    if order_direction and not order_by:
+        raise click.UsageError("--order-direction requires --order-by")
+    if local:
+        if order_by or ancestor_id or preview:
+            raise click.UsageError("--order-by, --ancestor and --preview are not supported with --local")
+        search_local(ctx, query, limit, offset, fast_search, output_format)
+        return
+
+    params = search_params(
+        limit=limit,
+        offset=offset,
+        order_by=order_by,
+        order_direction=order_direction,
+        fast_search=fast_search,
+        ancestor_id=ancestor_id,
+        include_archived=include_archived,
+    )
+
     try:
         ea = get_etapi(ctx)
-        click.echo(f"Searching for: {click.style(query, fg='cyan')}")
-        
-        # Get search results using the direct query
-        results = ea.search_note(query)
+        cache = get_cache(ctx)
+        if output_format == "text":
+            click.echo(f"Searching for: {click.style(query, fg='cyan')}")
         
-        # Extract notes from the response
-        if isinstance(results, dict) and 'results' in results:
-            notes = results['results']
-        elif isinstance(results, list):
-            notes = results
+        notes = cache.get_query(query, params) if cache else None
+        if notes is not None:
+            if ctx.obj.get('debug', False):
+                click.echo("[DEBUG] Using cached search results", err=True)
         else:
-            click.echo("Error: Unexpected response format from server")
-            if click.confirm('Show raw response?', default=False):
-                click.echo(f"Raw response: {results}")
+            # Get search results using the direct query
+            results = ea.search_note(query, **params)
+            
+            notes = search_results(results)
+            if notes is None:
+                if output_format != "text":
+                    raise click.ClickException("Unexpected response format from server")
+                click.echo("Error: Unexpected response format from server")
+                if click.confirm('Show raw response?', default=False):
+                    click.echo(f"Raw response: {results}")
+                return
+            
+            if cache:
+                cache.put_query(query, notes, params)
+        
+        # ETAPI has no offset, so earlier pages are fetched and skipped
+        notes = notes[offset:offset + limit] if limit else notes[offset:]
+        
+        if output_format != "text":
+            notes = [note for note in notes if isinstance(note, dict)]
+            if not preview:
+                with open_writer(output_format, SEARCH_FIELDS) as writer:
+                    for note in notes:
+                        writer.write(note)
+                return
+            with open_writer(output_format, SEARCH_FIELDS + ("preview",)) as writer:
+                fetch_previews(
+                    ea, notes, preview, concurrency,
+                    lambda i, text, error: writer.write({**notes[i], "preview": text}),
+                )
             return
             
         if not notes:
             click.echo("No matching notes found.")
             return
             
-        click.echo(f"\nFound {click.style(str(len(notes)), fg='green')} notes:")
+        if offset:
+            shown = f"{offset + 1}-{offset + len(notes)}"
+            click.echo(f"\nShowing notes {click.style(shown, fg='green')}:")
+        else:
+            click.echo(f"\nFound {click.style(str(len(notes)), fg='green')} notes:")
         
-        for i, note in enumerate(notes, 1):
+        def show(i: int, text: Optional[str] = None, error: Optional[str] = None) -> None:
+            note = notes[i]
+            position = offset + i + 1
             if not isinstance(note, dict):
-                click.echo(f"  {i}. [red]Invalid note format: {note}[/]")
-                continue
+                click.echo(f"  {position}. [red]Invalid note format: {note}[/]")
+                return
                 
             # Get note details with safe defaults
             note_id = note.get('noteId', 'N/A')
             title = note.get('title', 'Untitled')
             
             # Display note
-            click.echo(f"  {i}. {click.style(title, fg='yellow')} ({note_id})")
+            click.echo(f"  {position}. {click.style(title, fg='yellow')} ({note_id})")
             
             # Show content preview if available
             content = note.get('content')
-            if content and isinstance(content, str):
-                preview = content[:100].replace('\n', ' ')
+            if text is None and content and isinstance(content, str):
+                text = content[:100].replace('\n', ' ')
                 if len(content) > 100:
-                    preview += "..."
-                click.echo(f"     {preview}")
+                    text += "..."
+            if text:
+                click.echo(f"     {text}")
+            elif error:
+                click.echo(click.style(f"     (no preview: {error})", fg='red'))
                 
             click.echo()  # Add spacing between notes
+        
+        if preview:
+            fetch_previews(ea, notes, preview, concurrency, show)
+        else:
+            for i in range(len(notes)):
+                show(i)
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
         raise click.Abort()
 
+def preview_text(head: bytes, more: bool, html: bool) -> str:
+    """One line of plain text from the start of a note's content.
+    
+    Args:
+        head: The first bytes of the content
+        more: Whether the content goes on after head
+        html: Whether the content is HTML, to be reduced to text
+    
+    Returns:
+        str: The text on one line, ending in "..." if there is more
+    """
+    text = head.decode("utf-8", errors="ignore")
+    if html:
+        text = strip_html(PARTIAL_TAG.sub("", text))
+    text = " ".join(text.split())
+    return text + "..." if more else text
+
+def fetch_previews(
+    ea: Any,
+    notes: List[Any],
+    max_bytes: int,
+    concurrency: int,
+    on_preview: Callable[[int, Optional[str], Optional[str]], None],
+) -> None:
+    """Fetch the start of each note's content, reporting in order.
+    
+    Up to concurrency notes are fetched at a time, and each stops reading
+    after max_bytes. on_preview is called with a note's position in notes,
+    its preview and an error message as soon as that note and all before
+    it are done, so results can be shown in rank order while later ones
+    are still loading. Notes without text content get no preview.
+    
+    Args:
+        ea: ETAPI client
+        notes: Search results
+        max_bytes: Bytes of content to read per note
+        concurrency: Maximum number of requests at the same time
+        on_preview: Called once per note, in order
+    """
+    async def fetch(aea: AsyncETAPI, note: Any) -> Optional[str]:
+        if not isinstance(note, dict) or not note.get("noteId") or not has_text_content(note):
+            return None
+        head, more = await aea.get_note_content_head(note["noteId"], max_bytes)
+        html = note.get("type") == "text" or note.get("mime") == "text/html"
+        return preview_text(head, more, html)
+
+    async def fetch_all(aea: AsyncETAPI) -> None:
+        tasks = [asyncio.ensure_future(fetch(aea, note)) for note in notes]
+        try:
+            for i, task in enumerate(tasks):
+                try:
+                    text, error = await task, None
+                except Exception as e:
+                    text, error = None, str(e)
+                on_preview(i, text, error)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    run_async(ea, concurrency, fetch_all)
+
+def search_local(
+    ctx: click.Context,
+    query: str,
+    limit: Optional[int],
+    offset: int,
+    fast_search: bool,
+    output_format: str,
+) -> None:
+    """Answer a search from the local full-text index, best matches first."""
+    try:
+        note_index = get_index(ctx)
+        columns = ("title", "attributes") if fast_search else None
+        if output_format != "text":
+            results = note_index.search(query, limit, offset, columns)
+            with open_writer(output_format, LOCAL_SEARCH_FIELDS) as writer:
+                for note in results:
+                    writer.write(note)
+            return
+        
+        results = note_index.search(
+            query, limit, offset, columns,
+            highlight=(click.style("", fg='cyan', bold=True, reset=False), "\x1b[0m"),
+        )
+    except click.ClickException:
+        raise
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(f"Error searching index: {e}", err=True)
+        raise click.Abort()
+    
+    if not results:
+        if not note_index.stats()["notes"]:
+            click.echo("The local index is empty; build it with: tpy index build", err=True)
+        else:
+            click.echo("No matching notes found.")
+        return
+    
+    for i, note in enumerate(results, offset + 1):
+        click.echo(f"  {i}. {click.style(note['title'], fg='yellow')} ({note['noteId']})")
+        click.echo(f"     {note['snippet'].replace(chr(10), ' ')}")
+        click.echo()
+
+def search_params(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    order_by: Optional[str] = None,
+    order_direction: Optional[str] = None,
+    fast_search: bool = False,
+    ancestor_id: Optional[str] = None,
+    include_archived: bool = False,
+) -> Dict[str, Any]:
+    """ETAPI search parameters for the search options that were given.
+
+    ETAPI only supports a limit, so a page starting at ``offset`` is
+    fetched as the first ``offset + limit`` notes.
+    """
+    params: Dict[str, Any] = {}
+    if limit:
+        params["limit"] = offset + limit
+    if order_by:
+        params["orderBy"] = order_by
+    if order_direction:
+        params["orderDirection"] = order_direction
+    if fast_search:
+        params["fastSearch"] = True
+    if ancestor_id:
+        params["ancestorNoteId"] = ancestor_id
+    if include_archived:
+        params["includeArchivedNotes"] = True
+    return params
+
+def search_results(results: Any) -> Optional[List[Any]]:
+    """Notes from an ETAPI search response, or None if it has none."""
+    if isinstance(results, dict) and isinstance(results.get('results'), list):
+        return results['results']
+    if isinstance(results, list):
+        return results
+    return None
+
 @notes.command()
 @click.argument("title")
 @click.option(
@@ -111,15 +386,15 @@ def search(ctx: click.Context, query: str) -> None:
 @click.option(
     "--type", 
     "note_type", 
-    default="text", 
-    help="Note type (text, code, book, etc.)",
-    show_default=True
+    default=None, 
+    help="Note type (text, code, book, etc.); inferred from the MIME type "
+         "of @file when not given, otherwise text",
 )
 @click.option(
     "--mime", 
-    default="text/html", 
-    help="MIME type (e.g., text/html, text/x-markdown, text/plain)",
-    show_default=True
+    default=None, 
+    help="MIME type (e.g., text/html, text/x-markdown, text/plain); "
+         "inferred from @file when not given, otherwise text/html",
 )
 @click.option(
     "--content", 
@@ -136,8 +411,8 @@ def create(
     ctx: click.Context,
     title: str,
     parent_id: str,
-    note_type: str,
-    mime: str,
+    note_type: Optional[str],
+    mime: Optional[str],
     content: str,
     dry_run: bool,
 ) -> None:
@@ -153,22 +428,19 @@ def create(
         # Create a code note
         tpy notes create "My Script" --type code --mime text/x-python --parent-id root --content @script.py
     """
-    
-    print("forcing dry run. Create is not safe yet.")
-    dry_run = True
-
     try:
-        # Handle file content if content starts with @
+        # A file is streamed up after the note is created, rather than
+        # read into memory and sent with it
+        file_path = None
         if content.startswith('@'):
             file_path = Path(content[1:]).expanduser()
-            if not file_path.exists():
+            if not file_path.is_file():
                 raise click.BadParameter(f"File not found: {file_path}")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                if not mime and file_path.suffix == '.md':
-                    mime = 'text/x-markdown'
-                elif not mime and file_path.suffix == '.py':
-                    mime = 'text/x-python'
+            mime = mime or guess_mime(file_path)
+            content = ""
+        mime = mime or 'text/html'
+        if note_type is None:
+            note_type = note_type_for_mime(mime) if file_path is not None else 'text'
         
         # Show preview in dry-run mode
         if dry_run:
@@ -177,7 +449,14 @@ def create(
             click.echo(f"Parent ID:   {click.style(parent_id, fg='cyan')}")
             click.echo(f"Type:        {click.style(note_type, fg='cyan')}")
             click.echo(f"MIME:        {click.style(mime, fg='cyan')}")
-            click.echo(f"Content size: {click.style(str(len(content)), fg='cyan')} chars")
+            if file_path is not None:
+                size = file_path.stat().st_size
+                click.echo(f"Content size: {click.style(str(size), fg='cyan')} bytes from {file_path}")
+                if is_text_mime(mime):
+                    with open(file_path, 'rb') as f:
+                        content = f.read(201).decode('utf-8', errors='replace')
+            else:
+                click.echo(f"Content size: {click.style(str(len(content)), fg='cyan')} chars")
             if content:
                 preview = content[:200].replace('\n', '\\n')
                 if len(content) > 200:
@@ -187,13 +466,24 @@ def create(
         
         # Create the note
         ea = get_etapi(ctx)
-        note = ea.create_note(
+        note = check_response(ea.create_note(
             title=title,
             parentNoteId=parent_id,
             type=note_type,
             mime=mime,
             content=content,
-        )
+        ), "note")["note"]
+        if file_path is not None:
+            try:
+                with TransferProgress("Uploading") as progress:
+                    upload_content(ea, content_path(note['noteId']), file_path, mime, on_progress=progress)
+            except Exception:
+                # Rather than leave an empty note behind
+                delete_note(ea, note['noteId'])
+                raise
+        cache = get_cache(ctx)
+        if cache:
+            cache.invalidate([parent_id, note['noteId']])
         
         click.echo(click.style("✓ ", fg='green', bold=True) + 
                  f"Created note: {click.style(note['noteId'], fg='cyan')}")
@@ -205,6 +495,589 @@ def create(
         click.echo(click.style("Error creating note: ", fg='red') + str(e), err=True)
         raise click.Abort()
 
+def load_content(content: str, mime: Optional[str] = None) -> Tuple[str, str]:
+    """Resolve note content and MIME type as create does.
+    
+    Content starting with @ is read from that file, and the MIME type is
+    inferred from the file name unless given. It defaults to text/html.
+    
+    Returns:
+        tuple: (content, mime)
+    """
+    if content.startswith('@'):
+        file_path = Path(content[1:]).expanduser()
+        content = read_content_file(file_path)
+        mime = mime or infer_mime(file_path)
+    return content, mime or 'text/html'
+
+def content_target(note_id: str, attachment: bool) -> str:
+    """ETAPI content path of a note, or of an attachment if attachment is set."""
+    return content_path(attachment_id=note_id) if attachment else content_path(note_id)
+
+attachment_option = click.option(
+    "--attachment",
+    is_flag=True,
+    help="ID is an attachment ID rather than a note ID",
+)
+
+@notes.command()
+@click.argument("note_id")
+@attachment_option
+@click.pass_context
+def cat(ctx: click.Context, note_id: str, attachment: bool) -> None:
+    """Write a note's content to stdout.
+    
+    Content is streamed as it arrives, unchanged, so binary notes and
+    large attachments can be piped anywhere without being held in
+    memory. When stdout is not a terminal, progress is shown on stderr.
+    
+    Examples:
+        tpy notes cat abc123xyz
+        
+        tpy notes cat --attachment def456uvw > photo.jpg
+    """
+    try:
+        ea = get_etapi(ctx)
+        out = sys.stdout.buffer
+        with TransferProgress("Downloading", enabled=not out.isatty()) as progress:
+            copy_content(ea, content_target(note_id, attachment), out, on_progress=progress)
+        out.flush()
+        
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error reading content: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+@notes.command()
+@click.argument("note_id")
+@click.argument("dest", required=False, type=click.Path(path_type=Path))
+@attachment_option
+@click.pass_context
+def download(ctx: click.Context, note_id: str, dest: Optional[Path], attachment: bool) -> None:
+    """Download a note's content to a file.
+    
+    DEST defaults to a file in the current directory named after the note
+    (or attachment) title; if DEST is a directory, the file goes there.
+    Content is streamed to disk with progress on stderr, and the file only
+    appears once the download is complete.
+    
+    Examples:
+        tpy notes download abc123xyz
+        
+        tpy notes download --attachment def456uvw ~/Downloads/
+    """
+    try:
+        ea = get_etapi(ctx)
+        if dest is None or dest.is_dir():
+            if attachment:
+                info = ea.get_attachment(note_id)
+                check_response(info, "attachmentId")
+                name = safe_name(info.get('title') or "", note_id)
+            else:
+                info = check_response(ea.get_note(note_id), "noteId")
+                name = safe_name(info.get('title') or "", note_id) + content_extension(
+                    info.get('type'), info.get('mime')
+                )
+            dest = (dest or Path(".")) / name
+        
+        with TransferProgress("Downloading") as progress:
+            size = call_with_retry(lambda: download_content(
+                ea, content_target(note_id, attachment), dest, on_progress=progress,
+            ))
+        
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Saved {format_size(size)} to {click.style(str(dest), fg='cyan')}"
+        )
+        
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error downloading: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+@notes.command()
+@click.argument("note_id")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--mime", help="MIME type of the file (default: the note's)")
+@attachment_option
+@click.pass_context
+def upload(
+    ctx: click.Context, note_id: str, file: Path, mime: Optional[str], attachment: bool
+) -> None:
+    """Replace a note's content with FILE.
+    
+    The file is streamed from disk with progress on stderr, so it can be
+    much larger than memory. Text is sent as text and anything else as
+    binary, going by --mime or the note's MIME type.
+    
+    Examples:
+        tpy notes upload abc123xyz report.pdf
+        
+        tpy notes upload --attachment def456uvw photo.jpg
+    """
+    try:
+        ea = get_etapi(ctx)
+        if mime is None:
+            info = ea.get_attachment(note_id) if attachment else ea.get_note(note_id)
+            mime = check_response(info, "attachmentId" if attachment else "noteId").get('mime')
+        
+        with TransferProgress("Uploading") as progress:
+            size = upload_content(ea, content_target(note_id, attachment), file, mime, on_progress=progress)
+        cache = get_cache(ctx)
+        if cache and not attachment:
+            cache.invalidate([note_id])
+        
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Uploaded {format_size(size)} to {click.style(note_id, fg='cyan')}"
+        )
+        
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error uploading: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+@notes.command()
+@click.argument("note_id")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--title", help="Attachment title (default: the file name)")
+@click.option("--mime", help="MIME type (default: guessed from the file name)")
+@click.option(
+    "--role",
+    type=click.Choice(["file", "image"]),
+    help="Attachment role (default: image for image MIME types)",
+)
+@click.pass_context
+def attach(
+    ctx: click.Context,
+    note_id: str,
+    file: Path,
+    title: Optional[str],
+    mime: Optional[str],
+    role: Optional[str],
+) -> None:
+    """Attach FILE to a note.
+    
+    The file is streamed from disk with progress on stderr, so it can be
+    much larger than memory.
+    
+    Examples:
+        tpy notes attach abc123xyz diagram.png
+        
+        tpy notes attach abc123xyz dump.tar.gz --title "Database dump"
+    """
+    try:
+        ea = get_etapi(ctx)
+        with TransferProgress("Uploading") as progress:
+            attachment = upload_attachment(
+                ea, note_id, file, title=title, role=role, mime=mime, on_progress=progress,
+            )
+        
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Attached {file.name}: {click.style(attachment['attachmentId'], fg='cyan')}"
+        )
+        
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error attaching file: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+@notes.command(name="import")
+@click.argument(
+    "directory",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+)
+@click.option(
+    "--parent-id",
+    "parent_id",
+    required=True,
+    help="Note ID to import under (use 'root' for root level)",
+)
+@click.option(
+    "--journal",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help=f"Resume journal (default: DIRECTORY/{JOURNAL_NAME})",
+)
+@click.option(
+    "--rate",
+    type=click.FloatRange(min=0),
+    default=0,
+    help="Maximum requests per second (0 for no limit)",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=3,
+    help="Retries for rate-limited, failed or timed out requests",
+    show_default=True,
+)
+@concurrency_option(default=4)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Show what would be created without actually creating"
+)
+@click.pass_context
+def import_notes(
+    ctx: click.Context,
+    directory: Path,
+    parent_id: str,
+    journal: Optional[Path],
+    rate: float,
+    retries: int,
+    concurrency: int,
+    dry_run: bool,
+) -> None:
+    """Import a directory tree as notes.
+    
+    Each directory becomes a book note and each file a note with its
+    content, using the same MIME inference as create; content is
+    streamed up after the note is created. Notes are created level by
+    level: parents first, then their children concurrently.
+    
+    Created notes are recorded in a journal, so rerunning an interrupted
+    import skips whatever was already created.
+    
+    Examples:
+        tpy notes import ./docs --parent-id root
+        
+        # Gentler on the server
+        tpy notes import ./docs --parent-id abc123xyz --concurrency 2 --rate 10
+    """
+    try:
+        journal_path = journal or directory / JOURNAL_NAME
+        items = scan_directory(directory, skip=journal_path)
+        import_journal = ImportJournal(journal_path, parent_id)
+        done = import_journal.load()
+        
+        if dry_run:
+            click.echo(click.style("=== DRY RUN ===", fg='yellow', bold=True))
+            for item in items:
+                status = "exists" if item.relpath in done else "create"
+                kind = "dir " if item.is_dir else "file"
+                click.echo(f"{click.style(status, fg='cyan')} {kind} {item.relpath}")
+            click.echo(f"{len(items)} items, {len(done)} already imported")
+            return
+        
+        ea = get_etapi(ctx)
+        failures = []
+        
+        with click.progressbar(length=len(items), label="Importing", file=sys.stderr) as bar:
+            created = [parent_id]
+            
+            def on_done(item: ImportItem, note_id: Optional[str], error: Optional[Exception]) -> None:
+                if error is not None:
+                    failures.append((item.relpath, error))
+                elif note_id is not None:
+                    created.append(note_id)
+                bar.update(1)
+            
+            try:
+                counts = import_directory(
+                    ea, items, parent_id, import_journal,
+                    concurrency=concurrency,
+                    limiter=RateLimiter(rate),
+                    retries=retries,
+                    on_done=on_done,
+                )
+            finally:
+                import_journal.close()
+                cache = get_cache(ctx)
+                if cache:
+                    cache.invalidate(created)
+        
+        for relpath, error in failures:
+            click.echo(click.style("✗ ", fg='red') + f"{relpath}: {error}", err=True)
+        
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Created {click.style(str(counts['created']), fg='cyan')} notes, "
+            f"skipped {counts['skipped']} already imported, {counts['failed']} failed"
+        )
+        if counts["failed"]:
+            click.echo(f"Run the same command again to retry; the journal is {journal_path}")
+            ctx.exit(1)
+        
+    except click.exceptions.Exit:
+        raise
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error importing: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+@notes.command()
+@click.argument("root")
+@click.argument(
+    "directory",
+    type=click.Path(file_okay=False, path_type=Path),
+)
+@click.option(
+    "--max-depth",
+    type=int,
+    default=None,
+    help="Maximum depth to export (default: the whole subtree)",
+)
+@click.option(
+    "--prune/--no-prune",
+    default=True,
+    help="Remove files of notes that left the subtree or moved",
+    show_default=True,
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=3,
+    help="Retries for rate-limited, failed or timed out requests",
+    show_default=True,
+)
+@concurrency_option(default=DEFAULT_CONCURRENCY)
+@click.pass_context
+def export(
+    ctx: click.Context,
+    root: str,
+    directory: Path,
+    max_depth: Optional[int],
+    prune: bool,
+    retries: int,
+    concurrency: int,
+) -> None:
+    """Export the subtree under ROOT to DIRECTORY.
+    
+    Each note's content is written to a file named after its title, and
+    its children to a directory of the same name. Content is streamed to
+    disk by several downloads at a time.
+    
+    A manifest of what was written is kept in the directory, so later runs
+    only download notes whose content changed.
+    
+    Examples:
+        tpy notes export root ./backup
+        
+        # Nightly mirror of one subtree
+        tpy notes export abc123xyz /srv/mirror --concurrency 16
+    """
+    try:
+        ea = get_etapi(ctx)
+        fetch_failed = []
+        
+        def report_error(note_id: str, e: Exception) -> None:
+            fetch_failed.append(note_id)
+            click.echo(click.style("✗ ", fg='red') + f"{note_id}: {e}", err=True)
+        
+        known = search_subtree(ea, root, max_depth)
+        tree_notes = fetch_tree(
+            ea, root, max_depth, concurrency=concurrency, on_error=report_error,
+            known=known, retries=retries,
+        )
+        if root not in tree_notes:
+            raise click.ClickException(f"Note not found: {root}")
+        # Notes missing from a partial tree would look deleted
+        if fetch_failed and prune:
+            click.echo(
+                click.style("Warning: ", fg='yellow')
+                + f"{len(fetch_failed)} notes could not be fetched; nothing is pruned",
+                err=True,
+            )
+            prune = False
+        entries = plan_export(NoteTree.from_notes(tree_notes), root)
+        del tree_notes
+        
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest = ExportManifest(directory / MANIFEST_NAME)
+        if not manifest.load(root):
+            raise click.ClickException(
+                f"{directory} holds an export of a different note; use another directory"
+            )
+        failures = []
+        
+        with click.progressbar(length=len(entries), label="Exporting", file=sys.stderr) as bar:
+            def on_done(entry: ExportEntry, action: str, error: Optional[Exception]) -> None:
+                if error is not None:
+                    failures.append((entry.relpath, error))
+                bar.update(1)
+            
+            try:
+                counts = export_notes(
+                    ea, entries, directory, manifest,
+                    concurrency=concurrency,
+                    retries=retries,
+                    prune=prune,
+                    on_done=on_done,
+                )
+            finally:
+                manifest.save(root)
+        
+        for relpath, error in failures:
+            click.echo(click.style("✗ ", fg='red') + f"{relpath}: {error}", err=True)
+        
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Downloaded {click.style(str(counts['downloaded']), fg='cyan')} notes, "
+            f"{counts['unchanged']} unchanged, {counts['moved']} moved, "
+            f"{counts['removed']} removed, {counts['failed'] + len(fetch_failed)} failed"
+        )
+        if counts["failed"] or fetch_failed:
+            ctx.exit(1)
+        
+    except (click.ClickException, click.exceptions.Exit):
+        raise
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error exporting: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+@notes.command()
+@click.argument(
+    "directory",
+    type=click.Path(file_okay=False, path_type=Path),
+)
+@click.option("--root", required=True, help="Note whose subtree to keep in step with DIRECTORY")
+@click.option(
+    "--delete",
+    is_flag=True,
+    help="Delete notes whose files were deleted (otherwise reported as conflicts)",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=3,
+    help="Retries for rate-limited, failed or timed out requests",
+    show_default=True,
+)
+@concurrency_option(default=DEFAULT_CONCURRENCY)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Show what would be pushed and pulled without changing anything"
+)
+@click.pass_context
+def sync(
+    ctx: click.Context,
+    directory: Path,
+    root: str,
+    delete: bool,
+    retries: int,
+    concurrency: int,
+    dry_run: bool,
+) -> None:
+    """Keep DIRECTORY and the subtree under --root in step, both ways.
+    
+    Notes are laid out as files the way export does, with the root's
+    children at the top of DIRECTORY. A state file in the directory
+    records each note's blobId and each file's content hash as of the
+    last sync, so only what changed is transferred: changed notes are
+    pulled, changed files are pushed, and new files become notes (with
+    book notes for new folders), using the same MIME inference as create.
+    
+    A file and note that both changed are a conflict: both are left as
+    they are and reported, and the exit status is 1. Resolve it by undoing
+    one side, or by removing the file so the note is pulled again.
+    
+    Examples:
+        tpy notes sync ./notes --root abc123xyz
+        
+        # See what would happen first
+        tpy notes sync ./notes --root abc123xyz --dry-run
+    """
+    try:
+        ea = get_etapi(ctx)
+        failed = []
+        
+        def report_error(note_id: str, e: Exception) -> None:
+            failed.append(note_id)
+            click.echo(click.style("✗ ", fg='red') + f"{note_id}: {e}", err=True)
+        
+        tree_notes = fetch_tree(
+            ea, root, None, concurrency=concurrency, on_error=report_error,
+            known=search_subtree(ea, root, None), retries=retries,
+        )
+        if root not in tree_notes:
+            raise click.ClickException(f"Note not found: {root}")
+        # Notes missing from a partial tree would look deleted
+        if failed:
+            raise click.ClickException(
+                f"{len(failed)} notes could not be fetched; nothing was changed"
+            )
+        note_tree = NoteTree.from_notes(tree_notes)
+        del tree_notes
+        
+        directory.mkdir(parents=True, exist_ok=True)
+        state = SyncState(directory / SYNC_STATE_NAME)
+        if not state.load(root):
+            raise click.ClickException(
+                f"{directory} is synced with a different note; use another directory"
+            )
+        actions, unchanged = plan_sync(note_tree, root, directory, state, delete=delete)
+        
+        styles = {"conflict": "red", "delete-local": "yellow", "delete-remote": "yellow"}
+        
+        def show(action: SyncAction) -> None:
+            line = f"{click.style(action.kind, fg=styles.get(action.kind, 'cyan'))} {action.relpath}"
+            if action.old_relpath:
+                line += f" (from {action.old_relpath})"
+            if action.reason:
+                line += f": {action.reason}"
+            click.echo(line)
+        
+        if dry_run:
+            click.echo(click.style("=== DRY RUN ===", fg='yellow', bold=True))
+            for action in actions:
+                show(action)
+            click.echo(f"{len(actions)} changes, {unchanged} notes unchanged")
+            return
+        
+        failures = []
+        changed_notes = []
+        
+        def on_done(action: SyncAction, error: Optional[Exception]) -> None:
+            if error is not None:
+                failures.append((action, error))
+            else:
+                show(action)
+                if action.kind in REMOTE_CHANGES:
+                    changed_notes.extend(filter(None, (action.note_id, action.parent_id)))
+        
+        try:
+            counts = run_sync(
+                ea, actions, root, directory, state,
+                concurrency=concurrency, retries=retries, on_done=on_done,
+            )
+        finally:
+            state.save(root)
+            cache = get_cache(ctx)
+            if cache and changed_notes:
+                cache.invalidate(changed_notes)
+        
+        for action, error in failures:
+            click.echo(click.style("✗ ", fg='red') + f"{action.kind} {action.relpath}: {error}", err=True)
+        
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Pulled {click.style(str(counts.get('pull', 0)), fg='cyan')}, "
+            f"pushed {click.style(str(counts.get('push', 0)), fg='cyan')}, "
+            f"created {counts.get('create', 0) + counts.get('mkdir', 0)}, "
+            f"moved {counts.get('move', 0)}, "
+            f"deleted {counts.get('delete-local', 0)} files and {counts.get('delete-remote', 0)} notes; "
+            f"{unchanged} unchanged, {counts.get('conflict', 0)} conflicts, {counts['failed']} failed"
+        )
+        if counts["failed"] or counts.get("conflict"):
+            ctx.exit(1)
+        
+    except (click.ClickException, click.exceptions.Exit):
+        raise
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error syncing: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
 @notes.command()
 @click.option(
     "--root", 
@@ -224,10 +1097,34 @@ def create(
     is_flag=True,
     help="Show note IDs in the tree"
 )
+@click.option(
+    "--fetch",
+    type=click.Choice(["search", "walk"]),
+    default="search",
+    help="Fetch the subtree with one search, or note by note",
+    show_default=True
+)
+@concurrency_option(default=DEFAULT_CONCURRENCY)
+@format_option()
 @click.pass_context
-def tree(ctx: click.Context, root: str, max_depth: int, show_ids: bool) -> None:
+def tree(
+    ctx: click.Context,
+    root: str,
+    max_depth: int,
+    show_ids: bool,
+    fetch: str,
+    concurrency: int,
+    output_format: str,
+) -> None:
     """Display notes in a tree structure.
     
+    By default the whole subtree is fetched with a single search scoped to
+    the root note. If the server cannot answer that search, or with
+    --fetch walk, notes on the same level of the tree are fetched
+    concurrently instead; use --concurrency to limit the number of
+    requests in flight. Fetched notes are kept in the local metadata
+    cache; use tpy --refresh notes tree to bypass it.
+    
     Examples:
         # Show full tree starting from root
         tpy notes tree
@@ -237,17 +1134,62 @@ def tree(ctx: click.Context, root: str, max_depth: int, show_ids: bool) -> None:
         
         # Show deeper tree with note IDs
         tpy notes tree --max-depth 5 --show-ids
+        
+        # One CSV row per note, with its parent and depth
+        tpy notes tree --format csv
     """
     try:
         ea = get_etapi(ctx)
+        failed = []
         
-        def print_note(note_id: str, prefix: str = "", depth: int = 0) -> None:
-            if depth > max_depth:
-                return
-                
-            try:
-                note = ea.get_note(note_id)
-                title = note.get('title', 'Untitled')
+        def report_error(note_id: str, e: Exception) -> None:
+            # Reached only once retries are used up, so always worth showing
+            failed.append(note_id)
+            click.echo(click.style("✗ ", fg='red') + f"{note_id}: {e}", err=True)
+        
+        cache = get_cache(ctx)
+        tree_notes = cache.get_subtree(root, max_depth) if cache else None
+        if tree_notes is not None:
+            if ctx.obj.get('debug', False):
+                click.echo("[DEBUG] Using cached tree", err=True)
+        else:
+            known = None
+            if fetch == "search":
+                known = search_subtree(ea, root, max_depth)
+                if known is None and ctx.obj.get('debug', False):
+                    click.echo("[DEBUG] Subtree search failed, fetching note by note", err=True)
+            
+            tree_notes = fetch_tree(
+                ea, root, max_depth, concurrency=concurrency, on_error=report_error,
+                known=known,
+            )
+            if root not in tree_notes:
+                raise click.ClickException(f"Could not fetch note {root}")
+            # Leave a tree with missing subtrees out of the cache
+            if cache and not failed:
+                cache.put_many(tree_notes.values())
+        
+        # Keep only what rendering needs from here on
+        note_tree = NoteTree.from_notes(tree_notes)
+        del tree_notes
+        
+        if output_format != "text":
+            # plain keeps the drawn tree, just without styling
+            plain = output_format == "plain"
+            with open_writer(output_format, ("line",) if plain else TREE_FIELDS) as writer:
+                if not plain:
+                    for record in tree_records(note_tree, root, max_depth):
+                        writer.write(record)
+                else:
+                    for i, parent, prefix, depth in walk_tree(note_tree, root, max_depth):
+                        note_id = note_tree.ids[i]
+                        line = prefix + note_tree.titles[i] + (f"({note_id})" if show_ids else "")
+                        writer.write({"line": line})
+        else:
+            click.echo(click.style(f"Note Tree (max depth: {max_depth}):", bold=True))
+            for i, parent, prefix, depth in walk_tree(note_tree, root, max_depth):
+                note_id = note_tree.ids[i]
+                title = note_tree.titles[i]
                 
                 # Build the line with appropriate prefix and styling
                 line_parts = []
@@ -260,32 +1202,281 @@ def tree(ctx: click.Context, root: str, max_depth: int, show_ids: bool) -> None:
                     line_parts.append(click.style(f"({note_id})", fg='bright_black'))
                 
                 click.echo("".join(line_parts))
-                
-                # Get and display child notes
-                children = ea.get_child_notes(note_id)
-                for i, child in enumerate(children):
-                    is_last = i == len(children) - 1
-                    child_prefix = "    " + ("    " * depth)
-                    
-                    if is_last:
-                        child_prefix += "└── "
-                    else:
-                        child_prefix += "├── "
-                    
-                    print_note(child['noteId'], child_prefix, depth + 1)
-                    
-            except Exception as e:
-                if ctx.obj.get('debug', False):
-                    click.echo(f"Error processing note {note_id}: {e}", err=True)
-        
-        click.echo(click.style(f"Note Tree (max depth: {max_depth}):", bold=True))
-        print_note(root)
         
+        if failed:
+            click.echo(
+                click.style("Warning: ", fg='yellow')
+                + f"{len(failed)} notes could not be fetched; their subtrees are missing",
+                err=True,
+            )
+            ctx.exit(1)
+        
+    except (click.ClickException, click.exceptions.Exit):
+        raise
+    except Exception as e:
+        if ctx.obj.get('debug', False):
+            raise
+        click.echo(click.style("Error: ", fg='red') + str(e), err=True)
+        raise click.Abort()
+
+def tree_records(note_tree: NoteTree, root: str, max_depth: int) -> Iterator[Dict[str, Any]]:
+    """One TREE_FIELDS record per note, in the order tree shows them."""
+    ids = note_tree.ids
+    for i, parent, depth, is_last in note_tree.walk(root, max_depth):
+        yield {
+            "noteId": ids[i],
+            "parentNoteId": ids[parent] if parent >= 0 else None,
+            "depth": depth,
+            "title": note_tree.titles[i],
+            "type": note_tree.types[i],
+        }
+
+@notes.group()
+def bulk() -> None:
+    """Change every note matching a search at once.
+    
+    The notes are found with one search, then changed concurrently.
+    Notes that have the change already are skipped without a request,
+    so running a command again after failures only retries those.
+    """
+    pass
+
+def bulk_options(func: Any) -> Any:
+    """Options shared by the bulk commands."""
+    for option in reversed([
+        click.option("--query", "-q", required=True, help="Search selecting the notes to change"),
+        click.option("--ancestor", "ancestor_id", help="Only change notes below this note"),
+        click.option("--include-archived", is_flag=True, help="Include archived notes"),
+        click.option("--limit", type=click.IntRange(min=1), help="Change at most this many notes"),
+        click.option(
+            "--retries",
+            type=click.IntRange(min=0),
+            default=3,
+            help="Retries for rate-limited, failed or timed out requests",
+            show_default=True,
+        ),
+        concurrency_option(default=DEFAULT_CONCURRENCY),
+        click.option(
+            "--dry-run",
+            is_flag=True,
+            help="Show what would be changed without actually changing",
+        ),
+    ]):
+        func = option(func)
+    return func
+
+def run_bulk(
+    ctx: click.Context,
+    operation: BulkOperation,
+    label: str,
+    query: str,
+    ancestor_id: Optional[str],
+    include_archived: bool,
+    limit: Optional[int],
+    retries: int,
+    concurrency: int,
+    dry_run: bool,
+    check_ids: Tuple[str, ...] = (),
+    confirm: bool = False,
+) -> None:
+    """Find the notes for a bulk command and apply its operation.
+    
+    Args:
+        ctx: Click context
+        operation: The change to make
+        label: What the operation does, e.g. "Labelling"
+        check_ids: Notes the operation refers to, checked to exist first
+        confirm: Ask before changing anything, unless in a dry run
+        (the rest are the shared bulk options)
+    """
+    try:
+        ea = get_etapi(ctx)
+        for note_id in check_ids:
+            check_response(ea.get_note(note_id), "noteId")
+        
+        params = search_params(
+            limit=limit, ancestor_id=ancestor_id, include_archived=include_archived,
+        )
+        notes = search_results(ea.search_note(query, **params))
+        if notes is None:
+            raise click.ClickException("Unexpected response format from server")
+        notes = [note for note in notes if isinstance(note, dict) and note.get('noteId')]
+        if not notes:
+            click.echo("No matching notes found.")
+            return
+        
+        if dry_run:
+            click.echo(click.style("=== DRY RUN ===", fg='yellow', bold=True))
+            counts = {"changed": 0, "unchanged": 0, "failed": 0}
+            for note in notes:
+                title = note.get('title', 'Untitled')
+                try:
+                    steps = operation.plan(note)
+                except ValueError as e:
+                    counts["failed"] += 1
+                    click.echo(click.style("✗ ", fg='red') + f"{note['noteId']} {title}: {e}")
+                    continue
+                counts["changed" if steps else "unchanged"] += 1
+                if steps:
+                    actions = ", ".join(description for description, _ in steps)
+                    click.echo(f"{click.style(actions, fg='cyan')} {note['noteId']} {title}")
+            click.echo(
+                f"{len(notes)} notes match: {counts['changed']} would change, "
+                f"{counts['unchanged']} already done, {counts['failed']} cannot be changed"
+            )
+            return
+        
+        if confirm:
+            click.confirm(f"{label} {len(notes)} notes. Continue?", abort=True, err=True)
+        
+        failures = []
+        # Notes, and the parents they are listed under, that may have changed
+        changed_notes = [operation.parent_id] if isinstance(operation, (Clone, Move)) else []
+        with click.progressbar(length=len(notes), label=label, file=sys.stderr) as bar:
+            def on_done(note: Dict[str, Any], done: List[str], error: Optional[Exception]) -> None:
+                if error is not None:
+                    failures.append((note, done, error))
+                if done or error is not None:
+                    changed_notes.extend([note['noteId'], *(note.get('parentNoteIds') or [])])
+                bar.update(1)
+            
+            try:
+                counts = apply_bulk(
+                    ea, notes, operation,
+                    concurrency=concurrency, retries=retries, on_done=on_done,
+                )
+            finally:
+                cache = get_cache(ctx)
+                if cache and changed_notes:
+                    cache.invalidate(changed_notes)
+        
+        for note, done, error in failures:
+            partly = f" (after: {', '.join(done)})" if done else ""
+            click.echo(
+                click.style("✗ ", fg='red') + f"{note['noteId']} {note.get('title', '')}: {error}{partly}",
+                err=True,
+            )
+        
+        click.echo(
+            click.style("✓ ", fg='green', bold=True)
+            + f"Changed {click.style(str(counts['changed']), fg='cyan')} notes, "
+            f"{counts['unchanged']} already done, {counts['failed']} failed"
+        )
+        if counts["failed"]:
+            click.echo("Run the same command again to retry the failed notes")
+            ctx.exit(1)
+        
+    except (click.ClickException, click.exceptions.Exit, click.exceptions.Abort):
+        raise
     except Exception as e:
         if ctx.obj.get('debug', False):
             raise
         click.echo(click.style("Error: ", fg='red') + str(e), err=True)
         raise click.Abort()
 
+@bulk.command()
+@click.argument("name")
+@click.argument("value", default="")
+@click.option("--remove", is_flag=True, help="Remove the label (only with VALUE, if given) instead")
+@click.option("--inheritable", is_flag=True, help="Make the label inherited by child notes")
+@bulk_options
+@click.pass_context
+def label(
+    ctx: click.Context, name: str, value: str, remove: bool, inheritable: bool, **options: Any
+) -> None:
+    """Set label NAME, with VALUE if given, on every matching note.
+    
+    A note that has the label with another value gets VALUE instead.
+    
+    Examples:
+        tpy notes bulk label status done --query "#status=review" --dry-run
+        
+        tpy notes bulk label todo --remove --query "#todo" --ancestor abc123xyz
+    """
+    if remove:
+        operation: BulkOperation = RemoveAttribute("label", name, value or None)
+    else:
+        operation = SetAttribute("label", name, value, inheritable)
+    run_bulk(ctx, operation, "Unlabelling" if remove else "Labelling", **options)
+
+@bulk.command()
+@click.argument("name")
+@click.argument("target_id", required=False)
+@click.option("--remove", is_flag=True, help="Remove the relation (only to TARGET_ID, if given) instead")
+@click.option("--inheritable", is_flag=True, help="Make the relation inherited by child notes")
+@bulk_options
+@click.pass_context
+def relation(
+    ctx: click.Context,
+    name: str,
+    target_id: Optional[str],
+    remove: bool,
+    inheritable: bool,
+    **options: Any,
+) -> None:
+    """Add relation NAME to TARGET_ID to every matching note.
+    
+    Examples:
+        tpy notes bulk relation template abc123xyz --query "#meeting"
+        
+        tpy notes bulk relation template --remove --query "#meeting"
+    """
+    if remove:
+        run_bulk(ctx, RemoveAttribute("relation", name, target_id), "Removing relations", **options)
+        return
+    if not target_id:
+        raise click.UsageError("TARGET_ID is required unless --remove is given")
+    run_bulk(
+        ctx, SetAttribute("relation", name, target_id, inheritable), "Adding relations",
+        check_ids=(target_id,), **options,
+    )
+
+@bulk.command()
+@click.argument("parent_id")
+@click.option("--from", "from_parent", help="Only move notes out of this parent, keeping any others")
+@click.option("--prefix", help="Branch prefix shown before the titles in the new place")
+@bulk_options
+@click.pass_context
+def move(
+    ctx: click.Context, parent_id: str, from_parent: Optional[str], prefix: Optional[str], **options: Any
+) -> None:
+    """Move every matching note below PARENT_ID.
+    
+    Notes leave all their other parents, or only the one given with --from.
+    
+    Examples:
+        tpy notes bulk move abc123xyz --query "#archived" --dry-run
+        
+        tpy notes bulk move abc123xyz --from def456uvw --query "#project=old"
+    """
+    run_bulk(ctx, Move(parent_id, from_parent, prefix), "Moving", check_ids=(parent_id,), **options)
+
+@bulk.command()
+@click.argument("parent_id")
+@click.option("--prefix", help="Branch prefix shown before the titles in the new place")
+@bulk_options
+@click.pass_context
+def clone(ctx: click.Context, parent_id: str, prefix: Optional[str], **options: Any) -> None:
+    """Place every matching note below PARENT_ID as well.
+    
+    Examples:
+        tpy notes bulk clone abc123xyz --query "#important"
+    """
+    run_bulk(ctx, Clone(parent_id, prefix), "Cloning", check_ids=(parent_id,), **options)
+
+@bulk.command()
+@click.option("--yes", "-y", is_flag=True, help="Don't ask for confirmation")
+@bulk_options
+@click.pass_context
+def delete(ctx: click.Context, yes: bool, **options: Any) -> None:
+    """Delete every matching note, with children that have no other parent.
+    
+    Asks for confirmation first, unless --yes is given.
+    
+    Examples:
+        tpy notes bulk delete --query "#scratch" --dry-run
+        
+        tpy notes bulk delete --query "#scratch" --yes
+    """
+    run_bulk(ctx, Delete(), "Deleting", confirm=not yes, **options)
 
-# Add more note commands here as needed
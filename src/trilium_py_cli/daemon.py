@@ -0,0 +1,417 @@
+"""Resident daemon that runs tpy commands without per-call startup.
+
+``tpy daemon start`` launches a process that has already imported
+trilium-py and keeps HTTP sessions, connection pools, the metadata cache
+and the search index open between commands. The ``tpy`` entry point
+(entry_point below) sends eligible invocations to it over a Unix socket
+and streams their output back; when no daemon is running it runs the
+command itself, as before.
+
+This module is imported by every ``tpy`` invocation, so its top level only
+imports the standard library modules the client needs.
+
+Protocol: the daemon sends frames of a one-byte channel and a four-byte
+big-endian length. Once it accepts a connection it sends an empty ``r``
+(ready) frame; only then does the client send one JSON line with argv,
+working directory, environment and whether its stdout and stderr are
+terminals. A client that gets no ready frame within READY_TIMEOUT, e.g.
+because the daemon is busy with another command, runs the command
+itself: its request was never sent, so it cannot run twice. The daemon
+answers with ``o`` (stdout data), ``e`` (stderr data) and finally ``x``
+(exit status, as ASCII) frames. Control requests (``{"control": "status"}``
+or ``"stop"``) are answered with a single JSON line instead.
+"""
+
+import io
+import json
+import os
+import socket
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+# Default seconds without a request before the daemon exits
+DEFAULT_IDLE_TIMEOUT = 900
+
+# Commands the daemon runs; others (config, daemon, cache) always run locally
+FORWARDED_COMMANDS = frozenset({"notes", "index", "info"})
+
+# Subcommands of forwarded commands that still run locally, always (None)
+# or only with one of the given options: long-running ones, since the
+# daemon runs one command at a time and every other command would wait
+# for them, and bulk, whose delete asks for confirmation on stdin
+LOCAL_SUBCOMMANDS: Dict[Tuple[str, str], Optional[FrozenSet[str]]] = {
+    ("info", "watch"): None,
+    ("index", "sync"): frozenset({"--watch"}),
+    ("notes", "bulk"): None,
+}
+
+# Options of the main command that may precede a forwarded command
+FORWARDED_OPTIONS = frozenset({"--debug", "--no-cache", "--refresh"})
+
+# Seconds a client waits for the daemon to take its request before
+# running the command itself
+READY_TIMEOUT = 2.0
+
+FRAME_HEADER = struct.Struct(">cI")
+
+
+def socket_path() -> Path:
+    """Where the daemon listens: TPY_DAEMON_SOCKET, or a per-user default."""
+    path = os.getenv("TPY_DAEMON_SOCKET")
+    if path:
+        return Path(path).expanduser()
+    return Path.home() / ".trilium-py" / "daemon.sock"
+
+
+def should_forward(argv: List[str]) -> bool:
+    """Whether an invocation can be handed to the daemon.
+
+    Only commands that read no stdin and use no per-call HTTP settings
+    are forwarded; everything else runs locally.
+    """
+    if not hasattr(socket, "AF_UNIX") or os.getenv("TPY_NO_DAEMON"):
+        return False
+    for i, arg in enumerate(argv):
+        if arg in FORWARDED_OPTIONS:
+            continue
+        if arg not in FORWARDED_COMMANDS:
+            return False
+        subcommand = tuple(argv[i:i + 2])
+        if subcommand not in LOCAL_SUBCOMMANDS:
+            return True
+        options = LOCAL_SUBCOMMANDS[subcommand]
+        return options is not None and not any(
+            option in options for option in argv[i + 2:]
+        )
+    return False
+
+
+def connect(timeout: float = READY_TIMEOUT) -> Optional[socket.socket]:
+    """Connect to the daemon and wait until it is ready for a request.
+
+    Returns:
+        socket: The connection, without a timeout, or None if the daemon
+        is not running or did not take the connection within timeout
+    """
+    path = socket_path()
+    if not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+        if _recv_exactly(sock, FRAME_HEADER.size) != FRAME_HEADER.pack(b"r", 0):
+            raise ConnectionError("unexpected greeting")
+    except (OSError, ConnectionError):
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("daemon closed the connection")
+        data += chunk
+    return data
+
+
+def forward(argv: List[str]) -> Optional[int]:
+    """Run an invocation in the daemon, copying its output to ours.
+
+    Returns:
+        int: The command's exit status, or None if no daemon is running,
+        or it is busy, and the command should run locally
+    """
+    sock = connect()
+    if sock is None:
+        return None
+
+    env = dict(os.environ)
+    if sys.stdout.isatty():
+        # The daemon has no terminal to ask for its size
+        try:
+            size = os.get_terminal_size(sys.stdout.fileno())
+            env.setdefault("COLUMNS", str(size.columns))
+            env.setdefault("LINES", str(size.lines))
+        except OSError:
+            pass
+    request = {
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "env": env,
+        "tty": [sys.stdout.isatty(), sys.stderr.isatty()],
+    }
+    try:
+        sock.sendall(json.dumps(request).encode() + b"\n")
+    except OSError:
+        sock.close()
+        return None
+
+    outputs = {b"o": sys.stdout, b"e": sys.stderr}
+    try:
+        while True:
+            channel, size = FRAME_HEADER.unpack(_recv_exactly(sock, FRAME_HEADER.size))
+            payload = _recv_exactly(sock, size)
+            if channel == b"x":
+                return int(payload)
+            stream = outputs[channel]
+            stream.flush()
+            stream.buffer.write(payload)
+            stream.buffer.flush()
+    except (ConnectionError, KeyError) as e:
+        sys.stderr.write(f"Error: lost connection to the tpy daemon: {e}\n")
+        return 1
+    except KeyboardInterrupt:
+        # Closing the socket makes the daemon abandon the command
+        sys.stderr.write("\nAborted!\n")
+        return 130
+    finally:
+        sock.close()
+
+
+def control(command: str, timeout: float = 5.0) -> Optional[Dict[str, Any]]:
+    """Send a control request to the daemon.
+
+    Returns:
+        dict: The daemon's answer, or None if it is not running
+    """
+    sock = connect(timeout)
+    if sock is None:
+        return None
+    sock.settimeout(timeout)
+    try:
+        sock.sendall(json.dumps({"control": command}).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+        return json.loads(line) if line else None
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+
+def entry_point() -> None:
+    """Console script for tpy: use the daemon if it runs, else run locally."""
+    argv = sys.argv[1:]
+    if should_forward(argv):
+        status = forward(argv)
+        if status is not None:
+            sys.exit(status)
+
+    from .cli import main
+
+    main()
+
+
+class FrameWriter(io.RawIOBase):
+    """Binary stream sending whatever is written to the client as frames."""
+
+    def __init__(self, sock: socket.socket, channel: bytes, tty: bool) -> None:
+        super().__init__()
+        self.sock = sock
+        self.channel = channel
+        self.tty = tty
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        if data:
+            self.sock.sendall(FRAME_HEADER.pack(self.channel, len(data)) + data)
+        return len(data)
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        # Lets click and rich decide on colors as they would in the client
+        return self.tty
+
+
+class _Shutdown(BaseException):
+    """Raised by the SIGTERM handler to leave a blocking accept()."""
+
+
+class Daemon:
+    """Serves tpy commands on a Unix socket, one at a time.
+
+    Commands run in this process with the client's working directory,
+    environment and arguments, exactly as tpy would run them, but
+    sessions, caches and indexes stay open between them (see
+    utils.RESIDENT). Requests are handled one after another, since a
+    command changes process-wide state such as the working directory.
+
+    SIGTERM stops the daemon at once when it is idle, and after the
+    command it is running otherwise, so that command still ends normally
+    and its client gets its exit status.
+    """
+
+    def __init__(self, path: Path, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.started = 0.0
+        self.requests = 0
+        self.running = False
+        self.busy = False
+
+    def _terminate(self, *_: Any) -> None:
+        self.running = False
+        if not self.busy:
+            raise _Shutdown()
+
+    def serve(self) -> None:
+        """Accept requests until stopped or idle for idle_timeout seconds."""
+        import signal
+        import time
+
+        import click
+
+        from . import utils
+        from .cli import main
+
+        # Import the forwarded commands and trilium-py before the first request
+        for name in sorted(FORWARDED_COMMANDS):
+            main.get_command(click.Context(main), name)
+        import trilium_py.client  # noqa: F401
+
+        # Clean up the socket on kill as well as on Ctrl+C. This must not
+        # raise SystemExit, which run() takes for the command's exit status
+        signal.signal(signal.SIGTERM, self._terminate)
+
+        utils.RESIDENT = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            self.path.unlink()
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the owner may connect: commands run with their credentials
+        old_umask = os.umask(0o177)
+        try:
+            listener.bind(str(self.path))
+        finally:
+            os.umask(old_umask)
+        listener.listen(16)
+        listener.settimeout(self.idle_timeout or None)
+
+        self.started = time.time()
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    conn, _ = listener.accept()
+                except socket.timeout:
+                    break
+                self.busy = True
+                try:
+                    with conn:
+                        self.handle(conn, main)
+                except OSError:
+                    pass  # client went away
+                finally:
+                    self.busy = False
+        except _Shutdown:
+            pass
+        finally:
+            listener.close()
+            if self.path.exists():
+                self.path.unlink()
+            for resource in utils.RESIDENT.values():
+                resource.close()
+            utils.RESIDENT = None
+
+    def handle(self, conn: socket.socket, main: Any) -> None:
+        """Answer one request."""
+        import time
+
+        # A client sends its request right after the ready frame, or has
+        # given up waiting and closed the connection
+        conn.settimeout(READY_TIMEOUT)
+        conn.sendall(FRAME_HEADER.pack(b"r", 0))
+        with conn.makefile("rb") as f:
+            line = f.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        conn.settimeout(None)
+
+        command = request.get("control")
+        if command is not None:
+            if command == "stop":
+                self.running = False
+            answer = {
+                "pid": os.getpid(),
+                "socket": str(self.path),
+                "uptime": time.time() - self.started,
+                "requests": self.requests,
+                "idle_timeout": self.idle_timeout,
+                "stopping": not self.running,
+            }
+            conn.sendall(json.dumps(answer).encode() + b"\n")
+            return
+
+        self.requests += 1
+        status = self.run(request, conn, main)
+        conn.sendall(FRAME_HEADER.pack(b"x", len(str(status))) + str(status).encode())
+
+    def run(self, request: Dict[str, Any], conn: socket.socket, main: Any) -> int:
+        """Run a forwarded command with the client's state and output."""
+        import io
+        import traceback
+
+        saved_env = dict(os.environ)
+        saved_cwd = os.getcwd()
+        saved_stdio = (sys.stdin, sys.stdout, sys.stderr)
+        stdout_tty, stderr_tty = request.get("tty", [False, False])
+
+        def text_stream(channel: bytes, tty: bool) -> io.TextIOWrapper:
+            return io.TextIOWrapper(
+                FrameWriter(conn, channel, tty),  # type: ignore[arg-type]
+                encoding="utf-8", errors="replace", line_buffering=True, write_through=True,
+            )
+
+        try:
+            os.environ.clear()
+            os.environ.update(request.get("env", {}))
+            sys.stdin = io.StringIO("")
+            sys.stdout = text_stream(b"o", stdout_tty)
+            sys.stderr = text_stream(b"e", stderr_tty)
+            try:
+                os.chdir(request.get("cwd", saved_cwd))
+                main.main(args=request.get("argv", []), prog_name="tpy")
+                return 0
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    return e.code or 0
+                sys.stderr.write(f"{e.code}\n")
+                return 1
+            except Exception:
+                traceback.print_exc()
+                return 1
+        finally:
+            for stream in (sys.stdout, sys.stderr):
+                try:
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+            sys.stdin, sys.stdout, sys.stderr = saved_stdio
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the daemon in the foreground; used by tpy daemon start."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m trilium_py_cli.daemon")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT)
+    args = parser.parse_args(argv)
+    Daemon(socket_path(), args.idle_timeout).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""Incremental subtree export for tpy-cli."""
+
+import asyncio
+import json
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from trilium_py.client import ETAPI
+
+from .async_client import AsyncETAPI, run_async
+from .tree import NoteTree
+from .utils import MIME_TYPES
+
+# Manifest name, written inside the export directory
+MANIFEST_NAME = ".tpy-export.json"
+
+# Prefix of the names moved files have between their old and new paths
+MOVING_PREFIX = ".tpy-moving-"
+
+# Note types whose content is not worth a file of its own
+NO_CONTENT_TYPES = frozenset({"book", "search", "render", "launcher", "doc"})
+
+# Preferred extension for each MIME type; reverses utils.MIME_TYPES
+EXTENSIONS = {mime: ext for ext, mime in reversed(list(MIME_TYPES.items()))}
+
+UNSAFE_CHARS = re.compile(r'[\x00-\x1f<>:"/\\|?*]')
+
+DoneHandler = Callable[["ExportEntry", str, Optional[Exception]], None]
+
+
+class ExportEntry:
+    """A note and the file its content is exported to."""
+
+    __slots__ = ("note_id", "relpath", "blob_id", "modified")
+
+    def __init__(self, note_id: str, relpath: str, blob_id: Optional[str],
+                 modified: Optional[str]) -> None:
+        self.note_id = note_id
+        self.relpath = relpath
+        self.blob_id = blob_id
+        self.modified = modified
+
+
+def safe_name(title: str, fallback: str) -> str:
+    """Turn a note title into a portable file name."""
+    name = UNSAFE_CHARS.sub("_", title).strip(" .")[:100]
+    return name or fallback
+
+
+def content_extension(note_type: Optional[str], mime: Optional[str]) -> str:
+    """File extension for the content of a note of this type and MIME type."""
+    if note_type == "text":
+        return ".html"
+    mime = mime or ""
+    return EXTENSIONS.get(mime) or mimetypes.guess_extension(mime) or ".bin"
+
+
+def plan_layout(tree: NoteTree, root: str, root_stem: Optional[str] = None) -> Dict[int, str]:
+    """Lay out fetched notes as paths, without extensions.
+
+    A note's children go into a directory named after the note, next to
+    its own file. Sibling names that collide get the note ID appended. A
+    note cloned in several places is laid out once, at the first place it
+    is found.
+
+    Args:
+        tree: Fetched notes
+        root: Note ID the layout starts from
+        root_stem: Path of the root note (default: its title); with ""
+            the root's children are laid out at the top level
+
+    Returns:
+        dict: Path stem of every note, by position in tree, breadth first
+    """
+    start = tree.index(root)
+    stems = {start: safe_name(tree.titles[start], root) if root_stem is None else root_stem}
+    level = [start]
+    while level:
+        next_level = []
+        for i in level:
+            stem = stems[i]
+            # Names are compared case-insensitively for the sake of
+            # case-insensitive file systems
+            used = set()
+            for child in tree.children(i):
+                if child in stems:
+                    continue
+                child_id = tree.ids[child]
+                name = safe_name(tree.titles[child], child_id)
+                if name.lower() in used:
+                    name = f"{name}_{child_id}"
+                used.add(name.lower())
+                stems[child] = f"{stem}/{name}" if stem else name
+                next_level.append(child)
+        level = next_level
+    return stems
+
+
+def plan_export(tree: NoteTree, root: str) -> List[ExportEntry]:
+    """Lay out fetched notes as files; see plan_layout.
+
+    A note's content goes to ``<title><ext>`` and its children into a
+    ``<title>/`` directory next to it.
+
+    Args:
+        tree: Fetched notes
+        root: Note ID the export starts from
+
+    Returns:
+        list: Entries for every note that has content to export
+    """
+    return [
+        ExportEntry(
+            tree.ids[i],
+            stem + content_extension(tree.types[i], tree.mimes[i]),
+            tree.blob_ids[i],
+            tree.modified[i],
+        )
+        for i, stem in plan_layout(tree, root).items()
+        if tree.types[i] not in NO_CONTENT_TYPES
+    ]
+
+
+class ExportManifest:
+    """What an earlier export wrote: note ID to path, blobId and date."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def load(self, root: str) -> bool:
+        """Read the manifest.
+
+        Returns:
+            bool: False if the manifest was written for a different root,
+            in which case nothing is loaded
+        """
+        if not self.path.exists():
+            return True
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("root") != root:
+            return False
+        self.entries = data.get("notes", {})
+        return True
+
+    def save(self, root: str) -> None:
+        """Write the manifest atomically."""
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"root": root, "notes": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+async def export_notes_async(
+    aea: AsyncETAPI,
+    entries: List[ExportEntry],
+    directory: Path,
+    manifest: ExportManifest,
+    prune: bool = True,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Bring an export directory up to date.
+
+    Notes whose blobId matches the manifest and whose file is still in
+    place are skipped; if only the path changed the file is moved. Moves
+    go through temporary names, since a note may move to where another
+    one's file still is, as when two notes swap titles. Every other
+    note's content is downloaded, bounded by the client's concurrency.
+    With prune, files the manifest knows about but no longer belong
+    anywhere are removed; other files in the directory are never touched.
+    Without it, manifest entries of notes missing from entries are kept,
+    so a partial tree leaves the rest of the export as it was.
+
+    Args:
+        aea: Async ETAPI client
+        entries: Entries from plan_export
+        directory: Export directory
+        manifest: Manifest of the previous export, updated in place
+        prune: Remove files of notes that are no longer in the subtree
+        on_done: Called with each entry, what happened to it
+            ("downloaded", "unchanged" or "moved") and the error if it failed
+
+    Returns:
+        dict: Counts of downloaded, unchanged, moved, removed and failed notes
+    """
+    counts = {"downloaded": 0, "unchanged": 0, "moved": 0, "removed": 0, "failed": 0}
+    previous = dict(manifest.entries)
+    downloads = []
+    moves = []
+    stale = []
+
+    # Left by a run that stopped halfway through its moves; their notes
+    # are downloaded again, as their files are not where the manifest says
+    for leftover in directory.glob(MOVING_PREFIX + "*"):
+        leftover.unlink()
+
+    for entry in entries:
+        old = previous.pop(entry.note_id, None)
+        dest = directory / entry.relpath
+        if old and old["path"] != entry.relpath:
+            stale.append(old["path"])
+        if old and entry.blob_id and old.get("blobId") == entry.blob_id:
+            old_path = directory / old["path"]
+            if old["path"] == entry.relpath and dest.exists():
+                counts["unchanged"] += 1
+                if on_done:
+                    on_done(entry, "unchanged", None)
+                continue
+            if old_path.exists():
+                moves.append((entry, old))
+                continue
+        downloads.append(entry)
+
+    # Old paths of files moved or removed, whose directories may be empty now
+    vacated = [old["path"] for _, old in moves]
+    staged = []
+    for entry, old in moves:
+        moving = directory / f"{MOVING_PREFIX}{entry.note_id}"
+        os.replace(directory / old["path"], moving)
+        staged.append((entry, old, moving))
+    for entry, old, moving in staged:
+        dest = directory / entry.relpath
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(moving, dest)
+        manifest.entries[entry.note_id] = dict(old, path=entry.relpath)
+        counts["moved"] += 1
+        if on_done:
+            on_done(entry, "moved", None)
+
+    # Anything left in the previous manifest is gone from the subtree, or
+    # was not fetched; without prune its entry is kept for a later run
+    if prune:
+        for note_id, old in previous.items():
+            manifest.entries.pop(note_id, None)
+            stale.append(old["path"])
+
+    if prune:
+        current = {entry.relpath for entry in entries}
+        for relpath in stale:
+            old_path = directory / relpath
+            if relpath not in current and old_path.exists():
+                old_path.unlink()
+                vacated.append(relpath)
+                counts["removed"] += 1
+
+    async def download(entry: ExportEntry) -> Tuple[ExportEntry, Optional[Exception]]:
+        try:
+            await aea.download_note_content(entry.note_id, directory / entry.relpath)
+            return entry, None
+        except Exception as e:
+            return entry, e
+
+    for next_done in asyncio.as_completed([download(entry) for entry in downloads]):
+        entry, error = await next_done
+        if error is not None:
+            counts["failed"] += 1
+            if on_done:
+                on_done(entry, "downloaded", error)
+            continue
+        manifest.entries[entry.note_id] = {
+            "path": entry.relpath,
+            "blobId": entry.blob_id,
+            "utcDateModified": entry.modified,
+        }
+        counts["downloaded"] += 1
+        if on_done:
+            on_done(entry, "downloaded", None)
+
+    remove_empty_dirs(directory, vacated)
+    return counts
+
+
+def export_notes(
+    ea: ETAPI,
+    entries: List[ExportEntry],
+    directory: Path,
+    manifest: ExportManifest,
+    concurrency: int = 8,
+    retries: int = 3,
+    prune: bool = True,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Bring an export directory up to date; see export_notes_async.
+
+    Args:
+        ea: ETAPI client
+        entries: Entries from plan_export
+        directory: Export directory
+        manifest: Manifest of the previous export, updated in place
+        concurrency: Maximum number of downloads in flight
+        retries: Retries for transient failures
+        prune: Remove files of notes that are no longer in the subtree
+        on_done: Called with each entry, what happened to it and the error
+
+    Returns:
+        dict: Counts of downloaded, unchanged, moved, removed and failed notes
+    """
+    return run_async(
+        ea, concurrency,
+        lambda aea: export_notes_async(aea, entries, directory, manifest, prune, on_done),
+        retries=retries,
+    )
+
+
+def remove_empty_dirs(directory: Path, relpaths: Iterable[str]) -> None:
+    """Remove directories left empty by moving or removing files.
+
+    Only the parents of those files are looked at, walking up to
+    directory, so empty directories made by anyone else are kept.
+
+    Args:
+        directory: Export or sync directory, which is always kept
+        relpaths: Old paths of the files that were moved or removed
+    """
+    parents = {
+        parent
+        for relpath in relpaths
+        for parent in Path(relpath).parents
+        if parent != Path(".")
+    }
+    # Deepest first, so a directory is empty once its children are gone
+    for parent in sorted(parents, key=lambda p: len(p.parts), reverse=True):
+        path = directory / parent
+        if path.is_dir() and not any(path.iterdir()):
+            path.rmdir()
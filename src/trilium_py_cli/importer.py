@@ -0,0 +1,303 @@
+"""Directory import for tpy-cli."""
+
+import asyncio
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from trilium_py.client import ETAPI
+
+from .async_client import AsyncETAPI, new_entity_id, run_async
+from .throttle import RateLimiter, create_once_async
+from .transfer import content_path, note_type_for_mime
+from .utils import check_response, guess_mime, infer_mime
+
+# Default journal name, written inside the imported directory
+JOURNAL_NAME = ".tpy-import.jsonl"
+
+# Trilium spaces sibling positions by 10
+POSITION_STEP = 10
+
+DoneHandler = Callable[["ImportItem", Optional[str], Optional[Exception]], None]
+
+
+class ImportItem:
+    """A file or directory to be imported as a note."""
+
+    __slots__ = ("path", "relpath", "parent_relpath", "is_dir", "depth", "position")
+
+    def __init__(
+        self,
+        path: Path,
+        relpath: str,
+        parent_relpath: str,
+        is_dir: bool,
+        depth: int,
+        position: int,
+    ) -> None:
+        self.path = path
+        self.relpath = relpath
+        self.parent_relpath = parent_relpath
+        self.is_dir = is_dir
+        self.depth = depth
+        self.position = position
+
+    @property
+    def title(self) -> str:
+        """Note title: the file name, without extension for known types."""
+        if not self.is_dir and infer_mime(self.path):
+            return self.path.stem
+        return self.path.name
+
+
+def scan_directory(directory: Path, skip: Optional[Path] = None) -> List[ImportItem]:
+    """List the files and directories to import, parents before children.
+
+    Hidden entries are left out, and so is ``skip`` (the journal).
+
+    Args:
+        directory: Directory to scan
+        skip: File to leave out
+
+    Returns:
+        list: Items ordered by depth, then by name within each directory
+    """
+    items: List[ImportItem] = []
+    pending: List[Tuple[Path, str, int]] = [(directory, "", 1)]
+    while pending:
+        next_pending: List[Tuple[Path, str, int]] = []
+        for path, relpath, depth in pending:
+            with os.scandir(path) as it:
+                entries = sorted(
+                    (e for e in it if not e.name.startswith(".")),
+                    key=lambda e: e.name.lower(),
+                )
+            for i, entry in enumerate(entries, 1):
+                entry_path = Path(entry.path)
+                if skip is not None and entry_path == skip:
+                    continue
+                entry_relpath = f"{relpath}/{entry.name}" if relpath else entry.name
+                is_dir = entry.is_dir()
+                items.append(ImportItem(
+                    entry_path, entry_relpath, relpath, is_dir, depth, i * POSITION_STEP
+                ))
+                if is_dir:
+                    next_pending.append((entry_path, entry_relpath, depth + 1))
+        pending = next_pending
+    return items
+
+
+class ImportJournal:
+    """Append-only record of notes created by an import.
+
+    Each line maps a path relative to the imported directory to the note
+    created for it, so an interrupted import can be resumed. Entries for a
+    different parent note are ignored.
+
+    The first line for a parent holds a random import ID, from which
+    note_id derives the ID of every note the import creates. A create
+    whose response never arrived therefore gets the same ID on the next
+    attempt or run, and the note it made is found rather than made twice.
+    """
+
+    def __init__(self, path: Path, parent_id: str) -> None:
+        self.path = path
+        self.parent_id = parent_id
+        self.import_id: Optional[str] = None
+        self._file: Optional[Any] = None
+
+    def load(self) -> Dict[str, str]:
+        """Read notes created by earlier runs, keyed by relative path."""
+        created: Dict[str, str] = {}
+        if not self.path.exists():
+            return created
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write leaves a partial last line
+                    continue
+                if entry.get("parent") != self.parent_id:
+                    continue
+                if "importId" in entry:
+                    self.import_id = self.import_id or entry["importId"]
+                else:
+                    created[entry["path"]] = entry["noteId"]
+        return created
+
+    def start(self) -> None:
+        """Record an import ID for this parent, unless an earlier run did."""
+        if self.import_id is None:
+            self.import_id = uuid.uuid4().hex
+            self._write({"parent": self.parent_id, "importId": self.import_id})
+
+    def note_id(self, relpath: str) -> str:
+        """The ID the note for a path gets; the same on every run."""
+        assert self.import_id is not None, "call start first"
+        return new_entity_id(f"{self.import_id}/{relpath}")
+
+    def record(self, relpath: str, note_id: str) -> None:
+        """Append a created note and flush it to disk."""
+        self._write({"parent": self.parent_id, "path": relpath, "noteId": note_id})
+
+    def _write(self, entry: Dict[str, str]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def note_params(item: ImportItem) -> Dict[str, Any]:
+    """Build create_note arguments for an item; content is uploaded after."""
+    if item.is_dir:
+        return {"title": item.title, "type": "book", "content": ""}
+
+    mime = guess_mime(item.path) or "text/plain"
+    return {
+        "title": item.title,
+        "type": note_type_for_mime(mime),
+        "mime": mime,
+        "content": "",
+    }
+
+
+async def import_directory_async(
+    aea: AsyncETAPI,
+    items: List[ImportItem],
+    parent_id: str,
+    journal: ImportJournal,
+    limiter: Optional[RateLimiter] = None,
+    retries: int = 3,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Create notes for scanned items, one depth level at a time.
+
+    Siblings are created concurrently, bounded by the client's
+    concurrency, once their parent exists. Items already in the journal
+    are skipped, and items below a directory that failed are not
+    attempted. Each note gets its ID from the journal, so failed creates
+    are retried without making duplicates; see create_once_async.
+
+    Files are created as empty notes and their content is streamed up
+    afterwards, so a file is only read once its upload has a slot. If the
+    upload fails the item fails too, and the next run finds the note and
+    uploads the content again.
+
+    Args:
+        aea: Async ETAPI client
+        items: Items from scan_directory
+        parent_id: Note to import under
+        journal: Journal of created notes
+        limiter: Rate limiter shared by all requests
+        retries: Retries for transient failures
+        on_done: Called with the item and its note ID, or the error
+
+    Returns:
+        dict: Counts of created, skipped and failed items
+    """
+    note_ids = journal.load()
+    note_ids[""] = parent_id
+    journal.start()
+    counts = {"created": 0, "skipped": 0, "failed": 0}
+
+    async def create(
+        item: ImportItem, parent_note_id: str
+    ) -> Tuple[ImportItem, Optional[str], Optional[Exception]]:
+        note_id = journal.note_id(item.relpath)
+
+        async def send() -> Dict[str, Any]:
+            result = await aea.create_note(
+                parentNoteId=parent_note_id,
+                notePosition=item.position,
+                noteId=note_id,
+                branchId=f"{parent_note_id}_{note_id}",
+                **params,
+            )
+            return check_response(result, "note")["note"]
+
+        try:
+            params = note_params(item)
+            note = await create_once_async(
+                send, lambda: aea.find_note(note_id), retries=retries, limiter=limiter,
+            )
+            if not item.is_dir:
+                if limiter:
+                    await limiter.acquire_async()
+                await aea.upload_content(content_path(note_id), item.path, params["mime"])
+            return item, note["noteId"], None
+        except Exception as e:
+            return item, None, e
+
+    levels: Dict[int, List[ImportItem]] = {}
+    for item in items:
+        levels.setdefault(item.depth, []).append(item)
+
+    for depth in sorted(levels):
+        pending = []
+        for item in levels[depth]:
+            parent_note_id = note_ids.get(item.parent_relpath)
+            if item.relpath in note_ids:
+                counts["skipped"] += 1
+                if on_done:
+                    on_done(item, note_ids[item.relpath], None)
+            elif parent_note_id is None:
+                counts["failed"] += 1
+                if on_done:
+                    on_done(item, None, ValueError("parent directory was not imported"))
+            else:
+                pending.append(create(item, parent_note_id))
+
+        for next_done in asyncio.as_completed(pending):
+            item, note_id, error = await next_done
+            if note_id is None:
+                counts["failed"] += 1
+            else:
+                note_ids[item.relpath] = note_id
+                journal.record(item.relpath, note_id)
+                counts["created"] += 1
+            if on_done:
+                on_done(item, note_id, error)
+
+    return counts
+
+
+def import_directory(
+    ea: ETAPI,
+    items: List[ImportItem],
+    parent_id: str,
+    journal: ImportJournal,
+    concurrency: int = 4,
+    limiter: Optional[RateLimiter] = None,
+    retries: int = 3,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Create notes for scanned items; see import_directory_async.
+
+    Args:
+        ea: ETAPI client
+        items: Items from scan_directory
+        parent_id: Note to import under
+        journal: Journal of created notes
+        concurrency: Maximum number of requests in flight
+        limiter: Rate limiter shared by all requests
+        retries: Retries for transient failures
+        on_done: Called with the item and its note ID, or the error
+
+    Returns:
+        dict: Counts of created, skipped and failed items
+    """
+    return run_async(
+        ea, concurrency,
+        lambda aea: import_directory_async(
+            aea, items, parent_id, journal, limiter, retries, on_done
+        ),
+        retries=retries,
+    )
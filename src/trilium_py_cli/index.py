@@ -0,0 +1,517 @@
+"""Local full-text index of notes for tpy-cli."""
+
+import asyncio
+import html
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from trilium_py.client import ETAPI
+
+from .async_client import AsyncETAPI, run_async
+from .tree import search_subtree
+
+# Index location, overridable through the environment or .env
+INDEX_FILE = Path.home() / ".trilium-py" / "index.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    server TEXT NOT NULL,
+    note_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    type TEXT,
+    mime TEXT,
+    blob_id TEXT,
+    utc_date_modified TEXT,
+    UNIQUE (server, note_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, attributes, content, tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS state (
+    server TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (server, key)
+);
+"""
+
+# Ranking weights for the title, attributes and content columns
+WEIGHTS = (10.0, 5.0, 1.0)
+
+# Note types whose content is text worth indexing; other notes are
+# indexed by title and attributes only
+TEXT_TYPES = frozenset({"text", "code", "mermaid"})
+
+# Notes written to the index between commits
+COMMIT_EVERY = 200
+
+TAGS = re.compile(r"<(script|style)\b.*?</\1\s*>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+BLOCK_TAGS = re.compile(r"</?(p|div|br|li|h[1-6]|tr|pre|blockquote)\b[^>]*>", re.IGNORECASE)
+WORDS = re.compile(r"\w+", re.UNICODE)
+
+DoneHandler = Callable[[Dict[str, Any], Optional[Exception]], None]
+
+
+def strip_html(text: str) -> str:
+    """Reduce note HTML to plain text, keeping line breaks between blocks."""
+    text = BLOCK_TAGS.sub("\n", text)
+    text = html.unescape(TAGS.sub("", text))
+    return re.sub(r"[ \t\r\f\v]+", " ", re.sub(r"\n\s*\n+", "\n", text)).strip()
+
+
+def has_text_content(note: Dict[str, Any]) -> bool:
+    """Whether a note's content is text that belongs in the index."""
+    return note.get("type") in TEXT_TYPES or (note.get("mime") or "").startswith("text/")
+
+
+def attribute_text(note: Dict[str, Any]) -> str:
+    """Labels and relations of a note as searchable text, e.g. '#todo ~template'."""
+    parts = []
+    for attr in note.get("attributes") or []:
+        if attr.get("type") == "label":
+            value = attr.get("value")
+            parts.append(f"#{attr.get('name')}={value}" if value else f"#{attr.get('name')}")
+        elif attr.get("type") == "relation":
+            parts.append(f"~{attr.get('name')}")
+    return " ".join(parts)
+
+
+def fts_query(text: str, columns: Optional[Sequence[str]] = None) -> Optional[str]:
+    """Turn free text into an FTS5 query.
+
+    Every word must match, as a prefix, so ``meet not`` finds "meeting
+    notes". Punctuation is ignored rather than parsed as FTS5 syntax.
+
+    Args:
+        text: Words to search for
+        columns: Limit the match to these columns
+
+    Returns:
+        str: FTS5 query, or None if text has no words
+    """
+    words = WORDS.findall(text)
+    if not words:
+        return None
+    query = " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+    if columns:
+        query = f"{{{' '.join(columns)}}}: ({query})"
+    return query
+
+
+class NoteIndex:
+    """SQLite FTS5 index of note titles, attributes and content.
+
+    Notes of several servers can share one index file; every instance
+    reads and writes the notes of its own server only. The index needs no
+    network access once built.
+    """
+
+    def __init__(self, server: str, path: Path = INDEX_FILE) -> None:
+        self.server = server
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls, server: str) -> "NoteIndex":
+        """Create an index stored where TPY_INDEX_FILE says."""
+        return cls(server, path=Path(os.getenv("TPY_INDEX_FILE", str(INDEX_FILE))).expanduser())
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the database on first use."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def commit(self) -> None:
+        """Commit pending writes."""
+        if self._conn is not None:
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Commit and close the database connection."""
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+    def blob_ids(self) -> Dict[str, Optional[str]]:
+        """blobId of every indexed note, keyed by note ID."""
+        return dict(self.conn.execute(
+            "SELECT note_id, blob_id FROM documents WHERE server = ?", (self.server,)
+        ))
+
+    def modified(self) -> Dict[str, Optional[str]]:
+        """utcDateModified of every indexed note, keyed by note ID."""
+        return dict(self.conn.execute(
+            "SELECT note_id, utc_date_modified FROM documents WHERE server = ?",
+            (self.server,),
+        ))
+
+    def put(self, note: Dict[str, Any], content: Optional[str] = None) -> None:
+        """Add or update a note; the caller commits.
+
+        Args:
+            note: Note metadata
+            content: Plain text content; None keeps what is already indexed
+        """
+        row = self.conn.execute(
+            "SELECT id FROM documents WHERE server = ? AND note_id = ?",
+            (self.server, note["noteId"]),
+        ).fetchone()
+        if row is not None and content is None:
+            old = self.conn.execute(
+                "SELECT content FROM documents_fts WHERE rowid = ?", (row[0],)
+            ).fetchone()
+            content = old[0] if old else None
+
+        self.conn.execute(
+            """
+            INSERT INTO documents
+                (server, note_id, title, type, mime, blob_id, utc_date_modified)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (server, note_id) DO UPDATE SET
+                title = excluded.title,
+                type = excluded.type,
+                mime = excluded.mime,
+                blob_id = excluded.blob_id,
+                utc_date_modified = excluded.utc_date_modified
+            """,
+            (self.server, note["noteId"], note.get("title") or "", note.get("type"),
+             note.get("mime"), note.get("blobId"), note.get("utcDateModified")),
+        )
+        doc_id = row[0] if row is not None else self.conn.execute(
+            "SELECT id FROM documents WHERE server = ? AND note_id = ?",
+            (self.server, note["noteId"]),
+        ).fetchone()[0]
+
+        self.conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+        self.conn.execute(
+            "INSERT INTO documents_fts (rowid, title, attributes, content) VALUES (?, ?, ?, ?)",
+            (doc_id, note.get("title") or "", attribute_text(note), content or ""),
+        )
+
+    def remove(self, note_ids: Iterable[str]) -> int:
+        """Drop notes from the index; the caller commits.
+
+        Returns:
+            int: Number of notes removed
+        """
+        removed = 0
+        for note_id in note_ids:
+            row = self.conn.execute(
+                "SELECT id FROM documents WHERE server = ? AND note_id = ?",
+                (self.server, note_id),
+            ).fetchone()
+            if row is None:
+                continue
+            self.conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+            self.conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+            removed += 1
+        return removed
+
+    def search(
+        self,
+        text: str,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        columns: Optional[Sequence[str]] = None,
+        highlight: Tuple[str, str] = ("[", "]"),
+    ) -> List[Dict[str, Any]]:
+        """Search the index, best matches first.
+
+        Titles weigh more than attributes, and attributes more than content.
+
+        Args:
+            text: Words to search for, see fts_query
+            limit: Maximum number of results
+            offset: Number of results to skip
+            columns: Only match these of title, attributes and content
+            highlight: Strings put around matched words in snippets
+
+        Returns:
+            list: Note metadata with a ``snippet`` of the best matching
+            column and its ``score`` (lower is better)
+        """
+        query = fts_query(text, columns)
+        if query is None:
+            return []
+        rows = self.conn.execute(
+            f"""
+            SELECT d.note_id, d.title, d.type, d.mime, d.utc_date_modified,
+                   snippet(documents_fts, -1, ?, ?, '…', 16),
+                   bm25(documents_fts, {', '.join(map(str, WEIGHTS))}) AS score
+            FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+            WHERE documents_fts MATCH ? AND d.server = ?
+            ORDER BY score
+            LIMIT ? OFFSET ?
+            """,
+            (highlight[0], highlight[1], query, self.server,
+             -1 if limit is None else limit, offset),
+        ).fetchall()
+        return [
+            {
+                "noteId": note_id,
+                "title": title,
+                "type": note_type,
+                "mime": mime,
+                "utcDateModified": modified,
+                "snippet": snippet,
+                "score": score,
+            }
+            for note_id, title, note_type, mime, modified, snippet, score in rows
+        ]
+
+    def get_state(self, key: str) -> Optional[str]:
+        """Read a value stored with set_state."""
+        row = self.conn.execute(
+            "SELECT value FROM state WHERE server = ? AND key = ?", (self.server, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: Optional[str]) -> None:
+        """Store a value for this server, e.g. when the index was built."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO state (server, key, value) VALUES (?, ?, ?)",
+            (self.server, key, value),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Summarize what is indexed for this server."""
+        (notes,) = self.conn.execute(
+            "SELECT COUNT(*) FROM documents WHERE server = ?", (self.server,)
+        ).fetchone()
+        built_at = self.get_state("built_at")
+        synced_at = self.get_state("synced_at")
+        return {
+            "path": str(self.path),
+            "size": self.path.stat().st_size if self.path.exists() else 0,
+            "server": self.server,
+            "notes": notes,
+            "root": self.get_state("root"),
+            "built_at": float(built_at) if built_at else None,
+            "synced_at": float(synced_at) if synced_at else None,
+            "watermark": self.get_state("watermark"),
+        }
+
+
+async def index_notes_async(
+    aea: AsyncETAPI,
+    index: NoteIndex,
+    notes: Dict[str, Dict[str, Any]],
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Write notes into the index, downloading content only where needed.
+
+    Content is fetched, bounded by the client's concurrency, for text
+    notes whose blobId differs from the indexed one. Notes without text
+    content and notes whose content is unchanged only have their title and
+    attributes updated.
+
+    Args:
+        aea: Async ETAPI client
+        index: Index to update
+        notes: Note metadata keyed by note ID
+        on_done: Called with each note and the error if it failed
+
+    Returns:
+        dict: Counts of fetched, unchanged and failed notes
+    """
+    counts = {"fetched": 0, "unchanged": 0, "failed": 0}
+    indexed = index.blob_ids()
+    downloads = []
+    pending = 0
+
+    for note in notes.values():
+        note_id = note["noteId"]
+        if has_text_content(note) and (
+            note_id not in indexed or indexed[note_id] != note.get("blobId")
+        ):
+            downloads.append(note)
+            continue
+        index.put(note, None if note_id in indexed else "")
+        counts["unchanged"] += 1
+        if on_done:
+            on_done(note, None)
+    index.commit()
+
+    async def fetch(note: Dict[str, Any]) -> Tuple[Dict[str, Any], Any]:
+        try:
+            content = await aea.get_note_content(note["noteId"])
+            return note, content
+        except Exception as e:
+            return note, e
+
+    for next_done in asyncio.as_completed([fetch(note) for note in downloads]):
+        note, content = await next_done
+        if isinstance(content, Exception):
+            counts["failed"] += 1
+            if on_done:
+                on_done(note, content)
+            continue
+        if note.get("type") == "text":
+            content = strip_html(content)
+        index.put(note, content)
+        counts["fetched"] += 1
+        pending += 1
+        if pending >= COMMIT_EVERY:
+            index.commit()
+            pending = 0
+        if on_done:
+            on_done(note, None)
+
+    index.commit()
+    return counts
+
+
+def build_index(
+    ea: ETAPI,
+    index: NoteIndex,
+    notes: Dict[str, Dict[str, Any]],
+    root: str,
+    concurrency: int = 8,
+    retries: int = 3,
+    prune: bool = True,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Make the index hold exactly the given notes.
+
+    Notes already indexed with the same blobId keep their content, so
+    rebuilding an index costs one content download per changed note.
+    With prune, indexed notes that are not among the given ones are
+    removed.
+
+    Args:
+        ea: ETAPI client
+        index: Index to update
+        notes: Metadata of every note to index, keyed by note ID
+        root: Note ID the notes were fetched from
+        concurrency: Maximum number of content downloads in flight
+        retries: Retries for transient failures
+        prune: Remove indexed notes missing from notes
+        on_done: Called with each note and the error if it failed
+
+    Returns:
+        dict: Counts of fetched, unchanged, removed and failed notes
+    """
+    failed: List[Dict[str, Any]] = []
+    counts = run_async(
+        ea, concurrency,
+        lambda aea: index_notes_async(aea, index, notes, _track_failures(failed, on_done)),
+        retries=retries,
+    )
+    counts["removed"] = index.remove(set(index.blob_ids()) - set(notes)) if prune else 0
+    now = str(time.time())
+    index.set_state("root", root)
+    index.set_state("built_at", now)
+    index.set_state("synced_at", now)
+    index.set_state("watermark", next_watermark(notes.values(), failed, None))
+    index.commit()
+    return counts
+
+
+def sync_index(
+    ea: ETAPI,
+    index: NoteIndex,
+    concurrency: int = 8,
+    retries: int = 3,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Bring a built index up to date with what changed on the server.
+
+    A single search lists every note below the indexed root. Notes whose
+    utcDateModified differs from the indexed one are updated, downloading
+    content only if its blobId changed, and indexed notes missing from the
+    list, because they were deleted or moved elsewhere, are removed.
+
+    Changing only a note's attributes does not change its
+    utcDateModified, so such changes are only picked up by build_index.
+
+    Args:
+        ea: ETAPI client
+        index: Index built with build_index
+        concurrency: Maximum number of content downloads in flight
+        retries: Retries for transient failures
+        on_done: Called with each changed note and the error if it failed
+
+    Returns:
+        dict: Counts of changed, fetched, unchanged, removed and failed notes
+
+    Raises:
+        ValueError: If the index has not been built yet
+        RuntimeError: If the server's search fails
+    """
+    root = index.get_state("root")
+    if root is None:
+        raise ValueError("The index has not been built yet; run tpy index build")
+
+    listed = search_subtree(ea, root, None)
+    if listed is None:
+        raise RuntimeError("Search for the indexed notes failed")
+
+    indexed = index.modified()
+    changed = {
+        note_id: note for note_id, note in listed.items()
+        if note_id not in indexed or indexed[note_id] != note.get("utcDateModified")
+    }
+    deleted = set(indexed) - set(listed) - {root}
+
+    failed: List[Dict[str, Any]] = []
+    counts = {"changed": len(changed)}
+    if changed:
+        counts.update(run_async(
+            ea, concurrency,
+            lambda aea: index_notes_async(aea, index, changed, _track_failures(failed, on_done)),
+            retries=retries,
+        ))
+    else:
+        counts.update(fetched=0, unchanged=0, failed=0)
+    counts["removed"] = index.remove(deleted)
+
+    index.set_state("synced_at", str(time.time()))
+    index.set_state(
+        "watermark", next_watermark(changed.values(), failed, index.get_state("watermark"))
+    )
+    index.commit()
+    return counts
+
+
+def next_watermark(
+    notes: Iterable[Dict[str, Any]],
+    failed: List[Dict[str, Any]],
+    previous: Optional[str],
+) -> Optional[str]:
+    """Watermark to sync from next time.
+
+    The newest utcDateModified among the indexed notes, unless a note
+    failed to download: then the oldest failed one, so the next sync picks
+    it up again.
+    """
+    if failed:
+        dates = [note["utcDateModified"] for note in failed if note.get("utcDateModified")]
+        return min(dates) if dates else previous
+    dates = [note["utcDateModified"] for note in notes if note.get("utcDateModified")]
+    if previous:
+        dates.append(previous)
+    return max(dates) if dates else previous
+
+
+def _track_failures(
+    failed: List[Dict[str, Any]], on_done: Optional[DoneHandler]
+) -> DoneHandler:
+    # Collects failed notes for next_watermark, then passes on to on_done
+    def handler(note: Dict[str, Any], error: Optional[Exception]) -> None:
+        if error is not None:
+            failed.append(note)
+        if on_done:
+            on_done(note, error)
+    return handler
@@ -0,0 +1,272 @@
+"""Health monitoring of Trilium servers for tpy info watch.
+
+Each poll is one GET of /etapi/app-info per server. Round-trip times of
+successful polls go into a LatencyHistogram per server: cumulative
+buckets for Prometheus, and a window of recent samples for exact
+percentiles. Availability counts every poll, and version drift compares
+the versions each server reported with the most common ones; a server
+that is down has no versions until it answers again.
+"""
+
+import os
+import re
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .profiling import PERCENTILES, percentile
+
+# Upper bounds of the RTT histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Recent RTT samples kept per server for percentiles
+WINDOW = 1000
+
+# Fields of app-info compared across servers for version drift
+VERSION_FIELDS = ("appVersion", "dbVersion", "syncVersion")
+
+
+class LatencyHistogram:
+    """Round-trip times of one server."""
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS, window: int = WINDOW) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count) pairs as Prometheus expects them, ending with +Inf."""
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            pairs.append((f"{bound:g}", total))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        """p50, p95 and p99 of the recent samples in ms; None before any."""
+        values = sorted(self.recent)
+        return {
+            f"p{pct}": round(percentile(values, pct) * 1000, 1) if values else None
+            for pct in PERCENTILES
+        }
+
+
+class ServerStatus:
+    """Everything known about one watched server."""
+
+    def __init__(self, name: str, url: str, token: Optional[str]) -> None:
+        self.name = name
+        self.url = url.rstrip("/")
+        self.token = token
+        self.polls = 0
+        self.failures = 0
+        self.up = False
+        self.last_rtt: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_poll: Optional[float] = None
+        self.versions: Dict[str, Any] = {}
+        self.rtt = LatencyHistogram()
+
+    @property
+    def availability(self) -> Optional[float]:
+        """Fraction of polls that succeeded, or None before the first."""
+        return (self.polls - self.failures) / self.polls if self.polls else None
+
+    def record(self, rtt: Optional[float], app_info: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        """Add the outcome of a poll."""
+        self.polls += 1
+        self.last_poll = time.time()
+        self.up = error is None
+        self.last_error = error
+        self.last_rtt = rtt
+        if error is not None:
+            self.failures += 1
+            # Versions from before the outage may no longer hold
+            self.versions = {}
+            return
+        self.rtt.observe(rtt or 0.0)
+        self.versions = {key: (app_info or {}).get(key) for key in VERSION_FIELDS}
+
+
+def parse_servers(specs: Iterable[str]) -> List[Tuple[str, str]]:
+    """(name, url) pairs from NAME=URL specs; a bare URL is named by its host.
+
+    Raises:
+        ValueError: If a spec has no URL or two specs share a name
+    """
+    servers: List[Tuple[str, str]] = []
+    for spec in specs:
+        name, sep, url = spec.partition("=")
+        if not sep or "://" in name:
+            name, url = "", spec
+        url = url.strip()
+        if not url:
+            raise ValueError(f"No URL in {spec!r}")
+        name = name.strip() or re.sub(r"^[a-z]+://", "", url).split("/")[0]
+        if any(name == other for other, _ in servers):
+            raise ValueError(f"Server name {name!r} is used twice")
+        servers.append((name, url))
+    return servers
+
+
+def token_for(name: str) -> Optional[str]:
+    """ETAPI token of a watched server: TRILIUM_TOKEN_<NAME>, else TRILIUM_TOKEN."""
+    variable = "TRILIUM_TOKEN_" + re.sub(r"[^A-Z0-9]", "_", name.upper())
+    return os.getenv(variable) or os.getenv("TRILIUM_TOKEN")
+
+
+def watch_session(servers: int) -> requests.Session:
+    """A session with a connection pool for each watched server.
+
+    With fewer pools than servers, pools would be evicted between polls
+    and round-trip times would include setting up new connections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(1, servers))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def poll(session: Any, status: ServerStatus, timeout: float) -> None:
+    """Fetch a server's app-info once and record the outcome."""
+    headers = {"Authorization": status.token} if status.token else {}
+    start = time.perf_counter()
+    try:
+        response = session.get(f"{status.url}/etapi/app-info", headers=headers, timeout=timeout)
+    except Exception as e:
+        # e.g. ConnectTimeout; the full message repeats the URL
+        status.record(None, None, type(e).__name__)
+        return
+    rtt = time.perf_counter() - start
+    if response.status_code >= 400:
+        status.record(rtt, None, f"HTTP {response.status_code}")
+        return
+    try:
+        app_info = response.json()
+    except ValueError:
+        status.record(rtt, None, "Invalid app-info response")
+        return
+    status.record(rtt, app_info, None)
+
+
+def poll_all(executor: ThreadPoolExecutor, session: Any, statuses: Sequence[ServerStatus], timeout: float) -> None:
+    """Poll every server at the same time and wait for all of them."""
+    for future in [executor.submit(poll, session, status, timeout) for status in statuses]:
+        future.result()
+
+
+def expected_versions(statuses: Sequence[ServerStatus]) -> Dict[str, Any]:
+    """The most common value of each version field among servers that answered."""
+    expected = {}
+    for key in VERSION_FIELDS:
+        values = Counter(s.versions[key] for s in statuses if s.versions.get(key) is not None)
+        if values:
+            expected[key] = values.most_common(1)[0][0]
+    return expected
+
+
+def drift(status: ServerStatus, expected: Dict[str, Any]) -> Dict[str, Any]:
+    """Version fields where a server differs from the expected value."""
+    return {
+        key: status.versions[key]
+        for key, value in expected.items()
+        if status.versions.get(key) is not None and status.versions[key] != value
+    }
+
+
+def metrics_json(statuses: Sequence[ServerStatus]) -> Dict[str, Any]:
+    """All servers' metrics as a JSON-ready dict."""
+    expected = expected_versions(statuses)
+    servers = []
+    for s in statuses:
+        availability = s.availability
+        servers.append({
+            "name": s.name,
+            "url": s.url,
+            "up": s.up,
+            "polls": s.polls,
+            "failures": s.failures,
+            "availability": round(availability, 4) if availability is not None else None,
+            "last_rtt_ms": round(s.last_rtt * 1000, 1) if s.last_rtt is not None else None,
+            "last_error": s.last_error,
+            "rtt_ms": s.rtt.percentiles(),
+            "rtt_buckets": dict(s.rtt.cumulative()),
+            "versions": s.versions,
+            "drift": drift(s, expected),
+        })
+    return {"timestamp": time.time(), "expected_versions": expected, "servers": servers}
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metrics_prometheus(statuses: Sequence[ServerStatus]) -> str:
+    """All servers' metrics in the Prometheus text exposition format."""
+    expected = expected_versions(statuses)
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples: Iterable[Tuple[str, str, Any]]) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{{{labels}}} {value}")
+
+    labels = {s.name: f'server="{_label(s.name)}",url="{_label(s.url)}"' for s in statuses}
+    metric("tpy_server_up", "gauge", "Whether the last poll of the server succeeded.",
+           [("", labels[s.name], int(s.up)) for s in statuses])
+    metric("tpy_server_polls_total", "counter", "Polls of the server.",
+           [("", labels[s.name], s.polls) for s in statuses])
+    metric("tpy_server_failures_total", "counter", "Polls of the server that failed.",
+           [("", labels[s.name], s.failures) for s in statuses])
+    rtt_samples: List[Tuple[str, str, Any]] = []
+    for s in statuses:
+        for le, count in s.rtt.cumulative():
+            rtt_samples.append(("_bucket", f'{labels[s.name]},le="{le}"', count))
+        rtt_samples.append(("_sum", labels[s.name], f"{s.rtt.sum:.6f}"))
+        rtt_samples.append(("_count", labels[s.name], s.rtt.count))
+    metric("tpy_server_rtt_seconds", "histogram", "Round-trip time of successful app-info requests.",
+           rtt_samples)
+    metric("tpy_server_info", "gauge", "Versions the server reported.", [
+        ("", labels[s.name] + "".join(
+            f',{key}="{_label(s.versions[key])}"'
+            for key in VERSION_FIELDS if s.versions.get(key) is not None
+        ), 1)
+        for s in statuses if s.versions
+    ])
+    metric("tpy_server_version_drift", "gauge",
+           "Whether the server's versions differ from the most common ones.",
+           [("", labels[s.name], int(bool(drift(s, expected)))) for s in statuses if s.versions])
+    return "\n".join(lines) + "\n"
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Replace a file's contents in one step, so readers never see half of it."""
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
@@ -4,6 +4,8 @@ import click
 from typing import Callable, Any, TypeVar, Optional
 from pathlib import Path
 
+from .output import FORMATS
+
 F = TypeVar('F', bound=Callable[..., Any])
 
 def server_option() -> Callable[[F], F]:
@@ -30,6 +32,56 @@ def common_options(func: F) -> F:
     func = token_option()(func)
     return func
 
+def concurrency_option(default: int = 8) -> Callable[[F], F]:
+    """Decorator to add --concurrency option to a command."""
+    return click.option(
+        "--concurrency",
+        type=click.IntRange(min=1),
+        default=default,
+        help="Maximum number of requests to run at the same time",
+        show_default=True,
+    )
+
+def format_option(default: str = "text") -> Callable[[F], F]:
+    """Decorator to add --format option to a command."""
+    return click.option(
+        "--format",
+        "output_format",
+        type=click.Choice(FORMATS),
+        default=default,
+        help="Output format; all but text stream one unstyled record per note",
+        show_default=True,
+    )
+
+def http_options(func: F) -> F:
+    """Decorator to add HTTP session tuning options to a command.
+    
+    Unset options fall back to the matching TPY_* environment variable or
+    .env entry, resolved when the session is created.
+    """
+    # Applied in reverse so --help lists them top to bottom
+    func = click.option(
+        "--keep-alive/--no-keep-alive", default=None,
+        help="Reuse connections between requests [env: TPY_KEEP_ALIVE; default: on]",
+    )(func)
+    func = click.option(
+        "--gzip/--no-gzip", default=None,
+        help="Ask for compressed responses [env: TPY_GZIP; default: on]",
+    )(func)
+    func = click.option(
+        "--read-timeout", type=click.FloatRange(min=0), default=None,
+        help="Seconds to wait for response data [env: TPY_READ_TIMEOUT; default: 60]",
+    )(func)
+    func = click.option(
+        "--connect-timeout", type=click.FloatRange(min=0), default=None,
+        help="Seconds to wait for a connection [env: TPY_CONNECT_TIMEOUT; default: 10]",
+    )(func)
+    func = click.option(
+        "--pool-size", type=click.IntRange(min=1), default=None,
+        help="Connections kept open to the server [env: TPY_POOL_SIZE; default: 16]",
+    )(func)
+    return func
+
 def env_file_option() -> Callable[[F], F]:
     """Decorator to add --env-file option to a command."""
     return click.option(
@@ -0,0 +1,203 @@
+"""Machine-readable output formats and transfer progress for tpy-cli."""
+
+import csv
+import io
+import json
+import sys
+import time
+from typing import Any, BinaryIO, Callable, Dict, Optional, Sequence
+
+import click
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# "text" is the styled output meant for people; the rest stream one
+# unstyled record per note
+FORMATS = ("text", "plain", "ndjson", "json", "csv")
+
+
+def _dumps_json(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+dumps: Callable[[Dict[str, Any]], bytes] = orjson.dumps if orjson else _dumps_json
+
+
+class RecordWriter:
+    """Write records to a binary stream as they are produced.
+
+    Nothing is kept after a record is written, so memory use does not
+    grow with the number of records. Use as a context manager so the
+    closing bracket of a JSON array is always written.
+    """
+
+    def __init__(self, fields: Sequence[str], stream: Optional[BinaryIO] = None) -> None:
+        self.fields = list(fields)
+        self.stream = stream if stream is not None else sys.stdout.buffer
+        self.count = 0
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class NdjsonWriter(RecordWriter):
+    """One JSON object per line."""
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.stream.write(dumps(record) + b"\n")
+        self.count += 1
+
+
+class JsonWriter(RecordWriter):
+    """A single JSON array, written element by element."""
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.stream.write((b",\n" if self.count else b"[\n") + dumps(record))
+        self.count += 1
+
+    def close(self) -> None:
+        self.stream.write(b"\n]\n" if self.count else b"[]\n")
+        super().close()
+
+
+class CsvWriter(RecordWriter):
+    """CSV with a header row, limited to the writer's fields."""
+
+    def __init__(self, fields: Sequence[str], stream: Optional[BinaryIO] = None) -> None:
+        super().__init__(fields, stream)
+        self._text = io.TextIOWrapper(
+            self.stream, encoding="utf-8", newline="", write_through=True
+        )
+        self._csv = csv.DictWriter(self._text, self.fields, extrasaction="ignore")
+        self._csv.writeheader()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._csv.writerow(record)
+        self.count += 1
+
+    def close(self) -> None:
+        # Hand the stream back instead of closing it with the wrapper
+        self._text.flush()
+        self._text.detach()
+        super().close()
+
+
+class PlainWriter(RecordWriter):
+    """Tab-separated fields, no header and no styling."""
+
+    def write(self, record: Dict[str, Any]) -> None:
+        values = (
+            str(record.get(field, "")).replace("\t", " ").replace("\n", " ")
+            for field in self.fields
+        )
+        self.stream.write(("\t".join(values) + "\n").encode("utf-8"))
+        self.count += 1
+
+
+WRITERS = {
+    "plain": PlainWriter,
+    "ndjson": NdjsonWriter,
+    "json": JsonWriter,
+    "csv": CsvWriter,
+}
+
+
+def open_writer(
+    output_format: str, fields: Sequence[str], stream: Optional[BinaryIO] = None
+) -> RecordWriter:
+    """Create a record writer for one of the machine-readable FORMATS.
+
+    Args:
+        output_format: Any of FORMATS except "text"
+        fields: Columns written by the csv and plain formats; json and
+            ndjson write every key of each record
+        stream: Binary stream to write to (default: stdout)
+
+    Returns:
+        RecordWriter: Writer to use as a context manager
+    """
+    return WRITERS[output_format](fields, stream)
+
+
+def format_size(size: float) -> str:
+    """A byte count for people, e.g. 1.5 MiB."""
+    value = float(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024 or unit == "GiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{size} B"
+
+
+class TransferProgress:
+    """Progress and throughput on stderr for a streamed upload or download.
+
+    Pass as the on_progress handler of the transfer functions. With a
+    known size this is a progress bar; otherwise a line with the bytes
+    so far is redrawn in place, if stderr is a terminal. Nothing is
+    shown when disabled.
+    """
+
+    # Seconds between redraws of the line for transfers of unknown size
+    REDRAW_INTERVAL = 0.25
+
+    def __init__(self, label: str, enabled: bool = True) -> None:
+        self.label = label
+        self.enabled = enabled
+        self._bar: Any = None
+        self._start: Optional[float] = None
+        self._first = 0
+        self._drawn = 0.0
+
+    def __enter__(self) -> "TransferProgress":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._bar is not None:
+            self._bar.__exit__(*exc_info)
+        elif self._drawn:
+            click.echo(err=True)
+
+    def rate(self, done: int) -> str:
+        """Throughput since the first update, e.g. 12.5 MiB/s."""
+        elapsed = time.monotonic() - (self._start or time.monotonic())
+        if elapsed <= 0:
+            return ""
+        return f"{format_size((done - self._first) / elapsed)}/s"
+
+    def __call__(self, done: int, total: Optional[int]) -> None:
+        if not self.enabled:
+            return
+        if self._start is None:
+            # A resumed transfer starts part way through
+            self._start = time.monotonic()
+            self._first = done
+        if not total:
+            now = time.monotonic()
+            stderr = sys.stderr
+            if stderr.isatty() and now - self._drawn >= self.REDRAW_INTERVAL:
+                click.echo(f"\r{self.label} {format_size(done)}  {self.rate(done)}\033[K", nl=False, err=True)
+                self._drawn = now
+            return
+        if self._bar is None:
+            self._bar = click.progressbar(
+                length=total,
+                label=f"{self.label} {format_size(total)}",
+                file=sys.stderr,
+                item_show_func=lambda rate: rate,
+                # Redraw about every half percent, not on every block
+                update_min_steps=max(1, total // 200),
+            ).__enter__()
+        self._bar.update(done - self._bar.pos, self.rate(done))
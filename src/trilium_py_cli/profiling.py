@@ -0,0 +1,253 @@
+"""Per-request profiling for tpy --profile.
+
+While a Profiler is ACTIVE, the shared HTTP session and the async client
+record every ETAPI request: endpoint, start and duration, status, bytes
+sent and received, and which attempt it was. At exit the profiler prints
+a summary per endpoint and can write a Chrome trace (chrome://tracing or
+https://ui.perfetto.dev) with one lane per concurrent request.
+
+Only the standard library is imported here, since the session module
+imports this one.
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, TextIO, Tuple
+
+# The profiler recording this invocation, if --profile was given
+ACTIVE: Optional["Profiler"] = None
+
+# Attempt number of the request being made: 0 for the first try, then
+# 1, 2, ... for retries; set by the retry helpers in throttle
+ATTEMPT: contextvars.ContextVar[int] = contextvars.ContextVar("tpy_attempt", default=0)
+
+# Path segments followed by an ID, which endpoint() replaces with {id}
+ID_COLLECTIONS = frozenset({"notes", "branches", "attributes", "attachments", "revisions"})
+
+PERCENTILES = (50, 95, 99)
+
+
+class RequestRecord:
+    """One ETAPI request as seen by the client."""
+
+    __slots__ = (
+        "method", "endpoint", "url", "status", "start", "duration",
+        "bytes_out", "bytes_in", "attempt", "error", "thread",
+    )
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        start: float,
+        duration: float,
+        status: Optional[int],
+        bytes_out: int = 0,
+        bytes_in: int = 0,
+        error: Optional[str] = None,
+    ) -> None:
+        self.method = method.upper()
+        self.endpoint = endpoint(url)
+        self.url = url
+        self.status = status
+        self.start = start
+        self.duration = duration
+        self.bytes_out = bytes_out
+        self.bytes_in = bytes_in
+        self.attempt = ATTEMPT.get()
+        self.error = error
+        self.thread = threading.get_ident()
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None or self.status is None or self.status >= 400
+
+
+def endpoint(url: str) -> str:
+    """ETAPI endpoint of a URL with IDs replaced, e.g. notes/{id}/content."""
+    path = re.sub(r"^[a-z]+://[^/]+", "", url).split("?")[0]
+    path = path.split("/etapi/", 1)[-1].strip("/")
+    segments = path.split("/")
+    for i in range(1, len(segments)):
+        if segments[i - 1] in ID_COLLECTIONS:
+            segments[i] = "{id}"
+    return "/".join(segments)
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def busy_time(intervals: List[Tuple[float, float]]) -> float:
+    """Total length of the union of (start, end) intervals."""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class Profiler:
+    """Collects RequestRecords for one invocation.
+
+    Records are appended from the event loop and from worker threads;
+    list.append is atomic, so no lock is needed.
+    """
+
+    def __init__(self, command: str = "tpy") -> None:
+        self.command = command
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.records: List[RequestRecord] = []
+
+    def record(self, *args: Any, **kwargs: Any) -> RequestRecord:
+        """Add a request; takes RequestRecord's arguments."""
+        record = RequestRecord(*args, **kwargs)
+        self.records.append(record)
+        return record
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def network_time(self) -> float:
+        """Wall time with at least one request in flight."""
+        return busy_time([(r.start, r.start + r.duration) for r in self.records])
+
+    def summary(self) -> Dict[str, Any]:
+        """Request counts and timings, overall and per endpoint.
+
+        Returns:
+            dict: ``total_s``, ``network_s``, ``other_s``, ``requests`` and
+            ``endpoints``, a list of per-endpoint dicts with count, errors,
+            retries, p50/p95/p99/max latency in ms and bytes in and out
+        """
+        groups: Dict[str, List[RequestRecord]] = {}
+        for record in self.records:
+            groups.setdefault(f"{record.method} {record.endpoint}", []).append(record)
+
+        endpoints = []
+        for name, records in groups.items():
+            durations = sorted(r.duration * 1000 for r in records)
+            stats: Dict[str, Any] = {
+                "endpoint": name,
+                "count": len(records),
+                "errors": sum(r.failed for r in records),
+                "retries": sum(r.attempt > 0 for r in records),
+                "bytes_in": sum(r.bytes_in for r in records),
+                "bytes_out": sum(r.bytes_out for r in records),
+                "total_ms": round(sum(durations), 1),
+            }
+            for pct in PERCENTILES:
+                stats[f"p{pct}_ms"] = round(percentile(durations, pct), 1)
+            stats["max_ms"] = round(durations[-1], 1)
+            endpoints.append(stats)
+        endpoints.sort(key=lambda stats: stats["total_ms"], reverse=True)
+
+        network = self.network_time()
+        return {
+            "command": self.command,
+            "total_s": round(self.total, 3),
+            "network_s": round(network, 3),
+            "other_s": round(max(0.0, self.total - network), 3),
+            "requests": len(self.records),
+            "endpoints": endpoints,
+        }
+
+    def print_summary(self, file: TextIO) -> None:
+        """Write a summary table for people to file."""
+        summary = self.summary()
+        file.write(
+            f"\nProfile: {summary['requests']} requests in {summary['total_s']:.2f} s "
+            f"(network {summary['network_s']:.2f} s, "
+            f"other {summary['other_s']:.2f} s: rendering and local work)\n"
+        )
+        if not summary["endpoints"]:
+            return
+        width = max(len("endpoint"), *(len(s["endpoint"]) for s in summary["endpoints"]))
+        file.write(
+            f"{'endpoint':<{width}}  {'count':>6} {'errors':>6} {'retries':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'KiB in':>9} {'KiB out':>9}\n"
+        )
+        for s in summary["endpoints"]:
+            file.write(
+                f"{s['endpoint']:<{width}}  {s['count']:>6} {s['errors']:>6} {s['retries']:>7} "
+                f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f} "
+                f"{s['bytes_in'] / 1024:>9.1f} {s['bytes_out'] / 1024:>9.1f}\n"
+            )
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """The run as a Chrome trace event file.
+
+        The whole command is one event on the first lane. Requests go on
+        the following lanes, each on the first lane that is free at its
+        start, so the number of lanes in use shows the concurrency.
+        """
+        pid = os.getpid()
+
+        def us(seconds: float) -> float:
+            return round((seconds - self.started) * 1e6, 1)
+
+        events: List[Dict[str, Any]] = [
+            {"ph": "M", "name": "process_name", "pid": pid, "args": {"name": self.command}},
+            {
+                "name": self.command, "cat": "command", "ph": "X", "pid": pid, "tid": 0,
+                "ts": 0, "dur": round(self.total * 1e6, 1),
+            },
+        ]
+        lane_ends: List[float] = []
+        for record in sorted(self.records, key=lambda r: r.start):
+            end = record.start + record.duration
+            for lane, lane_end in enumerate(lane_ends):
+                if lane_end <= record.start:
+                    lane_ends[lane] = end
+                    break
+            else:
+                lane = len(lane_ends)
+                lane_ends.append(end)
+            args: Dict[str, Any] = {
+                "url": record.url,
+                "status": record.status,
+                "bytes_in": record.bytes_in,
+                "bytes_out": record.bytes_out,
+                "attempt": record.attempt,
+            }
+            if record.error:
+                args["error"] = record.error
+            events.append({
+                "name": f"{record.method} {record.endpoint}",
+                "cat": "http",
+                "ph": "X",
+                "pid": pid,
+                "tid": lane + 1,
+                "ts": us(record.start),
+                "dur": round(record.duration * 1e6, 1),
+                "args": args,
+            })
+        for lane in range(len(lane_ends) + 1):
+            name = "command" if lane == 0 else f"request slot {lane}"
+            events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": lane, "args": {"name": name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
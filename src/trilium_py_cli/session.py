@@ -0,0 +1,144 @@
+"""Shared HTTP session for all ETAPI calls."""
+
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+import trilium_py.client as trilium_client
+from trilium_py.client import ETAPI
+
+from . import profiling
+
+# Defaults for the TPY_* settings below
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "pool_size": 16,
+    "connect_timeout": 10.0,
+    "read_timeout": 60.0,
+    "gzip": True,
+    "keep_alive": True,
+}
+
+# Environment variable (or .env entry) for each setting
+SETTINGS_ENV = {
+    "pool_size": "TPY_POOL_SIZE",
+    "connect_timeout": "TPY_CONNECT_TIMEOUT",
+    "read_timeout": "TPY_READ_TIMEOUT",
+    "gzip": "TPY_GZIP",
+    "keep_alive": "TPY_KEEP_ALIVE",
+}
+
+
+def _parse(value: str, default: Any) -> Any:
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
+
+
+def resolve_settings(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Combine command line overrides, TPY_* variables and defaults.
+
+    Args:
+        overrides: Values from the command line; None means not given
+
+    Returns:
+        dict: A value for every key of DEFAULT_SETTINGS
+    """
+    overrides = overrides or {}
+    settings = {}
+    for key, default in DEFAULT_SETTINGS.items():
+        value = overrides.get(key)
+        if value is None:
+            env_value = os.getenv(SETTINGS_ENV[key])
+            value = _parse(env_value, default) if env_value else default
+        settings[key] = value
+    return settings
+
+
+class TriliumSession(requests.Session):
+    """requests session with a connection pool and default timeouts."""
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_SETTINGS["pool_size"],
+        connect_timeout: float = DEFAULT_SETTINGS["connect_timeout"],
+        read_timeout: float = DEFAULT_SETTINGS["read_timeout"],
+        gzip: bool = DEFAULT_SETTINGS["gzip"],
+        keep_alive: bool = DEFAULT_SETTINGS["keep_alive"],
+    ) -> None:
+        super().__init__()
+        self.settings = {
+            "pool_size": pool_size,
+            "connect_timeout": connect_timeout,
+            "read_timeout": read_timeout,
+            "gzip": gzip,
+            "keep_alive": keep_alive,
+        }
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+        self.headers["Accept-Encoding"] = "gzip, deflate" if gzip else "identity"
+        if not keep_alive:
+            self.headers["Connection"] = "close"
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        profiler = profiling.ACTIVE
+        if profiler is None:
+            return super().request(method, url, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except Exception as e:
+            profiler.record(method, url, start, time.perf_counter() - start, None, error=repr(e))
+            raise
+        # Also right for bodies streamed from a file
+        bytes_out = int(response.request.headers.get("Content-Length") or 0)
+        if not kwargs.get("stream"):
+            profiler.record(
+                method, url, start, time.perf_counter() - start, response.status_code,
+                bytes_out, len(response.content),
+            )
+            return response
+
+        # A streamed body is read after this returns: record it on close
+        close = response.close
+
+        def close_and_record() -> None:
+            profiler.record(
+                method, url, start, time.perf_counter() - start, response.status_code,
+                bytes_out, response.raw.tell() if response.raw is not None else 0,
+            )
+            response.close = close  # type: ignore[method-assign]
+            close()
+
+        response.close = close_and_record  # type: ignore[method-assign]
+        return response
+
+
+class SessionETAPI(ETAPI):
+    """ETAPI client whose requests go through a shared TriliumSession."""
+
+    def __init__(self, server_url: str, token: Optional[str], session: TriliumSession) -> None:
+        super().__init__(server_url, token)
+        self.session = session
+
+
+def install_session(session: TriliumSession) -> None:
+    """Route every trilium-py request through session.
+
+    trilium-py calls requests.get/post/put/patch/delete at module level
+    instead of using a session, so the module's reference to requests is
+    swapped for the session, which has the same methods.
+    """
+    trilium_client.requests = session  # type: ignore[assignment]
+
+
+def http(ea: ETAPI) -> Any:
+    """The session behind an ETAPI client, or plain requests without one."""
+    return getattr(ea, "session", requests)
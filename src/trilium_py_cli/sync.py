@@ -0,0 +1,452 @@
+"""Two-way sync between a directory and a note subtree."""
+
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from trilium_py.client import ETAPI
+
+from .async_client import AsyncETAPI, run_async
+from .exporter import NO_CONTENT_TYPES, content_extension, plan_layout, remove_empty_dirs
+from .session import http
+from .throttle import call_with_retry
+from .transfer import CHUNK_SIZE, content_path, note_type_for_mime, raise_for_status, upload_content
+from .tree import NoteTree
+from .utils import check_response, guess_mime
+
+# State file, written inside the synced directory
+STATE_NAME = ".tpy-sync.json"
+
+# Kinds of SyncAction that change notes on the server
+REMOTE_CHANGES = frozenset({"push", "create", "mkdir", "delete-remote"})
+
+DoneHandler = Callable[["SyncAction", Optional[Exception]], None]
+
+
+class SyncAction:
+    """One step of a sync.
+
+    ``kind`` is one of pull, push, create, mkdir, move, delete-local,
+    delete-remote or conflict. ``relpath`` is the file (or, for mkdir,
+    directory) it concerns and ``note_id`` the note, if there is one yet.
+    New notes go under ``parent_id``, or if that is None under the note
+    of the directory created by an earlier mkdir. ``reason`` says why,
+    for conflicts.
+    """
+
+    __slots__ = ("kind", "relpath", "note_id", "mime", "old_relpath", "parent_id", "reason")
+
+    def __init__(
+        self,
+        kind: str,
+        relpath: str,
+        note_id: Optional[str] = None,
+        mime: Optional[str] = None,
+        old_relpath: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        reason: str = "",
+    ) -> None:
+        self.kind = kind
+        self.relpath = relpath
+        self.note_id = note_id
+        self.mime = mime
+        self.old_relpath = old_relpath
+        self.parent_id = parent_id
+        self.reason = reason
+
+
+class SyncState:
+    """What the last sync saw on both sides, per note ID.
+
+    Each entry has the file's ``path``, the note's ``blobId`` and
+    ``utcDateModified``, and the file's ``sha256``, ``size`` and
+    ``mtime`` (in ns); size and mtime let unchanged files skip hashing.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def load(self, root: str) -> bool:
+        """Read the state file.
+
+        Returns:
+            bool: False if it was written for a different root, in which
+            case nothing is loaded
+        """
+        if not self.path.exists():
+            return True
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("root") != root:
+            return False
+        self.entries = data.get("notes", {})
+        return True
+
+    def save(self, root: str) -> None:
+        """Write the state file atomically."""
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"root": root, "notes": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def record(self, note_id: str, relpath: str, file: Path, note: Dict[str, Any]) -> None:
+        """Remember a file and note that are now in step."""
+        stat = file.stat()
+        self.entries[note_id] = {
+            "path": relpath,
+            "blobId": note.get("blobId"),
+            "utcDateModified": note.get("utcDateModified"),
+            "sha256": file_digest(file),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+        }
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def local_changed(file: Path, entry: Dict[str, Any]) -> bool:
+    """Whether a file differs from what the last sync left there."""
+    stat = file.stat()
+    if stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime"):
+        return False
+    return file_digest(file) != entry.get("sha256")
+
+
+def remote_changed(tree: NoteTree, i: int, entry: Dict[str, Any]) -> bool:
+    """Whether a note's content changed since the last sync."""
+    if tree.blob_ids[i]:
+        return tree.blob_ids[i] != entry.get("blobId")
+    return tree.modified[i] != entry.get("utcDateModified")
+
+
+def scan_files(directory: Path) -> Set[str]:
+    """Relative paths of the files in a directory, leaving out hidden ones."""
+    files = set()
+    for path, dirs, names in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        base = Path(path).relative_to(directory).as_posix()
+        for name in names:
+            if not name.startswith("."):
+                files.add(name if base == "." else f"{base}/{name}")
+    return files
+
+
+def file_title(relpath: str, mime: Optional[str]) -> str:
+    """Title for a note made from a file: its name, without the extension
+    if a pull would add it back."""
+    path = Path(relpath)
+    if content_extension(note_type_for_mime(mime), mime) == path.suffix.lower():
+        return path.stem
+    return path.name
+
+
+def plan_sync(
+    tree: NoteTree,
+    root: str,
+    directory: Path,
+    state: SyncState,
+    delete: bool = False,
+) -> Tuple[List[SyncAction], int]:
+    """Work out what a sync has to do, without changing anything.
+
+    The root note's children are laid out at the top of the directory as
+    notes export does. Each note is compared with the state file: a note
+    whose blobId changed is pulled, a file whose content hash changed is
+    pushed, and if both changed it is a conflict that is left alone.
+    Files moved or renamed on the server are moved locally. Files with
+    no note are created as notes, with book notes for new directories.
+
+    Notes deleted on the server have their files removed unless the file
+    changed, which is a conflict. Files deleted locally only delete their
+    note with ``delete``, and only if the note has no children, since the
+    server deletes a note's whole subtree; otherwise they are reported as
+    conflicts.
+
+    Args:
+        tree: The subtree as it is on the server
+        root: Note ID of the subtree's root
+        directory: Synced directory
+        state: State of the last sync
+        delete: Delete notes whose files were deleted
+
+    Returns:
+        tuple: (actions, number of notes already in step); parents are
+        created before their children
+    """
+    stems = plan_layout(tree, root, root_stem="")
+    dirs = {stem: tree.ids[i] for i, stem in stems.items()}
+    files = scan_files(directory)
+    files.discard(STATE_NAME)
+    actions: List[SyncAction] = []
+    unchanged = 0
+    remote: Set[str] = set()
+    claimed: Set[str] = set()
+
+    for i, stem in stems.items():
+        note_id = tree.ids[i]
+        if note_id == root or tree.types[i] in NO_CONTENT_TYPES:
+            continue
+        remote.add(note_id)
+        relpath = stem + content_extension(tree.types[i], tree.mimes[i])
+        claimed.add(relpath)
+        entry = state.entries.get(note_id)
+        if entry is None:
+            if relpath in files:
+                actions.append(SyncAction(
+                    "conflict", relpath, note_id,
+                    reason="file exists but was never synced with its note",
+                ))
+            else:
+                actions.append(SyncAction("pull", relpath, note_id))
+            continue
+
+        old_relpath = entry["path"]
+        claimed.add(old_relpath)
+        if old_relpath not in files:
+            if not delete:
+                actions.append(SyncAction(
+                    "conflict", old_relpath, note_id,
+                    reason="file deleted; use --delete to delete the note",
+                ))
+            elif remote_changed(tree, i, entry):
+                actions.append(SyncAction(
+                    "conflict", old_relpath, note_id,
+                    reason="file deleted but the note changed",
+                ))
+            elif tree.children(i):
+                # Deleting the note would delete its whole subtree
+                actions.append(SyncAction(
+                    "conflict", old_relpath, note_id,
+                    reason="file deleted but the note has children; delete it in Trilium",
+                ))
+            else:
+                actions.append(SyncAction("delete-remote", old_relpath, note_id))
+            continue
+
+        changed_here = local_changed(directory / old_relpath, entry)
+        changed_there = remote_changed(tree, i, entry)
+        if old_relpath != relpath:
+            if relpath in files:
+                actions.append(SyncAction(
+                    "conflict", old_relpath, note_id,
+                    reason=f"note moved to {relpath}, which already exists",
+                ))
+                continue
+            actions.append(SyncAction("move", relpath, note_id, old_relpath=old_relpath))
+        if changed_here and changed_there:
+            actions.append(SyncAction(
+                "conflict", relpath, note_id, reason="changed both here and on the server",
+            ))
+        elif changed_there:
+            actions.append(SyncAction("pull", relpath, note_id))
+        elif changed_here:
+            actions.append(SyncAction("push", relpath, note_id, mime=tree.mimes[i]))
+        elif old_relpath == relpath:
+            unchanged += 1
+
+    # Notes that left the subtree
+    for note_id, entry in state.entries.items():
+        if note_id in remote:
+            continue
+        relpath = entry["path"]
+        claimed.add(relpath)
+        if relpath not in files:
+            actions.append(SyncAction("delete-local", relpath, note_id))
+        elif local_changed(directory / relpath, entry):
+            actions.append(SyncAction(
+                "conflict", relpath, note_id, reason="note deleted on the server but file changed",
+            ))
+        else:
+            actions.append(SyncAction("delete-local", relpath, note_id))
+
+    # Files with no note yet, parents first
+    new_dirs: Set[str] = set()
+    for relpath in sorted(files - claimed, key=lambda p: (p.count("/"), p.lower())):
+        parent = relpath.rpartition("/")[0]
+        missing = []
+        while parent not in dirs and parent not in new_dirs:
+            missing.append(parent)
+            parent = parent.rpartition("/")[0]
+        for new_dir in reversed(missing):
+            new_dirs.add(new_dir)
+            actions.append(SyncAction("mkdir", new_dir, parent_id=dirs.get(new_dir.rpartition("/")[0])))
+        actions.append(SyncAction(
+            "create", relpath,
+            mime=guess_mime(Path(relpath)) or "text/plain",
+            parent_id=dirs.get(relpath.rpartition("/")[0]),
+        ))
+
+    return actions, unchanged
+
+
+PulledHandler = Callable[[SyncAction, Optional[Dict[str, Any]], Optional[Exception]], None]
+
+
+async def _pull_all(
+    aea: AsyncETAPI, pulls: List[SyncAction], directory: Path, on_pulled: PulledHandler
+) -> None:
+    async def pull(
+        action: SyncAction,
+    ) -> Tuple[SyncAction, Optional[Dict[str, Any]], Optional[Exception]]:
+        try:
+            # Metadata after the download, so a change made meanwhile is
+            # pulled again next time rather than lost
+            await aea.download_note_content(action.note_id, directory / action.relpath)
+            return action, await aea.get_note(action.note_id), None
+        except Exception as e:
+            return action, None, e
+
+    for next_done in asyncio.as_completed([pull(action) for action in pulls]):
+        on_pulled(*await next_done)
+
+
+def delete_note(ea: ETAPI, note_id: str, retries: int = 3) -> None:
+    """Delete a note; one that is already gone counts as deleted.
+
+    Raises:
+        EtapiError: If the server returns any other error
+    """
+    def send() -> None:
+        response = http(ea).delete(f"{ea.server_url}/etapi/notes/{note_id}", headers=ea.get_header())
+        if response.status_code != 404:
+            raise_for_status(response)
+
+    call_with_retry(send, retries=retries)
+
+
+def run_sync(
+    ea: ETAPI,
+    actions: List[SyncAction],
+    root: str,
+    directory: Path,
+    state: SyncState,
+    concurrency: int = 8,
+    retries: int = 3,
+    on_done: Optional[DoneHandler] = None,
+) -> Dict[str, int]:
+    """Carry out the actions from plan_sync, updating the state.
+
+    Pulls run concurrently; pushes and creations stream one file at a
+    time. Each action that succeeds is recorded in the state right away,
+    so a failed or interrupted sync can simply be run again.
+
+    Args:
+        ea: ETAPI client
+        actions: Actions from plan_sync
+        root: Note ID of the subtree's root
+        directory: Synced directory
+        state: State of the last sync, updated in place
+        concurrency: Maximum number of downloads in flight
+        retries: Retries for transient failures
+        on_done: Called with each action and the error if it failed
+
+    Returns:
+        dict: Count of actions done per kind, plus failed
+    """
+    counts: Dict[str, int] = {"failed": 0}
+    # Notes made for new directories, by relative path
+    dir_notes: Dict[str, str] = {}
+
+    def done(action: SyncAction, error: Optional[Exception]) -> None:
+        if error is None:
+            counts[action.kind] = counts.get(action.kind, 0) + 1
+        else:
+            counts["failed"] += 1
+        if on_done:
+            on_done(action, error)
+
+    def note(note_id: str) -> Dict[str, Any]:
+        return check_response(ea.get_note(note_id), "noteId")
+
+    pulls = []
+    # Old paths of files moved or deleted, whose directories may be empty now
+    vacated: List[str] = []
+    for action in actions:
+        if action.kind == "conflict":
+            done(action, None)
+            continue
+        try:
+            if action.kind == "pull":
+                pulls.append(action)
+                continue
+            if action.kind == "move":
+                dest = directory / action.relpath
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(directory / action.old_relpath, dest)
+                vacated.append(action.old_relpath)
+                state.entries[action.note_id]["path"] = action.relpath
+            elif action.kind == "push":
+                upload_content(ea, content_path(action.note_id), directory / action.relpath,
+                               action.mime, retries=retries)
+                state.record(action.note_id, action.relpath, directory / action.relpath,
+                             note(action.note_id))
+            elif action.kind == "delete-local":
+                file = directory / action.relpath
+                if file.exists():
+                    file.unlink()
+                vacated.append(action.relpath)
+                state.entries.pop(action.note_id, None)
+            elif action.kind == "delete-remote":
+                delete_note(ea, action.note_id, retries)
+                state.entries.pop(action.note_id, None)
+            elif action.kind in ("mkdir", "create"):
+                parent, _, name = action.relpath.rpartition("/")
+                parent_id = action.parent_id or dir_notes.get(parent)
+                if parent_id is None:
+                    raise ValueError(f"the note for {parent} could not be created")
+                action.parent_id = parent_id
+                if action.kind == "mkdir":
+                    created = check_response(ea.create_note(
+                        parentNoteId=parent_id, title=name, type="book", content="",
+                    ), "note")["note"]
+                    action.note_id = dir_notes[action.relpath] = created["noteId"]
+                else:
+                    created = check_response(ea.create_note(
+                        parentNoteId=parent_id,
+                        title=file_title(action.relpath, action.mime),
+                        type=note_type_for_mime(action.mime),
+                        mime=action.mime,
+                        content="",
+                    ), "note")["note"]
+                    file = directory / action.relpath
+                    try:
+                        upload_content(ea, content_path(created["noteId"]), file, action.mime,
+                                       retries=retries)
+                        state.record(created["noteId"], action.relpath, file,
+                                     note(created["noteId"]))
+                    except Exception:
+                        # Left behind, the empty note would be a conflict with
+                        # its file from then on; the next run creates it again
+                        delete_note(ea, created["noteId"], retries)
+                        raise
+                    action.note_id = created["noteId"]
+            done(action, None)
+        except Exception as e:
+            done(action, e)
+
+    def pulled(
+        action: SyncAction, pulled_note: Optional[Dict[str, Any]], error: Optional[Exception]
+    ) -> None:
+        if pulled_note is not None:
+            state.record(action.note_id, action.relpath, directory / action.relpath, pulled_note)
+        done(action, error)
+
+    if pulls:
+        run_async(
+            ea, concurrency,
+            lambda aea: _pull_all(aea, pulls, directory, pulled),
+            retries=retries,
+        )
+    remove_empty_dirs(directory, vacated)
+    return counts
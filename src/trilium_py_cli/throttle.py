@@ -0,0 +1,339 @@
+"""Rate limiting and retries for bulk ETAPI operations."""
+
+import asyncio
+import collections
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+import requests
+
+from . import profiling
+from .utils import EtapiError
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: rate limited or a server-side failure
+TRANSIENT_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# Successful requests AdaptiveController sees before reacting to latency
+LATENCY_SAMPLES = 20
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls evenly at ``rate`` per second.
+
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Claim the next slot.
+
+        Returns:
+            float: Seconds to wait before making the call
+        """
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        return max(0.0, wait)
+
+    def acquire(self) -> None:
+        """Block until the next call is allowed."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """Wait, without blocking the event loop, until the next call is allowed."""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed request is worth retrying."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return True
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, EtapiError):
+        return error.status in TRANSIENT_STATUSES
+    return False
+
+
+def call_with_retry(
+    func: Callable[[], T],
+    retries: int = 3,
+    backoff: float = 0.5,
+    max_backoff: float = 30.0,
+    limiter: Optional[RateLimiter] = None,
+) -> T:
+    """Call func, retrying transient failures with exponential backoff.
+
+    Args:
+        func: Function making one request
+        retries: Number of retries after the first attempt
+        backoff: Delay before the first retry, doubled for each retry
+        max_backoff: Upper bound for a single delay
+        limiter: Rate limiter consulted before every attempt
+
+    Returns:
+        Whatever func returns
+
+    Raises:
+        Exception: The last error, once retries are exhausted or the error
+        is not transient
+    """
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.acquire()
+        token = profiling.ATTEMPT.set(attempt)
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= retries or not is_transient(e):
+                raise
+            time.sleep(retry_delay(attempt, backoff, max_backoff))
+            attempt += 1
+        finally:
+            profiling.ATTEMPT.reset(token)
+
+
+async def call_with_retry_async(
+    func: Callable[[], Awaitable[T]],
+    retries: int = 3,
+    backoff: float = 0.5,
+    max_backoff: float = 30.0,
+    limiter: Optional[RateLimiter] = None,
+) -> T:
+    """Async counterpart of call_with_retry; func returns a coroutine."""
+    attempt = 0
+    while True:
+        if limiter:
+            await limiter.acquire_async()
+        token = profiling.ATTEMPT.set(attempt)
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= retries or not is_transient(e):
+                raise
+            await asyncio.sleep(retry_delay(attempt, backoff, max_backoff))
+            attempt += 1
+        finally:
+            profiling.ATTEMPT.reset(token)
+
+
+async def create_once_async(
+    create: Callable[[], Awaitable[T]],
+    find: Callable[[], Awaitable[Optional[T]]],
+    retries: int = 3,
+    backoff: float = 0.5,
+    max_backoff: float = 30.0,
+    limiter: Optional[RateLimiter] = None,
+) -> T:
+    """Create something under an ID the client chose, retrying safely.
+
+    A create that failed, e.g. with a timeout or a dropped connection,
+    may still have happened, and sending it again would make a second
+    copy. So after every failure find looks the ID up first: if the
+    create did happen, that is the result. Otherwise transient failures
+    are retried as in call_with_retry_async.
+
+    Args:
+        create: Function returning a coroutine that creates it
+        find: Function returning a coroutine that fetches it by its ID,
+            or returns None if there is none
+        retries: Number of retries after the first attempt
+        backoff: Delay before the first retry, doubled for each retry
+        max_backoff: Upper bound for a single delay
+        limiter: Rate limiter consulted before every attempt
+
+    Returns:
+        Whatever create, or find, returns
+
+    Raises:
+        Exception: The last error, once retries are exhausted or the error
+        is not transient
+    """
+    attempt = 0
+    while True:
+        if limiter:
+            await limiter.acquire_async()
+        token = profiling.ATTEMPT.set(attempt)
+        try:
+            return await create()
+        except Exception as e:
+            error = e
+        finally:
+            profiling.ATTEMPT.reset(token)
+        found = await find()
+        if found is not None:
+            return found
+        if attempt >= retries or not is_transient(error):
+            raise error
+        await asyncio.sleep(retry_delay(attempt, backoff, max_backoff))
+        attempt += 1
+
+
+def retry_delay(attempt: int, backoff: float, max_backoff: float) -> float:
+    """Delay before retry number attempt (counting from 0)."""
+    delay = min(max_backoff, backoff * (2 ** attempt))
+    # Full jitter keeps parallel workers from retrying in lockstep
+    return random.uniform(0, delay)
+
+
+class AdaptiveController:
+    """Concurrency limit and retry policy shared by fan-out requests.
+
+    The number of requests allowed in flight adapts AIMD-style, between
+    ``min_limit`` and ``max_limit``: it grows by one for every ``limit``
+    requests that succeed quickly, and is cut by ``decrease`` when a
+    request fails with a transient error (rate limited, server error,
+    timeout) or when the smoothed latency climbs past ``latency_factor``
+    times the best seen so far. Cuts happen at most once per smoothed
+    latency, so a burst of failures from one overload counts once.
+
+    Transient failures are retried with exponential backoff and full
+    jitter, like call_with_retry. Retries wait without holding a slot.
+
+    All requests of an AsyncETAPI go through its controller, which must
+    only be used from one event loop.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        decrease: float = 0.5,
+        latency_factor: float = 3.0,
+        adaptive: bool = True,
+    ) -> None:
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.best_latency: Optional[float] = None
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "decreases": 0}
+        self.lowest_limit = self.max_limit
+        self._last_decrease = 0.0
+        self._samples = 0
+        self._waiters: Deque["asyncio.Future[None]"] = collections.deque()
+
+    async def run(self, func: Callable[[], Awaitable[T]], retry: bool = True) -> T:
+        """Run func in a slot, retrying transient failures if retry is set.
+
+        Args:
+            func: Function returning a coroutine that makes one request
+            retry: Whether retrying is safe; False for requests that are
+                not idempotent, such as creating a note
+
+        Returns:
+            Whatever func's coroutine returns
+
+        Raises:
+            Exception: The last error, once retries are exhausted or the
+            error is not transient
+        """
+        attempt = 0
+        while True:
+            await self._acquire()
+            # Without retries here, keep the attempt number of a caller
+            # that retries, such as call_with_retry_async
+            token = profiling.ATTEMPT.set(attempt) if retry else None
+            start = time.monotonic()
+            congested = False
+            try:
+                result = await func()
+            except Exception as e:
+                congested = is_transient(e)
+                if not retry or attempt >= self.retries or not congested:
+                    if congested:
+                        self.stats["failures"] += 1
+                    raise
+            else:
+                return result
+            finally:
+                if token is not None:
+                    profiling.ATTEMPT.reset(token)
+                self.stats["requests"] += 1
+                self._release(time.monotonic() - start, congested)
+            self.stats["retries"] += 1
+            await asyncio.sleep(retry_delay(attempt, self.backoff, self.max_backoff))
+            attempt += 1
+
+    async def _acquire(self) -> None:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        # Wait in line; _release hands the slot over, so waking one task
+        # costs the same however many are queued
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self, latency: float, congested: bool) -> None:
+        if self.adaptive:
+            self._adapt(latency, congested)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _adapt(self, latency: float, congested: bool) -> None:
+        if not congested:
+            # Exponentially weighted, so one slow request does not count much
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self._samples += 1
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+            # Judge latency only once the average has settled
+            congested = (
+                self._samples >= LATENCY_SAMPLES
+                and self.latency > self.latency_factor * self.best_latency
+            )
+
+        now = time.monotonic()
+        if not congested:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        elif now - self._last_decrease >= (self.latency or 0.0):
+            self.limit = max(float(self.min_limit), self.limit * self.decrease)
+            self.lowest_limit = min(self.lowest_limit, int(self.limit))
+            self.stats["decreases"] += 1
+            self._last_decrease = now
@@ -0,0 +1,413 @@
+"""Streaming note content transfers for tpy-cli.
+
+Content is moved in CHUNK_SIZE pieces in both directions, so memory use
+stays the same however large a note or attachment is.
+"""
+
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple
+
+import requests
+from trilium_py.client import ETAPI
+
+from .session import http
+from .throttle import call_with_retry
+from .utils import EtapiError
+
+# Bytes read from the network or a file per chunk
+CHUNK_SIZE = 64 * 1024
+
+# Called with the bytes transferred so far and the total, if known
+ProgressHandler = Callable[[int, Optional[int]], None]
+
+
+def raise_for_status(response: requests.Response) -> None:
+    """Raise EtapiError for an error response, using its JSON message."""
+    if response.status_code < 400:
+        return
+    try:
+        message = response.json().get("message", response.reason)
+    except ValueError:
+        message = response.reason
+    raise EtapiError(f"{response.status_code}: {message}", status=response.status_code)
+
+
+def content_path(note_id: Optional[str] = None, attachment_id: Optional[str] = None) -> str:
+    """ETAPI path of a note's or an attachment's content."""
+    if attachment_id is not None:
+        return f"attachments/{attachment_id}/content"
+    return f"notes/{note_id}/content"
+
+
+def is_text_mime(mime: Optional[str]) -> bool:
+    """Whether ETAPI stores content of this MIME type as text."""
+    mime = mime or ""
+    return mime.startswith("text/") or mime in (
+        "application/json", "application/javascript", "application/xml", "image/svg+xml",
+    )
+
+
+def note_type_for_mime(mime: Optional[str]) -> str:
+    """Note type for file content: text for HTML, code for other text,
+    image or file for binary content."""
+    if mime == "text/html":
+        return "text"
+    if is_text_mime(mime):
+        return "code"
+    return "image" if (mime or "").startswith("image/") else "file"
+
+
+def copy_content(
+    ea: ETAPI,
+    path: str,
+    out: BinaryIO,
+    chunk_size: int = CHUNK_SIZE,
+    on_progress: Optional[ProgressHandler] = None,
+) -> int:
+    """Stream content from the server into a binary stream.
+
+    Args:
+        ea: ETAPI client
+        path: ETAPI path of the content; see content_path
+        out: Stream to write to
+        chunk_size: Bytes to read at a time
+        on_progress: Called after every chunk, and once before the first
+
+    Returns:
+        int: Number of bytes written
+
+    Raises:
+        EtapiError: If the server returns an error
+    """
+    url = f"{ea.server_url}/etapi/{path}"
+    with http(ea).get(url, headers=ea.get_header(), stream=True) as response:
+        raise_for_status(response)
+        # Unknown for gzipped or chunked responses
+        total = None
+        if "Content-Encoding" not in response.headers:
+            total = int(response.headers.get("Content-Length") or 0) or None
+        size = 0
+        if on_progress:
+            on_progress(size, total)
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            out.write(chunk)
+            size += len(chunk)
+            if on_progress:
+                on_progress(size, total)
+    return size
+
+
+def download_content(
+    ea: ETAPI,
+    path: str,
+    dest: Path,
+    chunk_size: int = CHUNK_SIZE,
+    on_progress: Optional[ProgressHandler] = None,
+) -> int:
+    """Stream content from the server into a file.
+
+    Content is written to a temporary file next to ``dest`` and moved into
+    place once complete, so an interrupted download never leaves a
+    truncated file behind.
+
+    Args:
+        ea: ETAPI client
+        path: ETAPI path of the content; see content_path
+        dest: File to write
+        chunk_size: Bytes to read at a time
+        on_progress: Called after every chunk
+
+    Returns:
+        int: Number of bytes written
+
+    Raises:
+        EtapiError: If the server returns an error
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            size = copy_content(ea, path, f, chunk_size, on_progress)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return size
+
+
+def download_note_content(
+    ea: ETAPI, note_id: str, dest: Path, chunk_size: int = CHUNK_SIZE
+) -> int:
+    """Stream a note's content into a file; see download_content."""
+    return download_content(ea, content_path(note_id), dest, chunk_size)
+
+
+def server_digest(response: requests.Response) -> Optional[str]:
+    """SHA-256 of the whole content as hex, if the server sent one.
+
+    Understands Repr-Digest (RFC 9530) and the older Digest header; both
+    carry the hash base64 encoded.
+    """
+    for header in ("Repr-Digest", "Digest"):
+        match = re.search(r"sha-256=:?([A-Za-z0-9+/=]+):?", response.headers.get(header, ""), re.IGNORECASE)
+        if match:
+            return base64.b64decode(match.group(1)).hex()
+    return None
+
+
+def _resume_validator(response: requests.Response) -> Optional[str]:
+    """What If-Range needs to resume this response, if it can be resumed.
+
+    Only a strong ETag or a Last-Modified date tells whether a partial
+    download still matches the server's content.
+    """
+    if response.headers.get("Accept-Ranges", "").lower() != "bytes":
+        return None
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def resumable_download(
+    ea: ETAPI,
+    path: str,
+    dest: Path,
+    params: Optional[Dict[str, str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    on_progress: Optional[ProgressHandler] = None,
+    verify: Optional[Callable[[Path, str], None]] = None,
+) -> Tuple[int, str]:
+    """Stream content into a file, resuming an earlier partial download.
+
+    Content goes to ``dest`` with a ``.part`` suffix, which is kept if the
+    download fails. Where the server supports ranges, it also records in
+    a ``.part.json`` file what is needed to ask for the rest, and the next
+    call asks for just that. If the server sends the whole content instead,
+    for example because it has changed, the download starts over.
+
+    The SHA-256 of the content is computed as it is written and checked
+    against the server's digest header, if it sent one, and then by
+    ``verify``. Content that fails a check is deleted and never replaces
+    ``dest``.
+
+    Args:
+        ea: ETAPI client
+        path: ETAPI path of the content, e.g. notes/root/export
+        dest: File to write
+        params: Query parameters
+        chunk_size: Bytes to read at a time
+        on_progress: Called after every chunk, and once before the first
+        verify: Called with the complete .part file and its SHA-256 before
+            it replaces dest; raises if the content is not acceptable
+
+    Returns:
+        tuple: (size in bytes, SHA-256 as hex)
+
+    Raises:
+        EtapiError: If the server returns an error, or the content does
+        not match the server's digest
+    """
+    url = f"{ea.server_url}/etapi/{path}"
+    part_path = dest.with_name(dest.name + ".part")
+    state_path = dest.with_name(dest.name + ".part.json")
+    dest.parent.mkdir(parents=True, exist_ok=True)
+
+    headers = dict(ea.get_header())
+    # Ranges of compressed responses would count compressed bytes
+    headers["Accept-Encoding"] = "identity"
+    offset = 0
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        if state.get("url") == url and state.get("params") == params and part_path.exists():
+            offset = part_path.stat().st_size
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = state["validator"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with http(ea).get(url, params=params, headers=headers, stream=True) as response:
+        if response.status_code == 416:
+            # The part is no use, e.g. longer than the content now is
+            part_path.unlink(missing_ok=True)
+            state_path.unlink(missing_ok=True)
+            return resumable_download(ea, path, dest, params, chunk_size, on_progress, verify)
+        raise_for_status(response)
+
+        match = re.match(r"bytes (\d+)-", response.headers.get("Content-Range", ""))
+        if response.status_code != 206 or not match or int(match.group(1)) != offset:
+            offset = 0
+        validator = _resume_validator(response)
+        if validator:
+            state_path.write_text(json.dumps({"url": url, "params": params, "validator": validator}), encoding="utf-8")
+        else:
+            state_path.unlink(missing_ok=True)
+
+        length = int(response.headers.get("Content-Length") or 0)
+        total = offset + length if length else None
+        digest = hashlib.sha256()
+        with open(part_path, "r+b" if offset else "wb") as f:
+            # What is already on disk goes into the checksum first
+            while f.tell() < offset:
+                block = f.read(min(chunk_size, offset - f.tell()))
+                if not block:
+                    break
+                digest.update(block)
+            f.truncate(offset)
+            size = offset
+            if on_progress:
+                on_progress(size, total)
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                if on_progress:
+                    on_progress(size, total)
+        expected = server_digest(response)
+
+    if total is not None and size != total:
+        raise EtapiError(f"Download ended after {size} of {total} bytes")
+    checksum = digest.hexdigest()
+    try:
+        if expected and expected != checksum:
+            raise EtapiError(f"Checksum mismatch: the server sent SHA-256 {expected}, got {checksum}")
+        if verify:
+            verify(part_path, checksum)
+    except Exception:
+        # Complete but wrong: resuming it would only give the same bytes
+        part_path.unlink(missing_ok=True)
+        state_path.unlink(missing_ok=True)
+        raise
+    os.replace(part_path, dest)
+    state_path.unlink(missing_ok=True)
+    return size, checksum
+
+
+class _FileBody:
+    """File wrapper that requests sends in blocks, reporting progress.
+
+    Having a length makes requests send a Content-Length header rather
+    than a chunked body, which not every server accepts.
+    """
+
+    def __init__(self, f: BinaryIO, size: int, on_progress: Optional[ProgressHandler]) -> None:
+        self._file = f
+        self._size = size
+        self._sent = 0
+        self._on_progress = on_progress
+
+    def __len__(self) -> int:
+        return self._size - self._sent
+
+    def read(self, size: int = CHUNK_SIZE) -> bytes:
+        chunk = self._file.read(size)
+        self._sent += len(chunk)
+        if self._on_progress:
+            self._on_progress(self._sent, self._size)
+        return chunk
+
+
+def content_headers(mime: Optional[str]) -> Dict[str, str]:
+    """Headers for uploading content: text as text/plain, anything else
+    as binary, as ETAPI expects."""
+    if is_text_mime(mime):
+        return {"Content-Type": "text/plain; charset=utf-8"}
+    return {"Content-Type": "application/octet-stream", "Content-Transfer-Encoding": "binary"}
+
+
+def upload_content(
+    ea: ETAPI,
+    path: str,
+    source: Path,
+    mime: Optional[str] = None,
+    retries: int = 3,
+    on_progress: Optional[ProgressHandler] = None,
+) -> int:
+    """Replace content on the server with a file, streamed from disk.
+
+    Text is sent as text/plain and anything else as binary, as ETAPI
+    expects. Transient failures are retried from the start of the file.
+
+    Args:
+        ea: ETAPI client
+        path: ETAPI path of the content; see content_path
+        source: File to upload
+        mime: MIME type of the content, deciding text or binary
+        retries: Retries for transient failures
+        on_progress: Called as blocks are sent; starts over on a retry
+
+    Returns:
+        int: Number of bytes uploaded
+
+    Raises:
+        EtapiError: If the server returns an error
+    """
+    url = f"{ea.server_url}/etapi/{path}"
+    headers = dict(ea.get_header(), **content_headers(mime))
+
+    def send() -> int:
+        size = source.stat().st_size
+        with open(source, "rb") as f:
+            response = http(ea).put(url, data=_FileBody(f, size, on_progress), headers=headers)
+        raise_for_status(response)
+        return size
+
+    return call_with_retry(send, retries=retries)
+
+
+def upload_attachment(
+    ea: ETAPI,
+    owner_id: str,
+    source: Path,
+    title: Optional[str] = None,
+    role: Optional[str] = None,
+    mime: Optional[str] = None,
+    retries: int = 3,
+    on_progress: Optional[ProgressHandler] = None,
+) -> Dict[str, Any]:
+    """Attach a file to a note, streaming its content from disk.
+
+    The attachment is created empty, then its content is uploaded with
+    upload_content, as ETAPI does not take binary content on creation.
+
+    Args:
+        ea: ETAPI client
+        owner_id: Note to attach the file to
+        source: File to upload
+        title: Attachment title (default: the file name)
+        role: "image" or "file" (default: from the MIME type)
+        mime: MIME type (default: guessed from the file name)
+        retries: Retries for transient failures of the upload
+        on_progress: Called as blocks are sent
+
+    Returns:
+        dict: The new attachment's metadata
+
+    Raises:
+        EtapiError: If the server returns an error
+    """
+    mime = mime or mimetypes.guess_type(source.name)[0] or "application/octet-stream"
+    body = {
+        "ownerId": owner_id,
+        "role": role or ("image" if mime.startswith("image/") else "file"),
+        "mime": mime,
+        "title": title or source.name,
+        "content": "",
+    }
+    response = http(ea).post(
+        f"{ea.server_url}/etapi/attachments", json=body, headers=ea.get_header()
+    )
+    raise_for_status(response)
+    attachment = response.json()
+    upload_content(
+        ea, content_path(attachment_id=attachment["attachmentId"]), source, mime,
+        retries=retries, on_progress=on_progress,
+    )
+    return attachment
@@ -0,0 +1,302 @@
+"""Note tree traversal for tpy-cli."""
+
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from trilium_py.client import ETAPI
+
+from .async_client import AsyncETAPI, run_async
+
+# Default number of notes fetched at the same time
+DEFAULT_CONCURRENCY = 8
+
+# Search expression matching every note; the scope comes from ancestorNoteId
+SUBTREE_QUERY = "note.noteId != ''"
+
+ErrorHandler = Callable[[str, Exception], None]
+
+
+async def fetch_tree_async(
+    aea: AsyncETAPI,
+    root: str,
+    max_depth: Optional[int],
+    on_error: Optional[ErrorHandler] = None,
+    known: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Fetch a subtree one level at a time with the async client.
+
+    All notes of a level are requested together, bounded by the client's
+    concurrency, so the number of sequential round trips is the depth of
+    the tree rather than the number of notes in it. Each note is fetched
+    once, even when it is cloned under several parents, and notes passed
+    in ``known`` are not fetched at all.
+
+    Args:
+        aea: Async ETAPI client
+        root: Note ID to start from
+        max_depth: Deepest level to fetch (the root is level 0), or None
+            for the whole subtree
+        on_error: Called with the note ID and exception for notes that
+            could not be fetched; those notes are left out of the result
+        known: Note metadata that is already available, keyed by note ID
+
+    Returns:
+        dict: Note metadata keyed by note ID
+    """
+    notes: Dict[str, Dict[str, Any]] = {}
+    known = known or {}
+
+    level = [root]
+    depth = 0
+    while level and (max_depth is None or depth <= max_depth):
+        missing = [note_id for note_id in level if note_id not in known]
+        fetched = dict(zip(missing, await aea.get_notes(missing)))
+
+        next_level: List[str] = []
+        for note_id in level:
+            result = known[note_id] if note_id in known else fetched[note_id]
+            if not isinstance(result, dict) or "noteId" not in result:
+                if on_error:
+                    error = result if isinstance(result, Exception) else ValueError(
+                        f"Unexpected response: {result}"
+                    )
+                    on_error(note_id, error)
+                continue
+            notes[note_id] = result
+            if max_depth is None or depth < max_depth:
+                next_level.extend(result.get("childNoteIds", []))
+
+        # Clones appear under several parents but only need one request
+        level = [nid for nid in dict.fromkeys(next_level) if nid not in notes]
+        depth += 1
+
+    return notes
+
+
+def fetch_tree(
+    ea: ETAPI,
+    root: str,
+    max_depth: Optional[int],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    on_error: Optional[ErrorHandler] = None,
+    known: Optional[Dict[str, Dict[str, Any]]] = None,
+    retries: int = 3,
+) -> Dict[str, Dict[str, Any]]:
+    """Fetch a subtree one level at a time; see fetch_tree_async.
+
+    Args:
+        ea: ETAPI client
+        root: Note ID to start from
+        max_depth: Deepest level to fetch (the root is level 0), or None
+            for the whole subtree
+        concurrency: Maximum number of requests in flight
+        on_error: Called for notes that could not be fetched
+        known: Note metadata that is already available, keyed by note ID
+        retries: Retries for transient failures
+
+    Returns:
+        dict: Note metadata keyed by note ID
+    """
+    return run_async(
+        ea, concurrency,
+        lambda aea: fetch_tree_async(aea, root, max_depth, on_error, known),
+        retries=retries,
+    )
+
+
+def subtree_params(root: str, max_depth: Optional[int]) -> Optional[Dict[str, Any]]:
+    """ETAPI search parameters scoping a search to a note's descendants.
+
+    Returns:
+        dict: Search parameters, or None if max_depth leaves no
+        descendants to search for
+    """
+    params: Dict[str, Any] = {
+        "ancestorNoteId": root,
+        "includeArchivedNotes": True,
+        "fastSearch": True,
+    }
+    if max_depth is not None:
+        if max_depth < 1:
+            return None
+        params["ancestorDepth"] = f"lt{max_depth + 1}"
+    return params
+
+
+def _notes_by_id(results: Any) -> Optional[Dict[str, Dict[str, Any]]]:
+    # Errors come back as a JSON body without results
+    if not isinstance(results, dict) or not isinstance(results.get("results"), list):
+        return None
+
+    return {
+        note["noteId"]: note
+        for note in results["results"]
+        if isinstance(note, dict) and "noteId" in note
+    }
+
+
+def search_subtree(
+    ea: ETAPI, root: str, max_depth: Optional[int], query: str = SUBTREE_QUERY
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Fetch the descendants of a note with a single ancestor-scoped search.
+
+    The root note itself is not part of the result. Notes the search does
+    not return (hidden or otherwise out of scope) are left for fetch_tree
+    to fill in.
+
+    Args:
+        ea: ETAPI client
+        root: Note ID whose descendants to fetch
+        max_depth: Deepest level to fetch (the root is level 0), or None
+            for the whole subtree
+        query: Search expression the descendants must match; by default
+            every note
+
+    Returns:
+        dict: Note metadata keyed by note ID, or None if the server's search
+        could not answer the query
+    """
+    params = subtree_params(root, max_depth)
+    if params is None:
+        return {}
+
+    try:
+        results = ea.search_note(query, **params)
+    except Exception:
+        return None
+    return _notes_by_id(results)
+
+
+async def search_subtree_async(
+    aea: AsyncETAPI, root: str, max_depth: Optional[int], query: str = SUBTREE_QUERY
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Async counterpart of search_subtree."""
+    params = subtree_params(root, max_depth)
+    if params is None:
+        return {}
+
+    try:
+        results = await aea.search_note(query, **params)
+    except Exception:
+        return None
+    return _notes_by_id(results)
+
+
+class NoteTree:
+    """Compact, read-only tree of fetched notes.
+
+    Holds only what rendering and exporting need, in parallel lists
+    indexed by position: ``ids``, ``titles``, ``types``, ``mimes``,
+    ``blob_ids`` and ``modified``. Each note's children are a run of
+    positions in one flat array, located through an array of offsets, so
+    a 100k-note tree costs a few references per note instead of a dict
+    of metadata each. Children that were not fetched are left out.
+
+    Build it with from_notes, after which the note dicts can be dropped.
+    """
+
+    __slots__ = (
+        "ids", "titles", "types", "mimes", "blob_ids", "modified",
+        "_index", "_first", "_children",
+    )
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.titles: List[str] = []
+        self.types: List[Optional[str]] = []
+        self.mimes: List[Optional[str]] = []
+        self.blob_ids: List[Optional[str]] = []
+        self.modified: List[Optional[str]] = []
+        self._index: Dict[str, int] = {}
+        # Children of note i are _children[_first[i]:_first[i + 1]]
+        self._first = array("l", [0])
+        self._children = array("l")
+
+    @classmethod
+    def from_notes(cls, notes: Dict[str, Dict[str, Any]]) -> "NoteTree":
+        """Build a tree from note metadata keyed by note ID, as fetch_tree returns."""
+        tree = cls()
+        tree._index = {note_id: i for i, note_id in enumerate(notes)}
+        # Types and MIME types repeat a lot; keep one copy of each
+        shared: Dict[Optional[str], Optional[str]] = {}
+        for note_id, note in notes.items():
+            tree.ids.append(note_id)
+            tree.titles.append(note.get("title", "Untitled"))
+            tree.types.append(shared.setdefault(note.get("type"), note.get("type")))
+            tree.mimes.append(shared.setdefault(note.get("mime"), note.get("mime")))
+            tree.blob_ids.append(note.get("blobId"))
+            tree.modified.append(note.get("utcDateModified"))
+            for child_id in note.get("childNoteIds", ()):
+                child = tree._index.get(child_id)
+                if child is not None:
+                    tree._children.append(child)
+            tree._first.append(len(tree._children))
+        return tree
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, note_id: object) -> bool:
+        return note_id in self._index
+
+    def index(self, note_id: str) -> int:
+        """Position of a note; raises KeyError if it is not in the tree."""
+        return self._index[note_id]
+
+    def children(self, i: int) -> Sequence[int]:
+        """Positions of a note's children, in branch order."""
+        return self._children[self._first[i]:self._first[i + 1]]
+
+    def walk(
+        self, root: str, max_depth: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, int, bool]]:
+        """Walk the tree depth first, in display order, without recursion.
+
+        A note cloned under several parents is visited under each.
+
+        Args:
+            root: Note ID to start from
+            max_depth: Deepest level to walk (the root is level 0), or None
+                for the whole tree
+
+        Yields:
+            tuple: (position, parent position or -1, depth, is_last) for
+            each note, is_last telling whether it is its parent's last child
+        """
+        start = self._index.get(root)
+        if start is None:
+            return
+        yield start, -1, 0, True
+        if max_depth is not None and max_depth < 1:
+            return
+
+        first, children = self._first, self._children
+        # One [parent, next child offset, end offset] frame per level, so
+        # memory grows with the depth of the tree, not its size
+        stack = [[start, first[start], first[start + 1]]]
+        while stack:
+            frame = stack[-1]
+            parent, pos, end = frame
+            if pos == end:
+                stack.pop()
+                continue
+            frame[1] = pos + 1
+            child = children[pos]
+            depth = len(stack)
+            yield child, parent, depth, pos == end - 1
+            if (max_depth is None or depth < max_depth) and first[child] < first[child + 1]:
+                stack.append([child, first[child], first[child + 1]])
+
+
+def walk_tree(
+    tree: NoteTree, root: str, max_depth: int
+) -> Iterator[Tuple[int, int, str, int]]:
+    """Walk a tree in display order; see NoteTree.walk.
+
+    Yields:
+        tuple: (position, parent position, prefix, depth) for each note,
+        with the ``├──``/``└──`` prefix used to draw the tree
+    """
+    for i, parent, depth, is_last in tree.walk(root, max_depth):
+        prefix = ("    " * depth + ("└── " if is_last else "├── ")) if depth else ""
+        yield i, parent, prefix, depth
@@ -3,14 +3,88 @@
 import os
 import click
 from pathlib import Path
-from typing import Optional, Tuple, Any, Dict
+from typing import TYPE_CHECKING, Callable, Optional, Tuple, Any, Dict
 
-from dotenv import load_dotenv
-from trilium_py.client import ETAPI
+# trilium-py, requests and dotenv are imported where they are needed, so
+# commands that never talk to the server (--help, config show) start fast
+if TYPE_CHECKING:
+    from trilium_py.client import ETAPI
+
+    from .cache import MetadataCache
+    from .index import NoteIndex
+    from .session import TriliumSession
 
 # Configuration file paths
 ENV_FILE = Path(".env")  # Local .env file
 
+# Sessions, caches and indexes kept open across invocations, keyed by
+# their settings; only the daemon (see daemon.serve) sets this
+RESIDENT: Optional[Dict[Tuple[Any, ...], Any]] = None
+
+# MIME types inferred from file extensions when reading note content
+MIME_TYPES = {
+    ".md": "text/x-markdown",
+    ".py": "text/x-python",
+    ".html": "text/html",
+    ".htm": "text/html",
+    ".txt": "text/plain",
+}
+
+
+class EtapiError(click.ClickException):
+    """Error response returned by the ETAPI server."""
+    
+    def __init__(self, message: str, status: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def check_response(result: Any, key: str) -> Dict[str, Any]:
+    """Check an ETAPI response for the expected key.
+    
+    trilium-py returns the decoded JSON body whatever the status code, so
+    errors show up as a body with ``status`` and ``message`` instead.
+    
+    Args:
+        result: Decoded response body
+        key: Key a successful response must contain
+        
+    Returns:
+        dict: The response body
+        
+    Raises:
+        EtapiError: If the response is an error or lacks the key
+    """
+    if isinstance(result, dict) and key in result:
+        return result
+    if isinstance(result, dict) and "message" in result:
+        raise EtapiError(str(result["message"]), status=result.get("status"))
+    raise EtapiError(f"Unexpected response from server: {result}")
+
+
+def infer_mime(file_path: Path) -> Optional[str]:
+    """Infer a note MIME type from a file extension, or None if unknown."""
+    return MIME_TYPES.get(file_path.suffix.lower())
+
+
+def guess_mime(file_path: Path) -> Optional[str]:
+    """Infer a MIME type from MIME_TYPES, falling back to Python's table."""
+    import mimetypes
+    
+    return infer_mime(file_path) or mimetypes.guess_type(file_path.name)[0]
+
+
+def read_content_file(file_path: Path) -> str:
+    """Read note content from a text file.
+    
+    Raises:
+        click.BadParameter: If the file does not exist
+    """
+    if not file_path.exists():
+        raise click.BadParameter(f"File not found: {file_path}")
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
 
 def load_environment(env_file: Optional[Path] = None, debug: bool = False) -> bool:
     """Load environment variables from .env file or environment.
@@ -27,6 +101,8 @@ def load_environment(env_file: Optional[Path] = None, debug: bool = False) -> bo
     Returns:
         bool: True if the environment was loaded successfully
     """
+    from dotenv import load_dotenv
+    
     def debug_print(msg: str) -> None:
         if debug:
             click.echo(f"[DEBUG] {msg}", err=True)
@@ -48,11 +124,77 @@ def load_environment(env_file: Optional[Path] = None, debug: bool = False) -> bo
     return False
 
 
-def get_etapi(ctx: click.Context) -> ETAPI:
+def open_resource(root: click.Context, key: Tuple[Any, ...], create: Callable[[], Any]) -> Any:
+    """Create a session, cache or index for this invocation.
+    
+    It is closed when the command finishes, unless RESIDENT is set: then
+    resources are kept there under key and reused by later invocations in
+    the same process, until the daemon closes them on shutdown.
+    
+    Args:
+        root: Root Click context of the invocation
+        key: What identifies an equivalent resource
+        create: Creates the resource; it must have a close method
+        
+    Returns:
+        The new or reused resource
+    """
+    if RESIDENT is None:
+        resource = create()
+        root.call_on_close(resource.close)
+        return resource
+    if key not in RESIDENT:
+        RESIDENT[key] = create()
+    return RESIDENT[key]
+
+
+def get_session(ctx: click.Context) -> "TriliumSession":
+    """Get the HTTP session shared by every ETAPI call of this invocation.
+    
+    The session is created on first use from the --pool-size, --timeout
+    and similar options on the main command, falling back to TPY_*
+    environment variables (or .env entries) and then to defaults. It is
+    closed when the command finishes, except in the daemon, which keeps
+    it for later commands with the same settings.
+    
+    Args:
+        ctx: Click context object
+        
+    Returns:
+        TriliumSession: Shared session, also used by trilium-py
+    """
+    from .session import TriliumSession, install_session, resolve_settings
+    
+    root = ctx.find_root()
+    root.ensure_object(dict)
+    if "session" not in root.obj:
+        settings = resolve_settings(root.obj.get("http"))
+        
+        def create() -> "TriliumSession":
+            if root.obj.get("debug", False):
+                click.echo(f"[DEBUG] Creating HTTP session: {settings}", err=True)
+            return TriliumSession(**settings)
+        
+        session = open_resource(root, ("session", *sorted(settings.items())), create)
+        install_session(session)
+        root.obj["session"] = session
+    return root.obj["session"]
+
+
+def get_etapi(
+    ctx: click.Context, server: Optional[str] = None, token: Optional[str] = None
+) -> "ETAPI":
     """Get an ETAPI client from the Click context.
     
+    Every command gets its client here, so they all share one pooled
+    session. The client for the configured server is created once per
+    invocation; passing server explicitly (e.g. to log in) gives a
+    separate client for that server.
+    
     Args:
         ctx: Click context object containing server and token
+        server: Server URL to use instead of the configured one
+        token: Token to use with an explicit server
         
     Returns:
         ETAPI: Configured ETAPI client
@@ -60,10 +202,21 @@ def get_etapi(ctx: click.Context) -> ETAPI:
     Raises:
         click.UsageError: If server or token is missing
     """
-    server = ctx.obj.get("server")
-    token = ctx.obj.get("token")
+    from .session import SessionETAPI
+    
+    session = get_session(ctx)
     debug = ctx.obj.get("debug", False)
     
+    if server is not None:
+        return SessionETAPI(server, token, session)
+    
+    root = ctx.find_root()
+    if "etapi" in root.obj:
+        return root.obj["etapi"]
+    
+    server = root.obj.get("server")
+    token = root.obj.get("token")
+    
     if not server or not token:
         # Try to get from environment
         server, token = ensure_config(debug=debug)
@@ -77,13 +230,45 @@ def get_etapi(ctx: click.Context) -> ETAPI:
         click.echo(f"[DEBUG] Creating ETAPI client for {server}", err=True)
     
     try:
-        return ETAPI(server, token)
+        root.obj["etapi"] = SessionETAPI(server, token, session)
     except Exception as e:
         if debug:
             click.echo(f"[DEBUG] Failed to create ETAPI client: {e}", err=True)
         raise click.UsageError(
             "Failed to connect to Trilium. Please check your server URL and token."
         )
+    return root.obj["etapi"]
+
+
+def get_cache(ctx: click.Context) -> Optional["MetadataCache"]:
+    """Get the note metadata cache for the configured server.
+    
+    The cache is opened once per invocation and closed when the command
+    finishes.
+    
+    Args:
+        ctx: Click context object containing server and cache flags
+        
+    Returns:
+        MetadataCache: Cache for the current server, or None if disabled
+        with --no-cache
+    """
+    root = ctx.find_root()
+    if root.obj.get("no_cache", False) or not root.obj.get("server"):
+        return None
+    
+    if "cache" not in root.obj:
+        from .cache import MetadataCache
+        
+        server = root.obj["server"]
+        refresh = root.obj.get("refresh", False)
+        key = ("cache", server, refresh, *(
+            os.getenv(name) for name in ("TPY_CACHE_FILE", "TPY_CACHE_TTL", "TPY_CACHE_MAX_ENTRIES")
+        ))
+        root.obj["cache"] = open_resource(
+            root, key, lambda: MetadataCache.from_env(server, refresh=refresh)
+        )
+    return root.obj["cache"]
 
 
 def get_config(debug: bool = False) -> Tuple[Optional[str], Optional[str]]:
@@ -193,3 +378,34 @@ def ensure_config(server: Optional[str] = None, token: Optional[str] = None,
     
     debug_print("Configuration loaded successfully")
     return server, token
+
+
+def get_index(ctx: click.Context) -> "NoteIndex":
+    """Get the local full-text index for the configured server.
+    
+    Opening the index needs no network access. It is closed when the
+    command finishes.
+    
+    Args:
+        ctx: Click context object containing the server
+        
+    Returns:
+        NoteIndex: Index for the current server
+        
+    Raises:
+        click.UsageError: If no server is configured
+    """
+    root = ctx.find_root()
+    if not root.obj.get("server"):
+        raise click.UsageError(
+            "Missing server. Please configure with:\n"
+            "  tpy config set --server URL --token TOKEN"
+        )
+    
+    if "index" not in root.obj:
+        from .index import NoteIndex
+        
+        server = root.obj["server"]
+        key = ("index", server, os.getenv("TPY_INDEX_FILE"))
+        root.obj["index"] = open_resource(root, key, lambda: NoteIndex.from_env(server))
+    return root.obj["index"]
@@ -0,0 +1,39 @@
+"""Fixtures shared by the tests: a mock ETAPI server and a tpy runner."""
+
+import sys
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import pytest
+from click.testing import CliRunner, Result
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from mock_server import MockServer, Vault, serve  # noqa: E402
+
+from trilium_py_cli.cli import main  # noqa: E402
+
+
+@pytest.fixture
+def server() -> Iterator[MockServer]:
+    """A mock server with a small vault: 100 notes, 5 children per note."""
+    server = serve(Vault(100, fanout=5, content_size=256))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def tpy(server: MockServer, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Callable[..., Result]:
+    """Run tpy against the mock server, with its own cache and index files."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("TRILIUM_SERVER", server.url)
+    monkeypatch.setenv("TRILIUM_TOKEN", "test-token")
+    monkeypatch.setenv("TPY_CACHE_FILE", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setenv("TPY_INDEX_FILE", str(tmp_path / "index.sqlite3"))
+    monkeypatch.setenv("TPY_NO_DAEMON", "1")
+
+    def run(*args: Any, input: str = None) -> Result:
+        return CliRunner().invoke(main, [str(arg) for arg in args], input=input)
+
+    return run
@@ -0,0 +1,69 @@
+"""Tests for resumable downloads and backup export."""
+
+import hashlib
+import json
+
+import pytest
+from trilium_py.client import ETAPI
+
+from trilium_py_cli.transfer import resumable_download
+from trilium_py_cli.utils import EtapiError
+
+
+def test_resumable_download_resumes_from_part(server, tmp_path):
+    archive = server.vault.export("n2", "html")
+    dest = tmp_path / "n2.zip"
+    ea = ETAPI(server.url, "test-token")
+    url = f"{server.url}/etapi/notes/n2/export"
+    etag = f'"{hashlib.sha256(archive).digest()[:8].hex()}"'
+    dest.with_name("n2.zip.part").write_bytes(archive[:100])
+    dest.with_name("n2.zip.part.json").write_text(
+        json.dumps({"url": url, "params": {"format": "html"}, "validator": etag})
+    )
+    server.reset_stats()
+
+    size, checksum = resumable_download(ea, "notes/n2/export", dest, params={"format": "html"})
+
+    assert dest.read_bytes() == archive
+    assert (size, checksum) == (len(archive), hashlib.sha256(archive).hexdigest())
+    assert server.reset_stats()["bytes"] == len(archive) - 100
+    assert not dest.with_name("n2.zip.part").exists()
+    assert not dest.with_name("n2.zip.part.json").exists()
+
+
+def test_failed_verify_keeps_existing_file(server, tmp_path):
+    dest = tmp_path / "n2.zip"
+    dest.write_bytes(b"last good backup")
+    ea = ETAPI(server.url, "test-token")
+
+    def verify(part, checksum):
+        assert part.name == "n2.zip.part"
+        raise EtapiError("rejected")
+
+    with pytest.raises(EtapiError):
+        resumable_download(ea, "notes/n2/export", dest, params={"format": "html"}, verify=verify)
+
+    assert dest.read_bytes() == b"last good backup"
+    assert not dest.with_name("n2.zip.part").exists()
+
+
+def test_export_writes_archive_and_checksum(tpy, server, tmp_path):
+    archive = server.vault.export("n2", "html")
+    checksum = hashlib.sha256(archive).hexdigest()
+
+    result = tpy("backup", "export", "n2", "--out", "n2.zip", "--sha256", checksum)
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "n2.zip").read_bytes() == archive
+    assert (tmp_path / "n2.zip.sha256").read_text() == f"{checksum}  n2.zip\n"
+
+
+def test_export_with_wrong_checksum_keeps_previous_archive(tpy, tmp_path):
+    (tmp_path / "n2.zip").write_bytes(b"last good backup")
+
+    result = tpy("backup", "export", "n2", "--out", "n2.zip", "--sha256", "0" * 64)
+
+    assert result.exit_code != 0
+    assert "Checksum mismatch" in result.output
+    assert (tmp_path / "n2.zip").read_bytes() == b"last good backup"
+    assert not (tmp_path / "n2.zip.part").exists()
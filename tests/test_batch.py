@@ -0,0 +1,28 @@
+"""Tests for tpy batch."""
+
+import json
+
+
+def records(result):
+    return [json.loads(line) for line in result.output.splitlines() if line.startswith("{")]
+
+
+def test_tree_with_failed_notes_is_an_error_and_not_cached(tpy, server):
+    parent = server.vault.add("root", "batched")
+    kept = server.vault.add(parent.note_id, "kept")
+    lost = server.vault.add(parent.note_id, "lost")
+    # Still listed as a child, but fetching it fails
+    del server.vault.notes[lost.note_id]
+    request = json.dumps({"op": "tree", "root": parent.note_id}) + "\n"
+
+    result = tpy("batch", input=request)
+
+    (record,) = records(result)
+    assert record["ok"] is False
+    assert lost.note_id in record["error"]
+
+    # Nothing partial was cached: once the note is back, the tree is whole
+    server.vault.notes[lost.note_id] = lost
+    (record,) = records(tpy("batch", input=request))
+    assert record["ok"] is True
+    assert {row["noteId"] for row in record["result"]} == {parent.note_id, kept.note_id, lost.note_id}
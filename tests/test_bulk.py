@@ -0,0 +1,106 @@
+"""Tests for bulk operation plans and for applying them to a server."""
+
+import pytest
+
+from trilium_py_cli.bulk import Clone, Delete, Move, RemoveAttribute, SetAttribute
+
+
+def note(**fields):
+    return dict({"noteId": "a", "attributes": [], "parentNoteIds": ["p"], "parentBranchIds": ["p_a"]}, **fields)
+
+
+def label(name, value="", attribute_id="t1", **fields):
+    return dict({"attributeId": attribute_id, "type": "label", "name": name, "value": value}, **fields)
+
+
+def descriptions(steps):
+    return [description for description, _ in steps]
+
+
+def test_set_attribute_plans():
+    assert descriptions(SetAttribute("label", "todo").plan(note())) == ["add #todo"]
+    assert SetAttribute("label", "todo").plan(note(attributes=[label("todo")])) == []
+    assert descriptions(SetAttribute("label", "status", "done").plan(
+        note(attributes=[label("status", "open")])
+    )) == ["set #status=done"]
+    # Inherited labels belong to another note
+    assert descriptions(SetAttribute("label", "todo").plan(
+        note(attributes=[label("todo", noteId="p")])
+    )) == ["add #todo"]
+    # Relations of the same name are kept
+    assert descriptions(SetAttribute("relation", "author", "b").plan(
+        note(attributes=[label("author", "c", type="relation")])
+    )) == ["add ~author=b"]
+
+
+def test_remove_attribute_plans():
+    attributes = [label("tag", "x", "t1"), label("tag", "y", "t2")]
+    assert descriptions(RemoveAttribute("label", "tag").plan(note(attributes=attributes))) == [
+        "remove #tag=x", "remove #tag=y",
+    ]
+    assert descriptions(RemoveAttribute("label", "tag", "y").plan(note(attributes=attributes))) == [
+        "remove #tag=y",
+    ]
+
+
+def test_clone_and_move_plans():
+    assert descriptions(Clone("q").plan(note())) == ["clone to q"]
+    assert Clone("p").plan(note()) == []
+    # The new branch comes first, so the note always has a parent
+    two_parents = note(parentNoteIds=["p", "r"], parentBranchIds=["p_a", "r_a"])
+    assert descriptions(Move("q").plan(two_parents)) == ["clone to q", "remove from p", "remove from r"]
+    assert descriptions(Move("q", from_parent="r").plan(two_parents)) == ["clone to q", "remove from r"]
+    assert descriptions(Move("p").plan(two_parents)) == ["remove from r"]
+    with pytest.raises(ValueError):
+        Move("q", from_parent="x").plan(note())
+    with pytest.raises(ValueError):
+        Move("q").plan(note(noteId="root"))
+    with pytest.raises(ValueError):
+        Delete().plan(note(noteId="root"))
+
+
+def test_label_with_lost_responses_adds_each_label_once(tpy, server):
+    server.lost_rate = 0.5
+    query = ("--query", "#todo")
+
+    result = tpy("notes", "bulk", "label", "reviewed", "--retries", "5", *query)
+
+    assert result.exit_code == 0, result.output
+    assert server.stats.get("lost")
+    todo = [n for n in server.vault.notes.values() if any(a["name"] == "todo" for a in n.attributes)]
+    assert todo
+    assert all(sum(a["name"] == "reviewed" for a in n.attributes) == 1 for n in todo)
+
+    server.lost_rate = 0
+    rerun = tpy("notes", "bulk", "label", "reviewed", *query)
+    assert "Changed 0 notes" in rerun.output
+
+
+def test_move_and_delete(tpy, server):
+    title = server.vault.notes["n0"].title
+    assert tpy("notes", "bulk", "move", "n3", "--query", title).exit_code == 0
+    assert server.vault.notes["n0"].parents == ["n3"]
+
+    result = tpy("notes", "bulk", "delete", "--query", title, input="n\n")
+    assert result.exit_code != 0
+    assert "n0" in server.vault.notes
+    assert tpy("notes", "bulk", "delete", "--query", title, "--yes").exit_code == 0
+    assert "n0" not in server.vault.notes
+
+
+def test_unlabel_and_move_with_lost_responses(tpy, server):
+    server.lost_rate = 0.5
+    server.error_rate = 0.1
+    todo = [n for n in server.vault.notes.values() if any(a["name"] == "todo" for a in n.attributes)]
+    assert todo
+
+    result = tpy("notes", "bulk", "label", "todo", "--remove", "--retries", "8", "--query", "#todo")
+
+    assert result.exit_code == 0, result.output
+    assert server.stats.get("lost")
+    assert not any(a["name"] == "todo" for n in todo for a in n.attributes)
+
+    title = server.vault.notes["n0"].title
+    result = tpy("notes", "bulk", "move", "n3", "--retries", "8", "--query", title)
+    assert result.exit_code == 0, result.output
+    assert server.vault.notes["n0"].parents == ["n3"]
@@ -0,0 +1,66 @@
+"""Tests for the note metadata cache and its invalidation by writes."""
+
+import json
+from pathlib import Path
+
+from trilium_py_cli.cache import MetadataCache
+
+MODIFIED = "2024-01-01 00:00:00.000Z"
+
+
+def make_cache(tmp_path: Path) -> MetadataCache:
+    return MetadataCache("http://server", path=tmp_path / "cache.sqlite3")
+
+
+def test_put_many_replaces_note_with_same_modified_date(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many([{"noteId": "a", "utcDateModified": MODIFIED, "childNoteIds": []}])
+    # A new child does not change the parent's utcDateModified
+    cache.put_many([{"noteId": "a", "utcDateModified": MODIFIED, "childNoteIds": ["b"]}])
+    assert cache.get("a")["childNoteIds"] == ["b"]
+
+
+def test_invalidate_drops_notes_their_parents_and_queries(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many([
+        {"noteId": "root", "childNoteIds": ["a"], "parentNoteIds": []},
+        {"noteId": "a", "childNoteIds": [], "parentNoteIds": ["root"]},
+        {"noteId": "b", "childNoteIds": [], "parentNoteIds": ["root"]},
+    ])
+    cache.put_query("#todo", [{"noteId": "b", "parentNoteIds": ["root"]}])
+
+    cache.invalidate(["a"])
+
+    assert set(cache.get_many(["root", "a", "b"])) == {"b"}
+    assert cache.get_query("#todo") is None
+
+
+def tree_ids(result) -> set:
+    return {record["noteId"] for record in map(json.loads, result.output.splitlines())}
+
+
+def test_refreshed_tree_stays_fresh(tpy, server):
+    assert "n99" not in tree_ids(tpy("notes", "tree", "--root", "n3", "--max-depth", "1", "--format", "ndjson"))
+    child = server.vault.add("n3", "added elsewhere")
+
+    refreshed = tpy("--refresh", "notes", "tree", "--root", "n3", "--max-depth", "1", "--format", "ndjson")
+    cached = tpy("notes", "tree", "--root", "n3", "--max-depth", "1", "--format", "ndjson")
+
+    assert child.note_id in tree_ids(refreshed)
+    assert child.note_id in tree_ids(cached)
+
+
+def test_writes_invalidate_cached_parents(tpy, server, tmp_path):
+    tree = ("notes", "tree", "--root", "n3", "--max-depth", "1", "--format", "ndjson")
+    before = tree_ids(tpy(*tree))
+
+    result = tpy("notes", "bulk", "clone", "n3", "--query", server.vault.notes["n0"].title)
+    assert result.exit_code == 0, result.output
+    assert tree_ids(tpy(*tree)) - before == {"n0"}
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "new.md").write_text("# New\n")
+    result = tpy("notes", "import", docs, "--parent-id", "n3")
+    assert result.exit_code == 0, result.output
+    assert len(tree_ids(tpy(*tree)) - before - {"n0"}) == 1
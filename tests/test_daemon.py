@@ -0,0 +1,97 @@
+"""Tests for which commands go to the daemon, and how it runs and stops."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from trilium_py_cli import daemon
+
+
+@pytest.fixture
+def socket_file(tmp_path, monkeypatch):
+    monkeypatch.delenv("TPY_NO_DAEMON", raising=False)
+    path = tmp_path / "d.sock"
+    monkeypatch.setenv("TPY_DAEMON_SOCKET", str(path))
+    return path
+
+
+@pytest.fixture
+def running_daemon(socket_file, server, monkeypatch):
+    monkeypatch.setenv("TRILIUM_SERVER", server.url)
+    monkeypatch.setenv("TRILIUM_TOKEN", "test-token")
+    monkeypatch.setenv("TPY_CACHE_FILE", str(socket_file.with_name("cache.sqlite3")))
+    process = subprocess.Popen([sys.executable, "-m", "trilium_py_cli.daemon"])
+    deadline = time.monotonic() + 20
+    while daemon.control("status") is None:
+        assert time.monotonic() < deadline, "daemon did not start"
+        time.sleep(0.05)
+    yield process
+    if process.poll() is None:
+        process.terminate()
+    process.wait(10)
+
+
+@pytest.mark.parametrize("argv, forwarded", [
+    (["notes", "tree"], True),
+    (["--refresh", "notes", "search", "x"], True),
+    (["index", "sync"], True),
+    (["index", "sync", "--watch"], False),
+    (["index", "sync", "--prune", "--watch"], False),
+    (["info", "watch", "--server", "http://a"], False),
+    (["notes", "bulk", "delete", "-q", "x"], False),
+    (["config", "show"], False),
+    (["--server", "http://a", "notes", "tree"], False),
+    ([], False),
+])
+def test_should_forward(socket_file, argv, forwarded):
+    assert daemon.should_forward(argv) is forwarded
+
+
+def test_no_daemon_env_disables_forwarding(socket_file, monkeypatch):
+    monkeypatch.setenv("TPY_NO_DAEMON", "1")
+    assert not daemon.should_forward(["notes", "tree"])
+
+
+def test_forward_returns_exit_status(running_daemon):
+    assert daemon.forward(["notes", "tree", "--root", "n3", "--max-depth", "1"]) == 0
+    assert daemon.forward(["notes", "tree", "--root", "missing"]) != 0
+
+
+def test_busy_daemon_is_not_waited_for(running_daemon, socket_file):
+    # The daemon waits for this connection's request, so it takes no other
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as holder:
+        holder.connect(str(socket_file))
+        holder.recv(daemon.FRAME_HEADER.size)
+        start = time.monotonic()
+        assert daemon.connect(timeout=0.2) is None
+        assert time.monotonic() - start < 1
+    # Once it is free again, it serves requests as before
+    assert daemon.control("status") is not None
+
+
+def test_sigterm_during_command_stops_daemon_after_it(running_daemon, server):
+    server.latency = 0.5
+    statuses = []
+    client = threading.Thread(
+        target=lambda: statuses.append(daemon.forward(["notes", "tree", "--root", "n3"]))
+    )
+    client.start()
+    time.sleep(0.3)
+    os.kill(running_daemon.pid, signal.SIGTERM)
+    client.join(10)
+
+    assert statuses == [0]
+    assert running_daemon.wait(10) == 0
+    assert daemon.connect() is None
+
+
+def test_sigterm_when_idle_stops_daemon(running_daemon, socket_file):
+    running_daemon.send_signal(signal.SIGTERM)
+    assert running_daemon.wait(10) == 0
+    assert not socket_file.exists()
@@ -0,0 +1,110 @@
+"""Tests for incremental export, in particular moving renamed notes."""
+
+import pytest
+
+
+@pytest.fixture
+def folder(server):
+    """A note with three children of known content."""
+    vault = server.vault
+    parent = vault.add("root", "exported")
+    for title in ("one", "two", "three"):
+        vault.set_content(vault.add(parent.note_id, title), f"content of {title}".encode())
+    return parent
+
+
+def children(server, folder):
+    return [server.vault.notes[child] for child in folder.children]
+
+
+def files(directory):
+    return {
+        path.relative_to(directory).as_posix(): path.read_text()
+        for path in directory.rglob("*.html")
+        if path.name != "exported.html"
+    }
+
+
+def test_unchanged_notes_are_not_downloaded_again(tpy, folder, tmp_path):
+    assert tpy("notes", "export", folder.note_id, "out").exit_code == 0
+    result = tpy("notes", "export", folder.note_id, "out")
+    assert "Downloaded 0 notes, 4 unchanged" in result.output
+
+
+def test_swapped_titles_swap_files(tpy, server, folder, tmp_path):
+    assert tpy("notes", "export", folder.note_id, "out").exit_code == 0
+    one, two, three = children(server, folder)
+    one.title, two.title = "two", "one"
+
+    result = tpy("notes", "export", folder.note_id, "out")
+
+    assert result.exit_code == 0, result.output
+    assert "2 moved" in result.output
+    assert files(tmp_path / "out") == {
+        "exported/one.html": "content of two",
+        "exported/two.html": "content of one",
+        "exported/three.html": "content of three",
+    }
+
+
+def test_rename_chain_keeps_every_file(tpy, server, folder, tmp_path):
+    assert tpy("notes", "export", folder.note_id, "out").exit_code == 0
+    one, two, three = children(server, folder)
+    one.title, two.title, three.title = "two", "three", "four"
+
+    result = tpy("notes", "export", folder.note_id, "out")
+
+    assert result.exit_code == 0, result.output
+    assert files(tmp_path / "out") == {
+        "exported/two.html": "content of one",
+        "exported/three.html": "content of two",
+        "exported/four.html": "content of three",
+    }
+    assert not list((tmp_path / "out").glob(".tpy-moving-*"))
+
+
+def test_partial_tree_prunes_nothing(tpy, server, folder, tmp_path):
+    assert tpy("notes", "export", folder.note_id, "out").exit_code == 0
+    one, two, three = children(server, folder)
+    # Still listed as a child, but fetching it fails
+    del server.vault.notes[two.note_id]
+
+    result = tpy("notes", "export", folder.note_id, "out")
+
+    assert result.exit_code == 1, result.output
+    assert "nothing is pruned" in result.output
+    assert "0 removed" in result.output
+    assert set(files(tmp_path / "out")) == {
+        "exported/one.html", "exported/two.html", "exported/three.html",
+    }
+    # The next complete run still knows the file is the export's to remove
+    folder.children.remove(two.note_id)
+    result = tpy("notes", "export", folder.note_id, "out")
+    assert result.exit_code == 0, result.output
+    assert "1 removed" in result.output
+    assert set(files(tmp_path / "out")) == {"exported/one.html", "exported/three.html"}
+
+
+def test_missing_root_is_reported(tpy):
+    result = tpy("notes", "export", "nosuchnote", "out")
+    assert result.exit_code == 1
+    assert "Note not found: nosuchnote" in result.output
+    assert "Error exporting" not in result.output
+
+
+def test_only_directories_emptied_by_the_export_are_removed(tpy, server, folder, tmp_path):
+    one, two, three = children(server, folder)
+    server.vault.set_content(server.vault.add(one.note_id, "child"), b"content of child")
+    assert tpy("notes", "export", folder.note_id, "out").exit_code == 0
+    out = tmp_path / "out"
+    assert (out / "exported" / "one" / "child.html").exists()
+    (out / "mine" / "empty").mkdir(parents=True)
+
+    # The child leaves, so exported/one/ is left empty
+    one.children.clear()
+    result = tpy("notes", "export", folder.note_id, "out")
+
+    assert result.exit_code == 0, result.output
+    assert "1 removed" in result.output
+    assert not (out / "exported" / "one").exists()
+    assert (out / "mine" / "empty").is_dir()
@@ -0,0 +1,112 @@
+"""Tests for directory import: journal, resume and retried creates."""
+
+import json
+
+import pytest
+
+from trilium_py_cli.importer import ImportJournal, scan_directory
+
+
+def make_docs(tmp_path, files=10):
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    for i in range(files):
+        (docs / ("sub" if i % 2 else ".") / f"note{i}.md").write_text(f"# Note {i}\n")
+    return docs
+
+
+def test_import_creates_each_item_once(tpy, server, tmp_path):
+    docs = make_docs(tmp_path)
+
+    result = tpy("notes", "import", docs, "--parent-id", "n3")
+
+    assert result.exit_code == 0, result.output
+    titles = [n.title for n in server.vault.descendants("n3", None) if n.title.startswith(("note", "sub"))]
+    assert sorted(titles) == sorted(["sub"] + [f"note{i}" for i in range(10)])
+
+
+def test_lost_responses_do_not_duplicate_notes(tpy, server, tmp_path):
+    docs = make_docs(tmp_path)
+    before = len(server.vault.notes)
+    server.lost_rate = 0.3
+
+    result = tpy("notes", "import", docs, "--parent-id", "n3", "--retries", "8")
+
+    assert result.exit_code == 0, result.output
+    assert server.stats.get("lost")
+    assert len(server.vault.notes) - before == len(scan_directory(docs, skip=docs / ".tpy-import.jsonl"))
+
+
+def test_rerun_finds_notes_missing_from_journal(tpy, server, tmp_path):
+    docs = make_docs(tmp_path)
+    journal = docs / ".tpy-import.jsonl"
+    assert tpy("notes", "import", docs, "--parent-id", "n3").exit_code == 0
+    count = len(server.vault.notes)
+    # As if the run had been killed before recording any created note
+    lines = journal.read_text().splitlines()
+    journal.write_text(lines[0] + "\n")
+    assert "importId" in json.loads(lines[0])
+
+    result = tpy("notes", "import", docs, "--parent-id", "n3")
+
+    assert result.exit_code == 0, result.output
+    assert len(server.vault.notes) == count
+    assert len(ImportJournal(journal, "n3").load()) == len(lines) - 1
+
+
+def test_note_ids_are_stable_per_journal(tmp_path):
+    journal = ImportJournal(tmp_path / "journal.jsonl", "root")
+    journal.load()
+    journal.start()
+    note_id = journal.note_id("a/b.md")
+    journal.close()
+
+    reloaded = ImportJournal(tmp_path / "journal.jsonl", "root")
+    reloaded.load()
+    reloaded.start()
+    assert reloaded.note_id("a/b.md") == note_id
+    assert reloaded.note_id("a/c.md") != note_id
+    assert len(note_id) == 12 and note_id.isalnum()
+
+
+def imported(server, parent_id):
+    return {n.title: n for n in server.vault.descendants(parent_id, None)}
+
+
+@pytest.mark.parametrize("client", ["httpx", "requests"])
+def test_file_content_is_uploaded(tpy, server, tmp_path, monkeypatch, client):
+    if client == "requests":
+        monkeypatch.setattr("trilium_py_cli.async_client.httpx", None)
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "page.html").write_text("<p>Hello</p>")
+    png = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 100
+    (docs / "pixel.png").write_bytes(png)
+
+    result = tpy("notes", "import", docs, "--parent-id", "n3")
+
+    assert result.exit_code == 0, result.output
+    notes = imported(server, "n3")
+    assert (notes["page"].type, server.vault.content(notes["page"])) == ("text", b"<p>Hello</p>")
+    image = notes["pixel.png"]
+    assert (image.type, image.mime) == ("image", "image/png")
+    assert server.vault.content(image) == png
+
+
+def test_failed_upload_is_finished_by_a_rerun(tpy, server, tmp_path, monkeypatch):
+    docs = make_docs(tmp_path, files=2)
+
+    async def fail(*args, **kwargs):
+        raise ConnectionError("upload failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("trilium_py_cli.async_client.AsyncETAPI.upload_content", fail)
+        assert tpy("notes", "import", docs, "--parent-id", "n3").exit_code == 1
+    count = len(server.vault.notes)
+
+    result = tpy("notes", "import", docs, "--parent-id", "n3")
+
+    assert result.exit_code == 0, result.output
+    assert len(server.vault.notes) == count
+    notes = imported(server, "n3")
+    assert server.vault.content(notes["note0"]) == b"# Note 0\n"
@@ -0,0 +1,28 @@
+"""Tests for the local search index: build and sync."""
+
+import json
+
+
+def local_ids(tpy, query):
+    result = tpy("notes", "search", "--local", query, "--format", "ndjson")
+    assert result.exit_code == 0, result.output
+    return {json.loads(line)["noteId"] for line in result.output.splitlines() if line.startswith("{")}
+
+
+def test_sync_drops_deleted_notes_and_updates_changed_ones(tpy, server):
+    vault = server.vault
+    parent = vault.add("root", "indexed")
+    keep = vault.add(parent.note_id, "zebra kept")
+    gone = vault.add(parent.note_id, "zebra gone")
+    assert tpy("index", "build", "--root", parent.note_id).exit_code == 0
+    assert local_ids(tpy, "zebra") == {keep.note_id, gone.note_id}
+
+    vault.delete(gone.note_id)
+    keep.title = "giraffe kept"
+    vault.set_content(keep, b"<p>giraffe</p>")
+    result = tpy("index", "sync")
+
+    assert result.exit_code == 0, result.output
+    assert "1 removed" in result.output
+    assert local_ids(tpy, "zebra") == set()
+    assert local_ids(tpy, "giraffe") == {keep.note_id}
@@ -0,0 +1,90 @@
+"""Tests of server polling and metrics for tpy info watch."""
+
+import pytest
+import requests
+from mock_server import Vault, serve
+
+from trilium_py_cli import monitor
+
+
+def _status(name, **versions):
+    status = monitor.ServerStatus(name, f"http://{name}:8080/", None)
+    status.record(0.02, versions, None)
+    return status
+
+
+def test_failed_poll_clears_versions():
+    a = _status("a", appVersion="0.63.0", dbVersion=228, syncVersion=32)
+    b = _status("b", appVersion="0.62.0", dbVersion=227, syncVersion=31)
+    c = _status("c", appVersion="0.62.0", dbVersion=227, syncVersion=31)
+    assert monitor.drift(a, monitor.expected_versions([a, b, c])) == {
+        "appVersion": "0.63.0", "dbVersion": 228, "syncVersion": 32,
+    }
+
+    b.record(None, None, "ConnectTimeout")
+    c.record(None, None, "HTTP 502")
+    assert b.versions == {} and c.versions == {}
+    assert monitor.expected_versions([a, b, c])["appVersion"] == "0.63.0"
+    assert monitor.drift(a, monitor.expected_versions([a, b, c])) == {}
+
+    text = monitor.metrics_prometheus([a, b, c])
+    info = [line for line in text.splitlines() if line.startswith("tpy_server_info{")]
+    assert len(info) == 1 and 'server="a"' in info[0]
+    assert 'tpy_server_version_drift{server="b"' not in text
+
+
+def test_missing_version_fields_are_left_out():
+    status = _status("a", appVersion="0.63.0")
+    text = monitor.metrics_prometheus([status])
+    (info,) = [line for line in text.splitlines() if line.startswith("tpy_server_info{")]
+    assert 'appVersion="0.63.0"' in info
+    assert "None" not in info and "dbVersion" not in info
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = monitor.LatencyHistogram(buckets=(0.01, 0.1))
+    for seconds in (0.005, 0.05, 0.05, 3.0):
+        histogram.observe(seconds)
+    assert histogram.cumulative() == [("0.01", 1), ("0.1", 3), ("+Inf", 4)]
+    assert histogram.percentiles()["p50"] == pytest.approx(50.0)
+
+
+def test_parse_servers():
+    assert monitor.parse_servers(["prod=https://notes.example/", "http://10.0.0.2:8080"]) == [
+        ("prod", "https://notes.example/"),
+        ("10.0.0.2:8080", "http://10.0.0.2:8080"),
+    ]
+    with pytest.raises(ValueError):
+        monitor.parse_servers(["a=http://x", "a=http://y"])
+    with pytest.raises(ValueError):
+        monitor.parse_servers(["a="])
+
+
+def test_poll_mock_server(server):
+    up = monitor.ServerStatus("mock", server.url, "test-token")
+    down = monitor.ServerStatus("down", "http://127.0.0.1:9", None)
+    with requests.Session() as session:
+        monitor.poll(session, up, timeout=5)
+        monitor.poll(session, down, timeout=1)
+    assert up.up and up.versions["appVersion"] == "0.0.0-mock"
+    assert not down.up and down.versions == {} and down.failures == 1
+
+
+def test_watch_session_keeps_a_pool_per_server():
+    # More servers than the shared session has pools
+    servers = [serve(Vault(1)) for _ in range(6)]
+    try:
+        statuses = [monitor.ServerStatus(str(i), s.url, "test-token") for i, s in enumerate(servers)]
+        with monitor.watch_session(len(statuses)) as session:
+            for _ in range(3):
+                for status in statuses:
+                    monitor.poll(session, status, timeout=5)
+            pools = session.get_adapter(servers[0].url).poolmanager.pools
+            # One connection per server, reused by every later poll
+            assert len(pools) == len(servers)
+            assert all(pools[key].num_connections == 1 for key in pools.keys())
+        assert all(status.up for status in statuses)
+    finally:
+        for s in servers:
+            s.shutdown()
+            s.server_close()
@@ -0,0 +1,71 @@
+"""Tests for notes create, upload and download."""
+
+import re
+
+
+def created_id(result):
+    return re.search(r"Created note: (\w+)", result.output).group(1)
+
+
+def test_create_with_inline_content(tpy, server):
+    result = tpy("notes", "create", "Inline", "--parent-id", "n3", "--content", "<p>Hi</p>")
+
+    assert result.exit_code == 0, result.output
+    note = server.vault.notes[created_id(result)]
+    assert note.title == "Inline" and note.parents == ["n3"]
+    assert server.vault.content(note) == b"<p>Hi</p>"
+
+
+def test_create_streams_file_content(tpy, server, tmp_path):
+    text = "# Big\n" + "line of markdown\n" * 20000
+    (tmp_path / "big.md").write_text(text)
+
+    result = tpy("notes", "create", "Big", "--parent-id", "n3", "--content", "@big.md")
+
+    assert result.exit_code == 0, result.output
+    note = server.vault.notes[created_id(result)]
+    assert note.mime == "text/x-markdown"
+    assert server.vault.content(note) == text.encode()
+
+
+def test_create_dry_run_creates_nothing(tpy, server):
+    count = len(server.vault.notes)
+    result = tpy("notes", "create", "Draft", "--content", "x", "--dry-run")
+    assert result.exit_code == 0 and "DRY RUN" in result.output
+    assert len(server.vault.notes) == count
+
+
+def test_upload_then_download_round_trips(tpy, server, tmp_path):
+    data = bytes(range(256)) * 1000
+    (tmp_path / "blob.bin").write_bytes(data)
+
+    assert tpy("notes", "upload", "n3", "blob.bin", "--mime", "application/octet-stream").exit_code == 0
+    assert server.vault.content(server.vault.notes["n3"]) == data
+    result = tpy("notes", "download", "n3", "copy.bin")
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "copy.bin").read_bytes() == data
+
+
+def test_create_infers_type_from_file(tpy, server, tmp_path):
+    (tmp_path / "pixel.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(64))
+
+    result = tpy("notes", "create", "Pixel", "--parent-id", "n3", "--content", "@pixel.png")
+
+    assert result.exit_code == 0, result.output
+    note = server.vault.notes[created_id(result)]
+    assert (note.type, note.mime) == ("image", "image/png")
+
+
+def test_create_removes_note_when_upload_fails(tpy, server, tmp_path, monkeypatch):
+    (tmp_path / "big.md").write_text("# Big\n")
+    count = len(server.vault.notes)
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("upload failed")
+
+    monkeypatch.setattr("trilium_py_cli.commands.notes.upload_content", fail)
+    result = tpy("notes", "create", "Big", "--parent-id", "n3", "--content", "@big.md")
+
+    assert result.exit_code == 1
+    assert "upload failed" in result.output
+    assert len(server.vault.notes) == count
@@ -0,0 +1,146 @@
+"""Tests for two-way directory sync: planning and carrying it out."""
+
+import pytest
+from trilium_py.client import ETAPI
+
+from trilium_py_cli.sync import STATE_NAME, SyncState, plan_sync, run_sync
+from trilium_py_cli.tree import NoteTree, fetch_tree
+
+
+@pytest.fixture
+def folder(server):
+    """A note with two text children of known content."""
+    vault = server.vault
+    parent = vault.add("root", "synced")
+    for title in ("one", "two"):
+        vault.set_content(vault.add(parent.note_id, title), f"content of {title}".encode())
+    return parent
+
+
+def plan(server, folder, directory, **options):
+    ea = ETAPI(server.url, "test-token")
+    tree = NoteTree.from_notes(fetch_tree(ea, folder.note_id, None))
+    state = SyncState(directory / STATE_NAME)
+    state.load(folder.note_id)
+    actions, unchanged = plan_sync(tree, folder.note_id, directory, state, **options)
+    return ea, state, actions, unchanged
+
+
+def kinds(actions):
+    return sorted((action.kind, action.relpath) for action in actions)
+
+
+def test_first_sync_pulls_then_nothing_changes(tpy, server, folder, tmp_path):
+    result = tpy("notes", "sync", "out", "--root", folder.note_id)
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "out" / "one.html").read_text() == "content of one"
+    _, _, actions, unchanged = plan(server, folder, tmp_path / "out")
+    assert actions == [] and unchanged == 2
+
+
+def test_plan_push_pull_create_and_conflict(tpy, server, folder, tmp_path):
+    out = tmp_path / "out"
+    assert tpy("notes", "sync", "out", "--root", folder.note_id).exit_code == 0
+    one, two = (server.vault.notes[child] for child in folder.children)
+    (out / "one.html").write_text("edited here")
+    server.vault.set_content(two, b"edited there")
+    (out / "new.md").write_text("# New\n")
+
+    _, _, actions, _ = plan(server, folder, out)
+    assert kinds(actions) == [("create", "new.md"), ("pull", "two.html"), ("push", "one.html")]
+
+    (out / "two.html").write_text("edited here too")
+    _, _, actions, _ = plan(server, folder, out)
+    assert ("conflict", "two.html") in kinds(actions)
+
+
+def test_push_and_create_reach_the_server(tpy, server, folder, tmp_path):
+    out = tmp_path / "out"
+    assert tpy("notes", "sync", "out", "--root", folder.note_id).exit_code == 0
+    (out / "one.html").write_text("edited here")
+    (out / "sub").mkdir()
+    (out / "sub" / "new.md").write_text("# New\n")
+
+    result = tpy("notes", "sync", "out", "--root", folder.note_id)
+
+    assert result.exit_code == 0, result.output
+    one = server.vault.notes[folder.children[0]]
+    assert server.vault.content(one) == b"edited here"
+    sub = next(server.vault.notes[c] for c in folder.children if server.vault.notes[c].title == "sub")
+    assert [server.vault.notes[c].title for c in sub.children] == ["new"]
+
+
+def test_deleted_file_deletes_note_with_delete(tpy, server, folder, tmp_path):
+    out = tmp_path / "out"
+    assert tpy("notes", "sync", "out", "--root", folder.note_id).exit_code == 0
+    one_id = folder.children[0]
+    (out / "one.html").unlink()
+
+    assert tpy("notes", "sync", "out", "--root", folder.note_id).exit_code == 1
+    assert one_id in server.vault.notes
+
+    result = tpy("notes", "sync", "out", "--root", folder.note_id, "--delete")
+    assert result.exit_code == 0, result.output
+    assert one_id not in server.vault.notes
+
+
+def test_failed_remote_delete_keeps_state(tpy, server, folder, tmp_path):
+    out = tmp_path / "out"
+    assert tpy("notes", "sync", "out", "--root", folder.note_id).exit_code == 0
+    one_id = folder.children[0]
+    (out / "one.html").unlink()
+    ea, state, actions, _ = plan(server, folder, out, delete=True)
+    assert kinds(actions) == [("delete-remote", "one.html")]
+
+    server.error_rate = 1.0
+    counts = run_sync(ea, actions, folder.note_id, out, state, retries=0)
+    assert counts["failed"] == 1
+    assert one_id in state.entries
+
+    # A note someone else deleted meanwhile counts as deleted
+    server.error_rate = 0.0
+    server.vault.delete(one_id)
+    counts = run_sync(ea, actions, folder.note_id, out, state, retries=0)
+    assert counts == {"failed": 0, "delete-remote": 1}
+    assert one_id not in state.entries
+
+
+def test_deleted_file_of_note_with_children_is_a_conflict(tpy, server, folder, tmp_path):
+    out = tmp_path / "out"
+    one = server.vault.notes[folder.children[0]]
+    child = server.vault.add(one.note_id, "child")
+    server.vault.set_content(child, b"content of child")
+    assert tpy("notes", "sync", "out", "--root", folder.note_id).exit_code == 0
+    assert (out / "one" / "child.html").exists()
+    (out / "one.html").unlink()
+
+    _, _, actions, _ = plan(server, folder, out, delete=True)
+    assert kinds(actions) == [("conflict", "one.html")]
+    assert "has children" in actions[0].reason
+
+    result = tpy("notes", "sync", "out", "--root", folder.note_id, "--delete")
+    assert result.exit_code == 1
+    assert one.note_id in server.vault.notes and child.note_id in server.vault.notes
+    assert (out / "one" / "child.html").exists()
+
+
+def test_failed_upload_removes_the_created_note(tpy, server, folder, tmp_path, monkeypatch):
+    out = tmp_path / "out"
+    assert tpy("notes", "sync", "out", "--root", folder.note_id).exit_code == 0
+    (out / "new.md").write_text("# New\n")
+    ea, state, actions, _ = plan(server, folder, out)
+    assert kinds(actions) == [("create", "new.md")]
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("upload failed")
+
+    monkeypatch.setattr("trilium_py_cli.sync.upload_content", fail)
+    counts = run_sync(ea, actions, folder.note_id, out, state, retries=0)
+
+    assert counts["failed"] == 1
+    assert len(folder.children) == 2
+    assert "new.md" not in {entry["path"] for entry in state.entries.values()}
+    monkeypatch.undo()
+    _, _, actions, _ = plan(server, folder, out)
+    assert kinds(actions) == [("create", "new.md")]